@@ -0,0 +1,48 @@
+"""benchmarks `utils.duration_str_to_num` against the original per-row
+`isodate.parse_duration` implementation on the full video corpus.
+
+Usage::
+
+    python -m benchmarks.bench_duration [--repeat 5]
+"""
+
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import isodate
+
+from module.utils import get_videos, duration_str_to_num
+
+
+def duration_str_to_num_isodate(durations):
+    """original implementation of `utils.duration_str_to_num`."""
+    return np.array([isodate.parse_duration(d).total_seconds() if pd.notnull(d) else np.nan for d in durations])
+
+
+def best_time(func, durations, repeat):
+    """returns the fastest of `repeat` runs of `func(durations)`, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(durations)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(repeat: int = 5) -> None:
+    durations = get_videos().duration.values
+    np.testing.assert_array_equal(duration_str_to_num(durations), duration_str_to_num_isodate(durations))
+    isodate_time = best_time(duration_str_to_num_isodate, durations, repeat)
+    vectorized_time = best_time(duration_str_to_num, durations, repeat)
+    print('{0} durations'.format(durations.shape[0]))
+    print('isodate:    {0:.4f}s'.format(isodate_time))
+    print('vectorized: {0:.4f}s'.format(vectorized_time))
+    print('speedup:    {0:.1f}x'.format(isodate_time / vectorized_time))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs of each implementation.')
+    args = parser.parse_args()
+    main(repeat=args.repeat)
@@ -0,0 +1,211 @@
+"""load-tests the scraper against a local fake YouTube Data API server (see
+`benchmarks.fake_youtube`).
+
+Runs `module.video_scraper.main` itself (channel searches, then
+related-video searches on the channel results, with keyword searches
+alongside, followed by video details in batches of 50), with its request
+scheduler, thread pool, response cache, journal and high-water marks, on a
+temporary data directory, so nothing is written to `data/`. Channels are the
+`--channels` largest channels of the synthetic corpus, and keywords pair the
+corpus's candidate names with campaign terms.
+
+Reports end-to-end throughput (new videos and requests per second), quota
+efficiency (quota units spent per new video), the number of retried and
+refused requests, and whether the run finished (a run that runs out of quota
+while fetching video details is left to be resumed), and saves them as JSON.
+
+Usage::
+
+    python -m benchmarks.bench_load --rows 100000 --workers 8 --latency 0.05
+
+    # with 5xx faults and a server-side quota.
+    python -m benchmarks.bench_load --fault_rate 0.05 --server_quota 5000
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import tempfile
+import contextlib
+
+from module import settings, youtube_client, request_scheduler, video_scraper, video_store, \
+    scrape_journal, response_cache, high_water_marks
+from module.__main__ import add_scrape_arguments
+from benchmarks.fake_youtube import FakeYouTube
+from benchmarks.run import BENCHMARKS_PATH, _git_commit
+
+# words of the corpus's titles searched for, as in `data/search_terms.json`.
+ENTITY_TERMS = ['raila', 'uhuru', 'odinga', 'kenyatta', 'ruto', 'nasa', 'jubilee']
+CAMPAIGN_TERMS = ['rally', 'speech', 'campaign']
+
+
+def main(rows: int = 100000,
+         seed: int = 0,
+         workers: int = 8,
+         rate: float = 1000.0,
+         quota: int = request_scheduler.DEFAULT_QUOTA,
+         server_quota: int = None,
+         latency: float = 0.05,
+         jitter: float = 0.0,
+         fault_rate: float = 0.0,
+         channels: int = 10,
+         max_pages: int = 5,
+         max_results: int = 50,
+         published_after: str = '2017-01-01T00:00:00Z',
+         outpath: str = None,
+         verbose: bool = False) -> dict:
+    """runs one scrape against a fake API server and saves the results.
+
+    Arguments:
+
+        rows: int. Number of videos served by the fake API.
+
+        seed: int. Random seed of the corpus and of injected faults.
+
+        workers: int. Number of concurrent API requests.
+
+        rate, quota: Rate limit (requests per second) and quota units of the
+            scraper's `RequestScheduler`.
+
+        server_quota: int. Quota units the fake API allows before failing
+            requests with "quotaExceeded". None for no limit.
+
+        latency, jitter, fault_rate: Injected latency and faults (see
+            `FakeYouTube`).
+
+        channels: int. Number of channels searched.
+
+        max_pages, max_results, published_after: as in `video_scraper`.
+
+        outpath: str. Path to the results JSON. Defaults to a file in
+            `BENCHMARKS_PATH` named after the time and git commit.
+
+        verbose: bool. If True, prints the scraper's progress messages.
+
+    Returns:
+
+        results: dict.
+    """
+    print('Building fake API with {0} videos...'.format(rows))
+    fake = FakeYouTube.from_corpus(rows, seed=seed, latency=latency, jitter=jitter,
+                                   fault_rate=fault_rate, quota=server_quota)
+    data_dir = tempfile.mkdtemp()
+    write_data_files(data_dir, fake.channels()[:channels])
+    parser = argparse.ArgumentParser()
+    add_scrape_arguments(parser)
+    args = parser.parse_args(['--workers', str(workers), '--rate', str(rate), '--quota', str(quota),
+                              '--max-pages', str(max_pages), '--max-results', str(max_results),
+                              '--published-after', published_after])
+    scraper_globals = {name: getattr(video_scraper, name) for name in ['DEVELOPER_KEY', 'scheduler', 'cache', 'journal']}
+    youtube_client.STATS.reset()
+    try:
+        with redirect_data_dir(data_dir, fake.start()):
+            video_scraper.DEVELOPER_KEY = video_scraper.DEVELOPER_KEY or 'fake-key'
+            start = time.time()
+            with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+                video_scraper.main(args)
+            seconds = time.time() - start
+            scheduler, journal = video_scraper.scheduler, video_scraper.journal
+            n_videos = journal.read_details().shape[0]
+    finally:
+        fake.stop()
+        shutil.rmtree(data_dir)
+        for name, value in scraper_globals.items():
+            setattr(video_scraper, name, value)
+    n_requests = sum(fake.requests.values())
+    results = {
+        'commit': _git_commit(),
+        'created': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {'rows': rows, 'seed': seed, 'workers': workers, 'rate': rate, 'quota': quota,
+                   'server_quota': server_quota, 'latency': latency, 'jitter': jitter,
+                   'fault_rate': fault_rate, 'channels': channels, 'max_pages': max_pages,
+                   'max_results': max_results, 'published_after': published_after},
+        'seconds': seconds,
+        'videos': n_videos,
+        'videos_per_second': n_videos / seconds,
+        'requests': n_requests,
+        'requests_per_second': n_requests / seconds,
+        'mean_request_seconds': youtube_client.STATS.request_seconds / max(youtube_client.STATS.requests, 1),
+        'quota_used': scheduler.used,
+        'quota_per_video': scheduler.used / max(n_videos, 1),
+        'calls': scheduler.calls,
+        'retries': scheduler.retries,
+        'refused': scheduler.refused,
+        'finished': journal.snapshot is not None,
+        'server_statuses': {str(k): v for k, v in sorted(fake.statuses.items())},
+    }
+    print('Scraped {videos} videos in {seconds:.2f}s ({videos_per_second:.1f} videos/s, '
+          '{requests_per_second:.1f} requests/s, {mean_request_seconds:.3f}s per request)'.format(**results))
+    print('Quota: {quota_used} units ({quota_per_video:.2f} per video); {retries} retries; '
+          '{refused} requests refused; run finished: {finished}'.format(**results))
+    print(fake.summary())
+    if outpath is None:
+        outpath = os.path.join(BENCHMARKS_PATH, 'load_test_{0}_{1}.json'.format(
+            datetime.datetime.now().strftime('%Y-%m-%dT%H-%M-%S'), results['commit'] or 'unknown'))
+    os.makedirs(os.path.dirname(os.path.abspath(outpath)), exist_ok=True)
+    with open(outpath, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Saved results to {0}'.format(outpath))
+    return results
+
+
+def write_data_files(data_dir: str, channel_ids: list) -> None:
+    """writes the channels and search terms read by `video_scraper.main` to
+    `data_dir`."""
+    os.makedirs(os.path.join(data_dir, 'videos'))
+    with open(os.path.join(data_dir, 'youtube_channels.json'), 'w') as f:
+        json.dump([{'channelId': channel_id, 'mostly_speeches': True} for channel_id in channel_ids], f)
+    with open(os.path.join(data_dir, 'search_terms.json'), 'w') as f:
+        json.dump({'entity_terms_primary': ENTITY_TERMS, 'campaign_terms_primary': CAMPAIGN_TERMS}, f)
+
+
+@contextlib.contextmanager
+def redirect_data_dir(data_dir: str, discovery_url: str):
+    """points the scraper's data paths at `data_dir` and its API client at
+    `discovery_url`, restoring them on exit."""
+    generated = os.path.join(data_dir, 'generated')
+    patches = [
+        (settings, 'DATA_DIR', data_dir),
+        (video_store, 'SNAPSHOTS_PATH', os.path.join(data_dir, 'videos')),
+        (video_store, 'STORE_PATH', os.path.join(generated, 'videos.parquet')),
+        (video_store, 'VIDEO_IDS_PATH', os.path.join(generated, 'video_ids.txt')),
+        (scrape_journal, 'RUNS_PATH', os.path.join(generated, 'scrape_runs')),
+        (response_cache, 'CACHE_PATH', os.path.join(generated, 'youtube_cache.sqlite')),
+        (high_water_marks, 'HIGH_WATER_MARKS_PATH', os.path.join(generated, 'high_water_marks.json')),
+        (youtube_client, 'DISCOVERY_URL', discovery_url),
+        (youtube_client, 'DISCOVERY_CACHE_DIR', generated),
+    ]
+    saved = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    try:
+        for module, name, value in patches:
+            setattr(module, name, value)
+        yield
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000, help='Number of videos served by the fake API.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    parser.add_argument('--workers', type=int, default=8, help='Number of concurrent API requests.')
+    parser.add_argument('--rate', type=float, default=1000.0, help='Max API requests per second.')
+    parser.add_argument('--quota', type=int, default=request_scheduler.DEFAULT_QUOTA, help='Max API quota units to spend.')
+    parser.add_argument('--server_quota', type=int, default=None, help='Quota units the fake API allows.')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds each request is delayed by.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Maximum seconds added at random to --latency.')
+    parser.add_argument('--fault_rate', type=float, default=0.0, help='Probability that a request fails with a 5xx error.')
+    parser.add_argument('--channels', type=int, default=10, help='Number of channels searched.')
+    parser.add_argument('--max_pages', type=int, default=5, help='Max pages per search.')
+    parser.add_argument('--max_results', type=int, default=50, help='Results per page.')
+    parser.add_argument('--published_after', type=str, default='2017-01-01T00:00:00Z', help='Only search videos published after this time.')
+    parser.add_argument('--outpath', type=str, default=None, help='Path to the results JSON.')
+    parser.add_argument('--verbose', action='store_true', help="Print the scraper's progress messages.")
+    args = parser.parse_args()
+    main(**args.__dict__)
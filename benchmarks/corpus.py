@@ -0,0 +1,113 @@
+"""generates a synthetic corpus of scraped videos for benchmarks.
+
+The corpus is shaped like the real one: csv snapshots named
+`youtube_search_results_<timestamp>.csv` with the columns in
+`video_store.SNAPSHOT_COLUMNS`, in which some videos appear in more than one
+snapshot, titles are drawn from a Zipf-distributed vocabulary, a few
+channels publish most videos and a small fraction of durations are missing.
+A `labels0.csv` of labeled videos is written alongside the snapshots.
+
+Usage::
+
+    python -m benchmarks.corpus --rows 100000 --outpath /tmp/corpus
+"""
+
+import os
+import argparse
+import datetime
+import numpy as np
+import pandas as pd
+
+from module.video_store import SNAPSHOT_COLUMNS
+
+# words from which titles are generated.
+WORDS = ['raila', 'uhuru', 'odinga', 'kenyatta', 'nasa', 'jubilee', 'rally', 'speech', 'live',
+         'news', 'kenya', 'election', 'campaign', 'nairobi', 'mombasa', 'kisumu', 'ruto', 'ntv',
+         'ktn', 'citizen', 'latest', 'today', 'governor', 'senator', 'debate', 'mezmur', 'music',
+         'comedy', 'churchill', 'show', 'interview', 'tv', 'full', 'video', '2017', 'hd']
+
+
+def generate(n_rows: int, seed: int = 0, n_snapshots: int = None, duplicate_rate: float = 0.1,
+             n_labels: int = 1000) -> tuple:
+    """generates a synthetic corpus.
+
+    Arguments:
+
+        n_rows: int. Total number of rows across all snapshots.
+
+        seed: int. Random seed.
+
+        n_snapshots: int. Number of snapshots. Defaults to one per 10,000 rows.
+
+        duplicate_rate: float. Fraction of rows that repeat a video from an
+            earlier row.
+
+        n_labels: int. Number of labeled videos.
+
+    Returns:
+
+        snapshots, labels: Tuple[List[pd.DataFrame], pd.DataFrame].
+    """
+    random_state = np.random.RandomState(seed)
+    n_snapshots = n_snapshots if n_snapshots is not None else max(1, n_rows // 10000)
+    n_unique = max(1, int(n_rows * (1 - duplicate_rate)))
+    # note: the same video in two snapshots has the same fields.
+    video_ids = np.array(['v{0:010d}'.format(i) for i in random_state.permutation(10 * n_unique)[:n_unique]], dtype=object)
+    zipf_words = np.minimum(random_state.zipf(1.5, size=(n_unique, 8)), len(WORDS)) - 1
+    n_words = random_state.randint(2, 9, size=n_unique)
+    titles = np.array([' '.join(WORDS[w] for w in words[:n]) for words, n in zip(zipf_words, n_words)], dtype=object)
+    channels = np.array(['channel {0}'.format(c) for c in np.minimum(random_state.zipf(1.3, size=n_unique), 5000)], dtype=object)
+    published_at = pd.Timestamp('2017-01-01') + pd.to_timedelta(random_state.randint(0, 365 * 24 * 3600, size=n_unique), unit='s')
+    seconds = random_state.lognormal(6, 1.5, size=n_unique).astype(int)
+    durations = np.array(['PT{0}H{1}M{2}S'.format(s // 3600, s % 3600 // 60, s % 60) if s >= 3600 else
+                          'PT{0}M{1}S'.format(s // 60, s % 60) for s in seconds], dtype=object)
+    durations[random_state.random_sample(n_unique) < 0.01] = None
+    unique_videos = pd.DataFrame({
+        'video_id': video_ids,
+        'title': titles,
+        'published_at': published_at.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+        'channel_title': channels,
+        'duration': durations,
+    })[SNAPSHOT_COLUMNS]
+    rows = np.concatenate([np.arange(n_unique), random_state.randint(0, n_unique, size=n_rows - n_unique)])
+    videos = unique_videos.iloc[rows].reset_index(drop=True)
+    bounds = np.linspace(0, n_rows, n_snapshots + 1).astype(int)
+    snapshots = [videos.iloc[bounds[i]:bounds[i+1]] for i in range(n_snapshots)]
+    labeled = random_state.choice(n_unique, size=min(n_labels, n_unique), replace=False)
+    labels = pd.DataFrame({'video_id': video_ids[labeled], 'label': random_state.randint(0, 2, size=labeled.shape[0]).astype(float)})
+    return snapshots, labels
+
+
+def write(outpath: str, n_rows: int, seed: int = 0, **kwargs) -> tuple:
+    """generates a corpus and writes it to `outpath`, unless a corpus with
+    the same number of rows and seed is already there.
+
+    Returns:
+
+        snapshots_path, labels_path: Tuple[str, str]. Directories of the
+            snapshots and labels.
+    """
+    snapshots_path = os.path.join(outpath, 'videos')
+    labels_path = os.path.join(outpath, 'video_relevance')
+    done_path = os.path.join(outpath, 'corpus_{0}_{1}.done'.format(n_rows, seed))
+    if os.path.isfile(done_path):
+        return snapshots_path, labels_path
+    snapshots, labels = generate(n_rows, seed=seed, **kwargs)
+    os.makedirs(snapshots_path, exist_ok=True)
+    os.makedirs(labels_path, exist_ok=True)
+    start = datetime.datetime(2017, 6, 25, 13, 11, 38)
+    for i, snapshot in enumerate(snapshots):
+        timestamp = (start + datetime.timedelta(days=i)).strftime('%Y-%m-%dT%H-%M-%SZ')
+        snapshot.to_csv(os.path.join(snapshots_path, 'youtube_search_results_{0}.csv'.format(timestamp)), index=False)
+    labels.to_csv(os.path.join(labels_path, 'labels0.csv'), index=False)
+    open(done_path, 'w').close()
+    return snapshots_path, labels_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000, help='Total number of rows across all snapshots.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    parser.add_argument('--outpath', type=str, required=True, help='Directory in which to write the corpus.')
+    args = parser.parse_args()
+    print('Wrote corpus to {0}'.format(write(args.outpath, args.rows, seed=args.seed)[0]))
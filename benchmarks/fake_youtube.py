@@ -0,0 +1,433 @@
+"""local stand-in for the YouTube Data API, serving a synthetic corpus (see
+`benchmarks.corpus`).
+
+Implements the three methods the scraper calls:
+
+    - search.list, filtered by `q` (videos whose title contains every word),
+      `channelId`, `relatedToVideoId` and `publishedAfter`/`publishedBefore`,
+      ordered by relevance (corpus order) or by `order=date`. As with the real
+      API, at most `SEARCH_RESULTS_LIMIT` results can be paged through.
+    - videos.list, for up to 50 comma-separated `id`s.
+    - playlistItems.list, for the uploads playlist of each channel ("UU"
+      followed by the channel ID without its "UC" prefix).
+
+All three paginate with `maxResults` and `pageToken`. Requests are charged
+the same quota units as the real API (`request_scheduler.QUOTA_COSTS`), and
+the server can be made to inject latency, 5xx faults and, once a quota is
+spent, 403 "quotaExceeded" errors.
+
+The server also serves a discovery document describing these methods, so
+the unmodified API client can be pointed at it with the
+YOUTUBE_DISCOVERY_URL environment variable (see `module.youtube_client`).
+
+Usage::
+
+    python -m benchmarks.fake_youtube --rows 100000 --port 8765 --latency 0.05 --fault_rate 0.01
+
+    # in another shell.
+    export YOUTUBE_DISCOVERY_URL=http://127.0.0.1:8765/discovery/v1/apis/youtube/v3/rest
+
+See `benchmarks.bench_load` for a load-test driver that runs the scraper
+against it.
+"""
+
+import json
+import time
+import zlib
+import random
+import hashlib
+import argparse
+import threading
+import socketserver
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import numpy as np
+import pandas as pd
+
+from module.request_scheduler import QUOTA_COSTS
+from benchmarks import corpus
+
+DISCOVERY_PATH = '/discovery/v1/apis/youtube/v3/rest'
+SERVICE_PATH = 'youtube/v3/'
+
+# maximum number of results that a single search can be paged through.
+SEARCH_RESULTS_LIMIT = 500
+
+# maximum `maxResults` and number of IDs in a videos.list request.
+MAX_RESULTS = 50
+
+# number of videos related to each video.
+RELATED_SIZE = 50
+
+# query parameters of each method, in addition to `part`, `maxResults` and `pageToken`.
+METHOD_PARAMETERS = {
+    'search.list': ['q', 'type', 'order', 'channelId', 'relatedToVideoId', 'publishedAfter',
+                    'publishedBefore', 'regionCode', 'relevanceLanguage'],
+    'videos.list': ['id'],
+    'playlistItems.list': ['playlistId'],
+}
+
+
+class ApiError(Exception):
+    """error returned to the client as a JSON error response."""
+
+    def __init__(self, status: int, reason: str, message: str = None):
+        super(ApiError, self).__init__(message or reason)
+        self.status = status
+        self.reason = reason
+
+    def body(self) -> dict:
+        return {'error': {'code': self.status, 'message': str(self),
+                          'errors': [{'domain': 'youtube', 'reason': self.reason, 'message': str(self)}]}}
+
+
+class FakeYouTube(object):
+    """in-memory YouTube Data API over a corpus of videos.
+
+    Arguments:
+
+        videos: pd.DataFrame. Videos with the columns in
+            `video_store.SNAPSHOT_COLUMNS` and a unique `video_id`.
+
+        latency: float. Seconds each request is delayed by.
+
+        jitter: float. Maximum number of seconds added at random to `latency`.
+
+        fault_rate: float. Probability that a request fails with a 500 or 503.
+
+        quota: int. Quota units that can be spent before requests fail with
+            a 403 "quotaExceeded" error. None for no limit.
+
+        seed: int. Random seed for faults, jitter and related videos.
+    """
+
+    def __init__(self, videos: pd.DataFrame, latency: float = 0.0, jitter: float = 0.0,
+                 fault_rate: float = 0.0, quota: int = None, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.fault_rate = fault_rate
+        self.quota = quota
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = None
+        self.reset_stats()
+        # columns as arrays, indexed by a video's position in the corpus.
+        videos = videos.reset_index(drop=True)
+        self.video_ids = videos.video_id.values.astype(object)
+        self.titles = videos.title.fillna('').values.astype(object)
+        self.channel_titles = videos.channel_title.fillna('').values.astype(object)
+        self.published_at = videos.published_at.values.astype(object)
+        self.durations = videos.duration.fillna('P0D').values.astype(object)
+        self.published = pd.to_datetime(videos.published_at).values.astype('datetime64[s]').astype(np.int64)
+        self.channel_ids = np.array([channel_id(title) for title in self.channel_titles], dtype=object)
+        self.positions = {video_id: i for i, video_id in enumerate(self.video_ids)}
+        self.by_channel = _group(self.channel_ids)
+        words = [(word, i) for i, title in enumerate(self.titles) for word in set(title.lower().split())]
+        self.by_word = _group(np.array([w for w, _ in words], dtype=object), np.array([i for _, i in words], dtype=int))
+
+    @classmethod
+    def from_corpus(cls, n_videos: int, seed: int = 0, **kwargs) -> 'FakeYouTube':
+        """serves a synthetic corpus of `n_videos` distinct videos."""
+        snapshots, _ = corpus.generate(n_videos, seed=seed, duplicate_rate=0.0, n_labels=0)
+        return cls(pd.concat(snapshots), seed=seed, **kwargs)
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.requests = {}
+            self.statuses = {}
+            self.quota_used = 0
+
+    def channels(self) -> list:
+        """returns the ID of each channel, from most to fewest videos."""
+        return sorted(self.by_channel, key=lambda k: (-len(self.by_channel[k]), k))
+
+    def handle(self, method: str, params: dict) -> tuple:
+        """handles a request for `method` with query parameters `params`.
+
+        Returns:
+
+            status, body: Tuple[int, dict]. HTTP status and JSON response.
+        """
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            with self._lock:
+                self.requests[method] = self.requests.get(method, 0) + 1
+                if self.fault_rate and self._random.random() < self.fault_rate:
+                    raise ApiError(self._random.choice([500, 503]), 'backendError', 'Backend Error')
+                cost = QUOTA_COSTS[method]
+                if self.quota is not None and self.quota_used + cost > self.quota:
+                    raise ApiError(403, 'quotaExceeded', 'The request cannot be completed because you have exceeded your quota.')
+                self.quota_used += cost
+            if 'part' not in params:
+                raise ApiError(400, 'required', 'Required parameter: part')
+            if method == 'search.list':
+                body = self.search(params)
+            elif method == 'videos.list':
+                body = self.videos(params)
+            else:
+                body = self.playlist_items(params)
+            status = 200
+        except ApiError as e:
+            status, body = e.status, e.body()
+        with self._lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+        return status, body
+
+    def search(self, params: dict) -> dict:
+        if 'relatedToVideoId' in params:
+            positions = self.related(params['relatedToVideoId'])
+        elif 'channelId' in params:
+            positions = self.by_channel.get(params['channelId'], _EMPTY)
+        else:
+            positions = np.arange(self.video_ids.shape[0])
+        if params.get('q'):
+            for word in params['q'].lower().split():
+                positions = np.intersect1d(positions, self.by_word.get(word, _EMPTY), assume_unique=True)
+        if 'publishedAfter' in params:
+            positions = positions[self.published[positions] > _timestamp(params['publishedAfter'])]
+        if 'publishedBefore' in params:
+            positions = positions[self.published[positions] < _timestamp(params['publishedBefore'])]
+        if params.get('order') == 'date':
+            positions = positions[np.argsort(-self.published[positions], kind='stable')]
+        positions = positions[:SEARCH_RESULTS_LIMIT]
+        return self._page('youtube#searchListResponse', positions, params, lambda i, rank: {
+            'kind': 'youtube#searchResult',
+            'id': {'kind': 'youtube#video', 'videoId': self.video_ids[i]},
+            'snippet': self._snippet(i),
+        })
+
+    def videos(self, params: dict) -> dict:
+        video_ids = [video_id for video_id in params.get('id', '').split(',') if video_id]
+        if len(video_ids) > MAX_RESULTS:
+            raise ApiError(400, 'invalidParameter', 'Too many video IDs (at most {0})'.format(MAX_RESULTS))
+        positions = np.array([self.positions[video_id] for video_id in video_ids if video_id in self.positions], dtype=int)
+        return self._page('youtube#videoListResponse', positions, dict(params, maxResults=MAX_RESULTS), lambda i, rank: {
+            'kind': 'youtube#video',
+            'id': self.video_ids[i],
+            'snippet': self._snippet(i),
+            'contentDetails': {'duration': self.durations[i]},
+        })
+
+    def playlist_items(self, params: dict) -> dict:
+        playlist_id = params.get('playlistId', '')
+        positions = self.by_channel.get('UC' + playlist_id[2:]) if playlist_id.startswith('UU') else None
+        if positions is None:
+            raise ApiError(404, 'playlistNotFound', 'Playlist not found: {0}'.format(playlist_id))
+        positions = positions[np.argsort(-self.published[positions], kind='stable')]
+        return self._page('youtube#playlistItemListResponse', positions, params, lambda i, rank: {
+            'kind': 'youtube#playlistItem',
+            'id': hashlib.sha1('{0}{1}'.format(playlist_id, self.video_ids[i]).encode()).hexdigest(),
+            'snippet': dict(self._snippet(i), playlistId=playlist_id, position=rank,
+                            resourceId={'kind': 'youtube#video', 'videoId': self.video_ids[i]}),
+            'contentDetails': {'videoId': self.video_ids[i], 'videoPublishedAt': self.published_at[i]},
+        })
+
+    def related(self, video_id: str) -> np.ndarray:
+        """returns `RELATED_SIZE` videos related to `video_id`: half from the
+        same channel and half from the whole corpus, the same on every call."""
+        if video_id not in self.positions:
+            raise ApiError(404, 'videoNotFound', 'Video not found: {0}'.format(video_id))
+        i = self.positions[video_id]
+        random_state = np.random.RandomState(zlib.crc32(video_id.encode()) ^ self.seed)
+        channel = self.by_channel[self.channel_ids[i]]
+        positions = np.concatenate([
+            random_state.choice(channel, size=min(RELATED_SIZE // 2, channel.shape[0]), replace=False),
+            random_state.randint(0, self.video_ids.shape[0], size=RELATED_SIZE)])
+        positions = pd.unique(positions[positions != i])
+        return positions[:RELATED_SIZE]
+
+    def _snippet(self, i: int) -> dict:
+        return {
+            'publishedAt': self.published_at[i],
+            'channelId': self.channel_ids[i],
+            'title': self.titles[i],
+            'description': '',
+            'channelTitle': self.channel_titles[i],
+            'liveBroadcastContent': 'none',
+        }
+
+    def _page(self, kind: str, positions: np.ndarray, params: dict, item) -> dict:
+        try:
+            max_results = int(params.get('maxResults', 5))
+            offset = int(params['pageToken'][1:]) if 'pageToken' in params else 0
+        except ValueError:
+            raise ApiError(400, 'invalidParameter', 'Invalid maxResults or pageToken')
+        if not 0 <= max_results <= MAX_RESULTS:
+            raise ApiError(400, 'invalidParameter', 'maxResults must be between 0 and {0}'.format(MAX_RESULTS))
+        page = positions[offset:offset+max_results]
+        response = {
+            'kind': kind,
+            'pageInfo': {'totalResults': int(positions.shape[0]), 'resultsPerPage': max_results},
+            'items': [item(int(i), offset + rank) for rank, i in enumerate(page)],
+        }
+        if offset + max_results < positions.shape[0]:
+            # note: page tokens are opaque to clients.
+            response['nextPageToken'] = 'P{0}'.format(offset + max_results)
+        return response
+
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """serves the API from a background thread.
+
+        Returns:
+
+            discovery_url: str. URL of the discovery document.
+        """
+        fake = self
+
+        class Handler(RequestHandler):
+            api = fake
+
+        self.server = _ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.discovery_url
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    @property
+    def root_url(self) -> str:
+        return 'http://{0}:{1}/'.format(*self.server.server_address[:2])
+
+    @property
+    def discovery_url(self) -> str:
+        return self.root_url.rstrip('/') + DISCOVERY_PATH
+
+    def summary(self) -> str:
+        with self._lock:
+            requests = ', '.join('{0}: {1}'.format(k, v) for k, v in sorted(self.requests.items()))
+            statuses = ', '.join('{0}: {1}'.format(k, v) for k, v in sorted(self.statuses.items()))
+            return 'server: {0} requests ({1}); responses ({2}); {3} quota units charged'.format(
+                sum(self.requests.values()), requests, statuses, self.quota_used)
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    """HTTP server that handles each request in a new thread.
+
+    note: `http.server.ThreadingHTTPServer` only exists from Python 3.7.
+    """
+    daemon_threads = True
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """routes requests to the `FakeYouTube` in `api`."""
+
+    api = None
+
+    # note: keeps connections alive, as the API client does.
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+        if url.path == DISCOVERY_PATH:
+            self.send_json(200, discovery_document(self.api.root_url))
+            return
+        methods = {'/' + SERVICE_PATH + method.split('.')[0]: method for method in METHOD_PARAMETERS}
+        if url.path not in methods:
+            self.send_json(404, ApiError(404, 'notFound', 'Not Found').body())
+            return
+        self.send_json(*self.api.handle(methods[url.path], params))
+
+    def send_json(self, status: int, body: dict) -> None:
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+def discovery_document(root_url: str) -> dict:
+    """returns a discovery document describing the methods served by
+    `FakeYouTube` at `root_url`."""
+    string = {'type': 'string', 'location': 'query'}
+    resources = {}
+    schemas = {}
+    for method, names in METHOD_PARAMETERS.items():
+        resource = method.split('.')[0]
+        # note: the client only parses responses as JSON if the method has a response schema.
+        schema = resource[0].upper() + resource[1:] + 'ListResponse'
+        schemas[schema] = {'id': schema, 'type': 'object'}
+        parameters = {name: dict(string) for name in names}
+        parameters['part'] = dict(string, required=True)
+        parameters['pageToken'] = dict(string)
+        parameters['maxResults'] = {'type': 'integer', 'location': 'query', 'minimum': '0', 'maximum': str(MAX_RESULTS)}
+        resources[resource] = {'methods': {'list': {
+            'id': 'youtube.{0}'.format(method),
+            'path': resource,
+            'httpMethod': 'GET',
+            'parameters': parameters,
+            'parameterOrder': ['part'],
+            'response': {'$ref': schema},
+        }}}
+    return {
+        'kind': 'discovery#restDescription',
+        'discoveryVersion': 'v1',
+        'id': 'youtube:v3',
+        'name': 'youtube',
+        'version': 'v3',
+        'rootUrl': root_url,
+        'servicePath': SERVICE_PATH,
+        'baseUrl': root_url + SERVICE_PATH,
+        'batchPath': 'batch/youtube/v3',
+        'protocol': 'rest',
+        'parameters': {'key': dict(string), 'alt': dict(string, default='json'), 'fields': dict(string)},
+        'schemas': schemas,
+        'resources': resources,
+    }
+
+
+def channel_id(channel_title: str) -> str:
+    """returns a channel ID ("UC" followed by 22 characters) derived from a channel title."""
+    return 'UC' + hashlib.sha1(channel_title.encode('utf-8')).hexdigest()[:22]
+
+
+_EMPTY = np.array([], dtype=int)
+
+
+def _group(keys: np.ndarray, values: np.ndarray = None) -> dict:
+    """returns {key: sorted array of the values (default: positions) with that key}."""
+    values = np.arange(keys.shape[0]) if values is None else values
+    codes, uniques = pd.factorize(keys)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return {key: np.sort(values[order[bounds[i]:bounds[i+1]]]) for i, key in enumerate(uniques)}
+
+
+def _timestamp(value: str) -> int:
+    try:
+        return int(pd.Timestamp(value).timestamp())
+    except ValueError:
+        raise ApiError(400, 'invalidParameter', 'Invalid date: {0}'.format(value))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000, help='Number of videos in the corpus.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Host to listen on.')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds each request is delayed by.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Maximum seconds added at random to --latency.')
+    parser.add_argument('--fault_rate', type=float, default=0.0, help='Probability that a request fails with a 5xx error.')
+    parser.add_argument('--quota', type=int, default=None, help='Quota units before requests fail with "quotaExceeded".')
+    args = parser.parse_args()
+    fake = FakeYouTube.from_corpus(args.rows, seed=args.seed, latency=args.latency, jitter=args.jitter,
+                                   fault_rate=args.fault_rate, quota=args.quota)
+    print('Serving {0} videos. Use:\n\n    export YOUTUBE_DISCOVERY_URL={1}\n'.format(
+        fake.video_ids.shape[0], fake.start(args.host, args.port)))
+    try:
+        while True:
+            time.sleep(60)
+            print(fake.summary())
+    except KeyboardInterrupt:
+        fake.stop()
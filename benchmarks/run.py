@@ -0,0 +1,227 @@
+"""benchmarks the data and ML hot paths on synthetic corpora (see
+`benchmarks.corpus`) of increasing size.
+
+Each benchmark is timed `--repeat` times (the fastest and median runs are
+reported) and run once more under `tracemalloc` to measure its peak Python
+and numpy memory allocation. Results are saved as JSON, tagged with the git
+commit, so that runs on different commits can be compared with `--compare`.
+
+Usage::
+
+    python -m benchmarks.run --sizes 10000 100000 1000000
+
+    # compares against the results of an earlier run.
+    python -m benchmarks.run --sizes 10000 100000 --compare data/generated/benchmarks/results_<...>.json
+"""
+
+import io
+import os
+import json
+import time
+import shutil
+import argparse
+import platform
+import datetime
+import contextlib
+import subprocess
+import tracemalloc
+import numpy as np
+
+from module import settings, video_store
+from module.utils import duration_str_to_num
+from module.video_relevance import train
+from module.video_relevance.preprocessing import Featurizer
+from benchmarks import corpus
+
+# directory in which corpora and results are saved.
+BENCHMARKS_PATH = os.path.join(settings.DATA_DIR, 'generated', 'benchmarks')
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+
+class Context(object):
+    """paths to a synthetic corpus, and data shared by the benchmarks."""
+
+    def __init__(self, path: str, n_rows: int):
+        self.path = path
+        self.n_rows = n_rows
+        self.snapshots_path, self.labels_path = corpus.write(path, n_rows)
+        self.store_path = os.path.join(path, 'generated', 'videos.parquet')
+        self.unique_path = os.path.join(path, 'generated', 'videos_unique.parquet')
+        self.videos = video_store.load_store(store_path=self.store_path, snapshots_path=self.snapshots_path)
+        self.unique_videos = self.videos.drop_duplicates('video_id').fillna({'title': '', 'channel_title': ''})
+        self.featurizer = Featurizer(max_features=1000).fit(self.unique_videos)
+
+
+def bench_get_videos_cold(ctx: Context):
+    """builds the store from the csv snapshots (i.e. the first `utils.get_videos`)."""
+    store_path = os.path.join(ctx.path, 'generated', 'videos_cold.parquet')
+
+    def setup():
+        if os.path.isdir(store_path):
+            shutil.rmtree(store_path)
+    return setup, lambda: video_store.load_store(store_path=store_path, snapshots_path=ctx.snapshots_path)
+
+
+def bench_get_videos(ctx: Context):
+    """loads the store (i.e. every later `utils.get_videos`)."""
+    return None, lambda: video_store.load_store(store_path=ctx.store_path, snapshots_path=ctx.snapshots_path)
+
+
+def bench_dedupe_video_ids(ctx: Context):
+    from module.video_scraper import dedupe_video_ids
+    search_results = [{'id': {'videoId': video_id}} for video_id in ctx.videos.video_id.values]
+    return None, lambda: dedupe_video_ids(search_results)
+
+
+def bench_duration_str_to_num(ctx: Context):
+    durations = ctx.videos.duration.values
+    return None, lambda: duration_str_to_num(durations)
+
+
+def bench_featurizer_fit(ctx: Context):
+    return None, lambda: Featurizer(max_features=1000).fit(ctx.unique_videos)
+
+
+def bench_featurizer_transform(ctx: Context):
+    return None, lambda: ctx.featurizer.transform(ctx.unique_videos)
+
+
+def bench_load_data(ctx: Context):
+    """loads labeled videos (i.e. `train.load_data`)."""
+    store_kwargs = {'path': ctx.unique_path, 'store_path': ctx.store_path, 'snapshots_path': ctx.snapshots_path}
+    setup = lambda: os.remove(ctx.unique_path) if os.path.exists(ctx.unique_path) else None
+    return setup, lambda: train.load_data(
+        store_kwargs=store_kwargs, labels_path=ctx.labels_path,
+        active_learning_path=os.path.join(ctx.labels_path, 'active_learning'))
+
+
+# benchmarks, by name. Each takes a `Context` and returns (setup, func), where
+# `setup` (or None) is called before each run of `func`, or returns None if
+# the benchmark cannot be run.
+BENCHMARKS = {
+    'get_videos_cold': bench_get_videos_cold,
+    'get_videos': bench_get_videos,
+    'dedupe_video_ids': bench_dedupe_video_ids,
+    'duration_str_to_num': bench_duration_str_to_num,
+    'featurizer_fit': bench_featurizer_fit,
+    'featurizer_transform': bench_featurizer_transform,
+    'load_data': bench_load_data,
+}
+
+
+def measure(setup, func, repeat: int) -> dict:
+    """returns the fastest and median time, and the peak memory allocated, of
+    `func`."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        # note: silences progress messages printed by `func`.
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': min(times), 'median_seconds': float(np.median(times)), 'peak_mb': peak / 1024 ** 2}
+
+
+def main(sizes: list = DEFAULT_SIZES,
+         benchmarks: list = None,
+         repeat: int = 3,
+         outpath: str = None,
+         compare: str = None,
+         clean: bool = False) -> dict:
+    """runs each benchmark on a corpus of each size and saves the results.
+
+    Arguments:
+
+        sizes: List[int]. Number of rows in each corpus.
+
+        benchmarks: List[str]. Names of benchmarks in `BENCHMARKS` to run.
+            Defaults to all.
+
+        repeat: int. Number of timed runs of each benchmark.
+
+        outpath: str. Path to the results JSON. Defaults to a file in
+            `BENCHMARKS_PATH` named after the time and git commit.
+
+        compare: str. Path to earlier results to compare against.
+
+        clean: bool. If True, deletes each corpus after benchmarking it.
+    """
+    benchmarks = benchmarks if benchmarks is not None else list(BENCHMARKS)
+    commit = _git_commit()
+    results = {
+        'commit': commit,
+        'created': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': [],
+    }
+    for n_rows in sizes:
+        path = os.path.join(BENCHMARKS_PATH, 'corpus_{0}'.format(n_rows))
+        print('Preparing corpus of {0} rows in {1}...'.format(n_rows, path))
+        ctx = Context(path, n_rows)
+        for name in benchmarks:
+            benchmark = BENCHMARKS[name](ctx)
+            if benchmark is None:
+                continue
+            setup, func = benchmark
+            result = dict(name=name, rows=n_rows, **measure(setup, func, repeat))
+            results['results'].append(result)
+            print('{name:<22} {rows:>8} rows  {seconds:>9.4f}s  {peak_mb:>9.1f} MB'.format(**result))
+        if clean:
+            shutil.rmtree(path)
+    if outpath is None:
+        outpath = os.path.join(BENCHMARKS_PATH, 'results_{0}_{1}.json'.format(
+            datetime.datetime.now().strftime('%Y-%m-%dT%H-%M-%S'), commit or 'unknown'))
+    os.makedirs(os.path.dirname(os.path.abspath(outpath)), exist_ok=True)
+    with open(outpath, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Saved results to {0}'.format(outpath))
+    if compare is not None:
+        with open(compare, 'r') as f:
+            print_comparison(json.load(f), results)
+    return results
+
+
+def print_comparison(before: dict, after: dict) -> None:
+    """prints the change in time and memory of each benchmark run in both `before` and `after`."""
+    previous = {(result['name'], result['rows']): result for result in before['results']}
+    print('Compared to {0} ({1}):'.format(before.get('commit'), before.get('created')))
+    for result in after['results']:
+        key = (result['name'], result['rows'])
+        if key not in previous:
+            continue
+        print('{0:<22} {1:>8} rows  time x{2:.2f}  memory x{3:.2f}'.format(
+            result['name'], result['rows'],
+            result['seconds'] / max(previous[key]['seconds'], 1e-9),
+            result['peak_mb'] / max(previous[key]['peak_mb'], 1e-9)))
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.PROJECT_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Number of rows in each corpus.')
+    parser.add_argument('--benchmarks', type=str, nargs='+', default=None, choices=sorted(BENCHMARKS), help='Benchmarks to run. Defaults to all.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs of each benchmark.')
+    parser.add_argument('--outpath', type=str, default=None, help='Path to the results JSON.')
+    parser.add_argument('--compare', type=str, default=None, help='Path to earlier results to compare against.')
+    parser.add_argument('--clean', action='store_true', help='Delete each corpus after benchmarking it.')
+    args = parser.parse_args()
+    main(**args.__dict__)
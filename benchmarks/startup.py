@@ -0,0 +1,74 @@
+"""measures the startup time of the `python -m module` CLI (see
+`module.__main__`) against a time budget.
+
+Each command line is run `--repeat` times in a fresh interpreter and its
+fastest wall time is compared with `BUDGET_SECONDS`. The bare interpreter
+startup time (`python -c pass`) is reported alongside for reference. Exits
+with status 1 if any command is over budget, so it can be run in CI.
+
+Usage::
+
+    python -m benchmarks.startup [--repeat 5] [--budget 0.25]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from module import settings
+
+# maximum startup time of a command, in seconds.
+BUDGET_SECONDS = 0.25
+
+
+def command_lines(tmpdir: str) -> list:
+    """returns the command lines whose startup time is measured."""
+    return [
+        ['--help'],
+        ['scrape', '--help'],
+        ['sample', '--help'],
+        ['train', '--help'],
+        ['predict', '--help'],
+        ['download', '--help'],
+        ['download', '--status', '--queue_path', os.path.join(tmpdir, 'downloads.sqlite')],
+    ]
+
+
+def best_time(argv: list, repeat: int) -> float:
+    """returns the fastest of `repeat` runs of `python argv`, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + argv, cwd=settings.PROJECT_DIR,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(repeat: int = 5, budget: float = BUDGET_SECONDS) -> int:
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print('{0:<62} {1:>8.3f}s'.format('python -c pass', best_time(['-c', 'pass'], repeat)))
+        over_budget = 0
+        for argv in command_lines(tmpdir):
+            seconds = best_time(['-m', 'module'] + argv, repeat)
+            over = seconds > budget
+            over_budget += over
+            name = ' '.join(['python -m module'] + argv).replace(tmpdir, '$TMPDIR')
+            print('{0:<62} {1:>8.3f}s{2}'.format(name, seconds, '  OVER BUDGET' if over else ''))
+    finally:
+        shutil.rmtree(tmpdir)
+    print('{0} of {1} commands over the budget of {2}s'.format(over_budget, len(command_lines(tmpdir)), budget))
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5, help='Number of runs of each command.')
+    parser.add_argument('--budget', type=float, default=BUDGET_SECONDS, help='Maximum startup time, in seconds.')
+    args = parser.parse_args()
+    sys.exit(main(**args.__dict__))
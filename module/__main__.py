@@ -0,0 +1,176 @@
+"""command-line entry point for the project's pipelines.
+
+Usage::
+
+    python -m module <command> [options]
+
+Commands:
+
+    scrape      searches YouTube for new videos (see `module.video_scraper`).
+    sample      samples videos to label (see `module.sample_videos`).
+    train       searches for the best video relevance classifier (see
+                `module.video_relevance.train`).
+    predict     scores scraped videos for relevance (see
+                `module.video_relevance.predict`).
+    download    downloads videos (see `module.video_download`).
+
+Run `python -m module <command> --help` for the options of each command.
+
+A command's module is only imported once the command runs, and modules
+import their heavy dependencies (pandas, scikit-learn, tpot, the Google API
+client) as late as they can, so `--help` and short commands (e.g.
+`download --status`) start quickly. `benchmarks.startup` measures startup
+time against `benchmarks.startup.BUDGET_SECONDS`.
+
+The scrape, train and download commands accept `--metrics-path` and
+`--prometheus-path` (see `module.metrics`).
+"""
+
+import sys
+import argparse
+import datetime
+
+from module import metrics
+from module.metrics import METRICS
+
+
+def run_scrape(args: argparse.Namespace, unknown: list) -> None:
+    from module import request_scheduler, video_scraper
+    if args.quota is None:
+        args.quota = request_scheduler.DEFAULT_QUOTA
+    video_scraper.main(args)
+
+
+def run_sample(args: argparse.Namespace, unknown: list) -> None:
+    from module import sample_videos
+    sample_videos.main(**vars(args))
+
+
+def run_train(args: argparse.Namespace, unknown: list) -> None:
+    from module.utils import parse_unknown_args
+    from module.video_relevance import train
+    # note: any other option is passed through to the featurizer or TPOT.
+    train.main(**vars(args), **vars(parse_unknown_args(unknown)))
+
+
+def run_predict(args: argparse.Namespace, unknown: list) -> None:
+    from module.video_relevance import predict
+    predict.main(**vars(args))
+
+
+def run_download(args: argparse.Namespace, unknown: list) -> None:
+    from module import video_download
+    kwargs = vars(args)
+    if kwargs.get('bandwidth') is not None:
+        kwargs['bandwidth'] = video_download.parse_bytes(kwargs['bandwidth'])
+    video_download.main(**kwargs)
+
+
+def add_scrape_arguments(parser: argparse.ArgumentParser) -> None:
+    # note: rounded down to the start of the day, so that searches made by
+    # runs on the same day are identical and can be served from the cache.
+    one_week_ago = (datetime.datetime.now() - datetime.timedelta(days=7)).strftime(format="%Y-%m-%dT00:00:00Z")
+    parser.add_argument("--max-results", help="Max results", type=int, default=50)
+    parser.add_argument("--published-after", help="Published after (e.g. '2017-04-01T00:00:00Z'. Default is one week ago", type=str, default=one_week_ago)
+    parser.add_argument("--max-pages", help="Max pages", type=int, default=10)
+    parser.add_argument("--region-code", help="Region code'", type=str, default="US")
+    parser.add_argument("--relevance-language", help="Relevance language'", type=str, default="en")
+    parser.add_argument("--workers", help="Max number of concurrent API requests", type=int, default=8)
+    parser.add_argument("--quota", help="Max API quota units to spend. Defaults to request_scheduler.DEFAULT_QUOTA", type=int, default=None)
+    parser.add_argument("--rate", help="Max API requests per second", type=float, default=10.0)
+    parser.add_argument("--resume", help="Resume the most recent interrupted run", action="store_true")
+    parser.add_argument("--no-cache", help="Do not use the API response cache", action="store_true")
+    parser.add_argument("--full-window", help="Search the full --published-after window, ignoring high-water marks", action="store_true")
+
+
+def add_sample_arguments(parser: argparse.ArgumentParser) -> None:
+    # note: the choices repeat `sample_videos.STRATIFY_OPTIONS` and
+    # `ALLOCATION_OPTIONS`, so that building the parser does not import pandas.
+    parser.add_argument('--size', type=int, default=500, help='Number of videos to sample.')
+    parser.add_argument('--seed', type=int, default=872614, help='Random seed.')
+    parser.add_argument('--before', type=str, default=None, help='Only sample videos published before this date (e.g. 2017-08-15).')
+    parser.add_argument('--after', type=str, default=None, help='Only sample videos published on or after this date.')
+    parser.add_argument('--stratify', type=str, default=None, choices=('channel', 'week'), help='Stratify the sample by channel or week.')
+    parser.add_argument('--allocation', type=str, default='proportional', choices=('proportional', 'equal'), help='How to divide the sample across strata.')
+    parser.add_argument('--include_labeled', action='store_true', help='Also sample videos that have already been labeled.')
+    parser.add_argument('--chunk_size', type=int, default=50000, help='Number of rows read at a time.')
+    parser.add_argument('--outpath', type=str, default=argparse.SUPPRESS, help='Path to the saved sample. Defaults to sample_videos.SAMPLE_PATH.')
+
+
+def add_train_arguments(parser: argparse.ArgumentParser) -> None:
+    # note: train's options are parsed by `utils.parse_unknown_args`.
+    pass
+
+
+def add_predict_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--model_path', type=str, required=True, help='Path to the saved model artifact.')
+    parser.add_argument('--preds_path', type=str, default=argparse.SUPPRESS, help='Path to the predictions csv. Defaults to predict.PREDS_PATH.')
+    parser.add_argument('--chunk_size', type=int, default=10000, help='Maximum number of videos scored at once.')
+    parser.add_argument('--n_jobs', type=int, default=1, help='Number of processes.')
+    parser.add_argument('--new_only', action='store_true', help='Only score videos that have not been scored yet.')
+
+
+def add_download_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--workers', type=int, default=4, help='Number of concurrent downloads.')
+    parser.add_argument('--max_retries', type=int, default=3, help='Number of times a failed download is retried.')
+    parser.add_argument('--bandwidth', type=str, default=None, help='Maximum total download rate in bytes per second (e.g. "2M").')
+    parser.add_argument('--channel_title', type=str, default=None, help='Download all videos from this channel rather than predicted speeches.')
+    parser.add_argument('--output_dir', type=str, default=argparse.SUPPRESS, help='Directory to which videos are downloaded. Defaults to video_download.DOWNLOADS_PATH.')
+    parser.add_argument('--queue_path', type=str, default=argparse.SUPPRESS, help='Path to the job queue. Defaults to video_download.QUEUE_PATH.')
+    parser.add_argument('--verify', dest='verify_files', action='store_true', help='Re-hash finished downloads and requeue any that changed.')
+    parser.add_argument('--status', action='store_true', help='Print the number of jobs with each status and exit.')
+
+
+# commands, by name: (add_arguments, run, help, accepts_metrics_options).
+COMMANDS = {
+    'scrape': (add_scrape_arguments, run_scrape, 'Search YouTube for new videos.', True),
+    'sample': (add_sample_arguments, run_sample, 'Sample videos to label.', False),
+    'train': (add_train_arguments, run_train, 'Search for the best video relevance classifier. Other '
+              'options are passed to the featurizer or TPOTClassifier (see module.video_relevance.train).', True),
+    'predict': (add_predict_arguments, run_predict, 'Score scraped videos for relevance.', False),
+    'download': (add_download_arguments, run_download, 'Download videos.', True),
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m module', description='Campaign video pipelines.')
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    for name, (add_arguments, _, help, accepts_metrics_options) in COMMANDS.items():
+        # note: options passed through to `train` must not be mistaken for
+        # abbreviations of the command's own options.
+        subparser = subparsers.add_parser(name, help=help, description=help, allow_abbrev=False)
+        add_arguments(subparser)
+        if accepts_metrics_options:
+            metrics.add_arguments(subparser)
+    return parser
+
+
+def main(argv: list = None) -> int:
+    """parses `argv` (defaults to the command line arguments) and runs the command.
+
+    Returns:
+
+        exit_code: int.
+    """
+    parser = build_parser()
+    args, unknown = parser.parse_known_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+    command = args.command
+    del args.command
+    if len(unknown) and command != 'train':
+        parser.error('unrecognized arguments: {0}'.format(' '.join(unknown)))
+    add_arguments, run, _, accepts_metrics_options = COMMANDS[command]
+    if accepts_metrics_options:
+        METRICS.configure(command, path=args.metrics_path, prometheus_path=args.prometheus_path)
+        del args.metrics_path, args.prometheus_path
+    try:
+        run(args, unknown)
+    finally:
+        METRICS.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""per-channel high-water marks for incremental scraping.
+
+A high-water mark is the latest `publishedAt` of any video returned by a
+channel search. Each run only asks for videos published after the mark, so
+quota use and runtime scale with the number of new videos rather than with
+the size of the search window.
+
+Only channel searches have marks. Keyword searches are ordered by relevance,
+which may skip videos of any date, so they always search the whole window.
+
+A mark may only be raised by a search ordered by date that ran out of
+results (see `module.video_scraper.update_high_water_marks`), or videos
+published before the mark would never be searched for again.
+
+Marks are saved as a JSON object in `data/generated/high_water_marks.json`,
+mapping keys such as "channelId:UCx..." to timestamps.
+"""
+
+import os
+import json
+import threading
+
+from module import settings
+
+# path to the saved marks.
+HIGH_WATER_MARKS_PATH = os.path.join(settings.DATA_DIR, 'generated', 'high_water_marks.json')
+
+
+class HighWaterMarks(object):
+    """latest `publishedAt` seen per search. All methods are thread safe.
+
+    Arguments:
+
+        marks: dict. Maps keys to RFC 3339 timestamps.
+
+        path: str. Path to the saved marks.
+    """
+
+    def __init__(self, marks: dict = None, path: str = HIGH_WATER_MARKS_PATH):
+        self.marks = marks if marks is not None else {}
+        self.path = path
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str = HIGH_WATER_MARKS_PATH) -> 'HighWaterMarks':
+        marks = {}
+        if os.path.isfile(path):
+            with open(path, 'r') as f:
+                marks = json.load(f)
+        return cls(marks, path=path)
+
+    def published_after(self, key: str, default: str) -> str:
+        """returns the later of `default` and the mark for `key`.
+
+        Timestamps are compared as strings, which orders RFC 3339 UTC
+        timestamps chronologically.
+        """
+        with self._lock:
+            mark = self.marks.get(key)
+        if mark is None or mark < default:
+            return default
+        return mark
+
+    def update(self, key: str, published_ats) -> None:
+        """raises the mark for `key` to the latest of `published_ats`."""
+        published_ats = [published_at for published_at in published_ats if published_at]
+        if len(published_ats) == 0:
+            return
+        latest = max(published_ats)
+        with self._lock:
+            if key not in self.marks or self.marks[key] < latest:
+                self.marks[key] = latest
+
+    def save(self) -> None:
+        """atomically writes the marks to disk."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with self._lock, open(tmp_path, 'w') as f:
+            json.dump(self.marks, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
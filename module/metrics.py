@@ -0,0 +1,246 @@
+"""timers, counters and histograms for scrape, training and download runs.
+
+Metrics are recorded on the module-level `METRICS` registry, which is
+disabled by default: every method then returns immediately, so
+instrumented code costs a single attribute check when metrics are off. A
+command-line entry point enables it with `METRICS.configure(...)`, after
+which:
+
+    - each timed phase is appended to a JSON lines file as it finishes, and
+      a summary of all counters, gauges and histograms is appended when the
+      run ends (`METRICS.close()`).
+    - if a Prometheus textfile path is given, all metrics are also written
+      in the Prometheus text exposition format (e.g. for the node exporter's
+      textfile collector).
+
+Example::
+
+    >>> METRICS.configure('scrape', path='metrics.jsonl', prometheus_path='scrape.prom')
+    >>> with METRICS.timer('search'):
+    ...     METRICS.inc('api_calls', method='search.list')
+    ...     METRICS.observe('api_request_seconds', 0.21, method='search.list')
+    >>> METRICS.close()
+"""
+
+import os
+import json
+import time
+import bisect
+import datetime
+import threading
+import contextlib
+
+# upper bounds (in seconds) of the buckets of latency histograms.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+
+# prefix of each metric name in the Prometheus textfile.
+PROMETHEUS_PREFIX = 'kenya_campaign_'
+
+
+class Histogram(object):
+    """counts of observations in cumulative buckets, plus their sum."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def summary(self) -> dict:
+        return {'count': self.count, 'sum': self.sum, 'mean': self.sum / self.count if self.count else None}
+
+
+class Metrics(object):
+    """registry of counters, gauges and histograms. All methods are thread safe.
+
+    Metrics are keyed by name and an optional set of labels, passed as
+    keyword arguments (e.g. `inc('api_calls', method='search.list')`).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.job = None
+        self.path = None
+        self.prometheus_path = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+
+    def configure(self, job: str, path: str = None, prometheus_path: str = None) -> None:
+        """enables recording.
+
+        Arguments:
+
+            job: str. Name of the run (e.g. "scrape"), included in every JSON
+                line and as a Prometheus label.
+
+            path: str. Path to the JSON lines file. Lines are appended.
+
+            prometheus_path: str. Path to the Prometheus textfile. Overwritten
+                on `close`.
+        """
+        self.job = job
+        self.path = path
+        self.prometheus_path = prometheus_path
+        self.started = time.time()
+        # note: stays disabled if there is nowhere to write metrics to.
+        self.enabled = path is not None or prometheus_path is not None
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """adds `value` to a counter."""
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """sets a gauge."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """records an observation in a histogram (e.g. a request latency in seconds)."""
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    def timer(self, phase: str):
+        """returns a context manager that times a phase of the run.
+
+        The duration is recorded in the `phase_seconds` histogram and appended
+        to the JSON lines file.
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return self._timer(phase)
+
+    @contextlib.contextmanager
+    def _timer(self, phase: str):
+        start = time.time()
+        try:
+            yield
+        finally:
+            seconds = time.time() - start
+            self.observe('phase_seconds', seconds, phase=phase)
+            self.event('phase', phase=phase, seconds=seconds)
+
+    def event(self, event: str, **fields) -> None:
+        """appends a record to the JSON lines file."""
+        if not self.enabled or self.path is None:
+            return
+        record = dict({'time': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S.%f'), 'job': self.job, 'event': event}, **fields)
+        line = json.dumps(record, sort_keys=True, default=str)
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+    def summary(self) -> dict:
+        """returns all counters, gauges and histogram summaries."""
+        with self._lock:
+            return {
+                'counters': [dict(name=name, labels=dict(labels), value=value) for (name, labels), value in sorted(self.counters.items())],
+                'gauges': [dict(name=name, labels=dict(labels), value=value) for (name, labels), value in sorted(self.gauges.items())],
+                'histograms': [dict(name=name, labels=dict(labels), **histogram.summary()) for (name, labels), histogram in sorted(self.histograms.items())],
+            }
+
+    def close(self) -> None:
+        """writes the summary to the JSON lines file and the Prometheus
+        textfile, and disables recording."""
+        if not self.enabled:
+            return
+        self.set('run_seconds', time.time() - self.started)
+        self.set('last_run_timestamp_seconds', time.time())
+        self.event('summary', **self.summary())
+        if self.prometheus_path is not None:
+            self.write_prometheus(self.prometheus_path)
+        self.enabled = False
+
+    def write_prometheus(self, path: str) -> None:
+        """atomically writes all metrics in the Prometheus text format."""
+        lines = []
+        typed = set()
+
+        def add_type(name, metric_type):
+            # note: each metric's TYPE line must precede all of its samples.
+            if name not in typed:
+                typed.add(name)
+                lines.append('# TYPE {0}{1} {2}'.format(PROMETHEUS_PREFIX, name, metric_type))
+
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                add_type(name + '_total', 'counter')
+                lines.append(_prometheus_line(name + '_total', labels, value, self.job))
+            for (name, labels), value in sorted(self.gauges.items()):
+                add_type(name, 'gauge')
+                lines.append(_prometheus_line(name, labels, value, self.job))
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                add_type(name, 'histogram')
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(_prometheus_line(name + '_bucket', labels + (('le', le),), cumulative, self.job))
+                lines.append(_prometheus_line(name + '_sum', labels, histogram.sum, self.job))
+                lines.append(_prometheus_line(name + '_count', labels, histogram.count, self.job))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
+
+
+def _key(name: str, labels: dict) -> tuple:
+    # note: label values are strings, so that keys are sortable (e.g. an
+    # error reason may be None).
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _prometheus_line(name: str, labels: tuple, value: float, job: str) -> str:
+    labels = (('job', job),) + tuple(labels)
+    label_str = ','.join('{0}="{1}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels)
+    return '{0}{1}{{{2}}} {3}'.format(PROMETHEUS_PREFIX, name, label_str, value)
+
+
+class _NullTimer(object):
+    """no-op context manager returned by `Metrics.timer` when metrics are
+    disabled."""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+# shared no-op timer returned when metrics are disabled.
+_NULL_TIMER = _NullTimer()
+
+# metrics of the current run.
+METRICS = Metrics()
+
+
+def add_arguments(parser) -> None:
+    """adds --metrics-path and --prometheus-path options to an argparse parser.
+
+    note: the options can also be spelled with underscores, like the other
+    options of `video_download`.
+    """
+    parser.add_argument('--metrics-path', '--metrics_path', dest='metrics_path', type=str, default=None, help='Append phase timings and a metrics summary to this JSON lines file.')
+    parser.add_argument('--prometheus-path', '--prometheus_path', dest='prometheus_path', type=str, default=None, help='Write metrics to this Prometheus textfile.')
@@ -0,0 +1,259 @@
+"""quota-aware scheduler for YouTube Data API requests.
+
+Every request made by the `youtube_*_list` helpers in `video_scraper` goes
+through a `RequestScheduler`, which:
+
+    - tracks the YouTube Data API quota units spent per method (a
+      search.list call costs 100 units, a videos.list call costs 1 unit);
+    - enforces a token-bucket rate limit on requests across all threads;
+    - retries transient errors (5xx, 429 and rate-limit 403s) with
+      exponential backoff and full jitter;
+    - admits waiting requests in priority order, and refuses low-priority
+      requests once the remaining quota falls into the reserve held back for
+      higher-priority requests, raising `QuotaExceededError`;
+    - refuses every later request once the API itself reports that the
+      quota is exhausted.
+
+Priorities are integers, where lower numbers are more important. The scraper
+gives video detail lookups the highest priority so that search results that
+have already been paid for are never lost for lack of quota.
+
+Example::
+
+    >>> scheduler = RequestScheduler(quota=10000, rate=5.0)
+    >>> response = scheduler.execute('search.list', youtube.search().list(q='raila', part='id'), priority=PRIORITY_LOW)
+    >>> print(scheduler.summary())
+"""
+
+import json
+import time
+import heapq
+import random
+import itertools
+import threading
+from googleapiclient.errors import HttpError
+
+from module import youtube_client
+from module.metrics import METRICS
+
+# quota units per call, from https://developers.google.com/youtube/v3/determine_quota_cost.
+QUOTA_COSTS = {
+    'search.list': 100,
+    'videos.list': 1,
+    'playlistItems.list': 1,
+}
+
+# default YouTube Data API daily quota.
+DEFAULT_QUOTA = 10000
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# HTTP statuses that are always retried.
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# error reasons for which a 403 is retried.
+RETRYABLE_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'backendError'}
+
+# error reasons of a 403 meaning that no more requests will succeed today.
+# Any other non-retryable 403 (e.g. "forbidden", "accessNotConfigured" or
+# "keyInvalid") is raised as an `HttpError`.
+QUOTA_REASONS = {'quotaExceeded', 'dailyLimitExceeded'}
+
+
+class QuotaExceededError(Exception):
+    """raised when a request is refused because of insufficient quota."""
+    pass
+
+
+class TokenBucket(object):
+    """token-bucket rate limiter.
+
+    Not thread safe on its own; `RequestScheduler` guards it with a lock.
+
+    Arguments:
+
+        rate: float. Tokens added per second.
+
+        capacity: float. Maximum number of tokens (i.e. the largest burst).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.time()
+
+    def _refill(self) -> None:
+        now = time.time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, n: float = 1) -> float:
+        """returns seconds until `n` tokens are available (0 if they are available now)."""
+        self._refill()
+        if self.tokens >= n:
+            return 0.0
+        return (n - self.tokens) / self.rate
+
+    def take(self, n: float = 1) -> None:
+        self._refill()
+        self.tokens -= n
+
+
+class RequestScheduler(object):
+    """executes API requests under a quota budget and rate limit.
+
+    Arguments:
+
+        quota: int. Quota units this scheduler may spend.
+
+        rate: float. Maximum requests per second across all threads.
+
+        burst: int. Maximum number of requests sent in a burst.
+
+        max_retries: int. Maximum retries of a request on transient errors.
+
+        backoff_base: float. Backoff (in seconds) before the first retry. The
+            backoff doubles with each retry, up to `backoff_max`, and the
+            actual sleep is drawn uniformly from [0, backoff].
+
+        backoff_max: float. Maximum backoff in seconds.
+
+        reserve: int. Quota units held back per priority level. A request
+            with priority p is refused if it would leave fewer than
+            `p * reserve` units.
+    """
+
+    def __init__(self, quota: int = DEFAULT_QUOTA,
+                 rate: float = 10.0,
+                 burst: int = 10,
+                 max_retries: int = 5,
+                 backoff_base: float = 1.0,
+                 backoff_max: float = 64.0,
+                 reserve: int = 200):
+        self.quota = quota
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.reserve = reserve
+        self.bucket = TokenBucket(rate, burst)
+        self.used = 0
+        self.calls = {}
+        self.retries = 0
+        self.refused = 0
+        self.exhausted = False
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._counter = itertools.count()
+
+    @property
+    def remaining(self) -> int:
+        return self.quota - self.used
+
+    def execute(self, method: str, request, priority: int = PRIORITY_NORMAL):
+        """executes `request`, retrying transient errors.
+
+        Arguments:
+
+            method: str. API method (a key of `QUOTA_COSTS`).
+
+            request: apiclient.http.HttpRequest. Request to execute.
+
+            priority: int. Lower numbers are admitted first and may use more
+                of the quota.
+
+        Returns:
+
+            response: dict. API response.
+
+        Raises:
+
+            QuotaExceededError: if there is not enough quota left for a request
+                of this priority, or if the API reports (now or for an earlier
+                request) that the quota is exhausted.
+
+            HttpError: if the request fails with a non-transient error or the
+                maximum number of retries is reached.
+        """
+        attempt = 0
+        while True:
+            self._acquire(method, priority)
+            start = time.time()
+            try:
+                response = youtube_client.execute(request)
+                METRICS.observe('api_request_seconds', time.time() - start, method=method)
+                return response
+            except HttpError as e:
+                reason = error_reason(e)
+                METRICS.inc('api_errors', method=method, status=e.resp.status, reason=reason)
+                if e.resp.status == 403 and reason in QUOTA_REASONS:
+                    # note: requests waiting in `_acquire` are refused too,
+                    # rather than spending a call each to learn the same.
+                    with self._cond:
+                        self.exhausted = True
+                        self._cond.notify_all()
+                    raise QuotaExceededError('API refused request ({0}): {1}'.format(e.resp.status, reason)) from e
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                with self._cond:
+                    self.retries += 1
+                METRICS.inc('api_retries', method=method)
+                time.sleep(backoff)
+                attempt += 1
+
+    def _acquire(self, method: str, priority: int) -> None:
+        """waits until this request is first in line (by priority) and a
+        rate-limit token is available, then charges its quota units."""
+        cost = QUOTA_COSTS[method]
+        with self._cond:
+            ticket = (priority, next(self._counter))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    if self.exhausted or self.remaining - cost < priority * self.reserve:
+                        self.refused += 1
+                        METRICS.inc('api_refused', method=method)
+                        if self.exhausted:
+                            raise QuotaExceededError('{0} refused: the API reported that the quota is exhausted'.format(method))
+                        raise QuotaExceededError('{0} refused: {1} quota units remaining'.format(method, self.remaining))
+                    if self._waiting[0] == ticket:
+                        wait = self.bucket.wait_time()
+                        if wait <= 0:
+                            self.bucket.take()
+                            self.used += cost
+                            self.calls[method] = self.calls.get(method, 0) + 1
+                            METRICS.inc('api_calls', method=method)
+                            METRICS.inc('quota_units', cost, method=method)
+                            return
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def summary(self) -> str:
+        calls = ', '.join('{0}: {1}'.format(k, v) for k, v in sorted(self.calls.items()))
+        return 'quota: {0} of {1} units used ({2}); {3} retries; {4} requests refused'.format(
+            self.used, self.quota, calls, self.retries, self.refused)
+
+
+def error_reason(error: HttpError) -> str:
+    """returns the reason (e.g. "quotaExceeded") of an API error, or None."""
+    try:
+        content = error.content.decode('utf-8') if isinstance(error.content, bytes) else error.content
+        return json.loads(content)['error']['errors'][0]['reason']
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+
+
+def is_retryable(error: HttpError) -> bool:
+    """returns True if an API error is transient."""
+    status = error.resp.status
+    if status in RETRYABLE_STATUSES:
+        return True
+    return status == 403 and error_reason(error) in RETRYABLE_REASONS
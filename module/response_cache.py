@@ -0,0 +1,131 @@
+"""on-disk cache of YouTube Data API responses.
+
+Responses are saved in a SQLite database in `data/generated`:
+
+    - search.list and playlistItems.list responses are keyed on the method and
+      the normalized request kwargs (including the page token), and expire
+      after the time-to-live set for the method in `TTLS`.
+    - videos.list items are saved per video ID and part, and never expire,
+      so details of a video that has already been looked up are never
+      requested again.
+
+Only the videos.list cache saves quota across daily runs. Searches are
+keyed on `publishedAfter`, which is rounded to the day, and expire after a
+few hours, so the search.list and playlistItems.list caches only serve
+re-runs (e.g. `--resume` after a crash) on the same day.
+
+Example::
+
+    >>> cache = ResponseCache()
+    >>> response = cache.get('search.list', kwargs)
+    >>> if response is None:
+    ...     response = youtube.search().list(**kwargs).execute()
+    ...     cache.set('search.list', kwargs, response)
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+from module import settings
+
+# path to the cache database.
+CACHE_PATH = os.path.join(settings.DATA_DIR, 'generated', 'youtube_cache.sqlite')
+
+# seconds before a cached response expires, by method. Search results are only
+# kept for a few hours so that each daily run sees newly published videos. The
+# next day's run therefore never gets a search cache hit.
+TTLS = {
+    'search.list': 6 * 60 * 60,
+    'playlistItems.list': 6 * 60 * 60,
+}
+
+
+class ResponseCache(object):
+    """SQLite cache of API responses. All methods are thread safe.
+
+    Arguments:
+
+        path: str. Path to the cache database.
+
+        ttls: dict. Seconds before a cached response expires, by method.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, ttls: dict = None):
+        self.path = path
+        self.ttls = ttls if ttls is not None else TTLS
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, method TEXT, response TEXT, created REAL)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS videos (video_id TEXT, part TEXT, item TEXT, created REAL, PRIMARY KEY (video_id, part))')
+
+    def get(self, method: str, kwargs: dict) -> dict:
+        """returns the cached response to a request, or None if it is not
+        cached or has expired."""
+        min_created = time.time() - self.ttls.get(method, 0)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response FROM responses WHERE key = ? AND created >= ?',
+                (request_key(method, kwargs), min_created)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, method: str, kwargs: dict, response: dict) -> None:
+        """caches the response to a request."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, method, response, created) VALUES (?, ?, ?, ?)',
+                (request_key(method, kwargs), method, json.dumps(response), time.time())
+            )
+
+    def get_videos(self, video_ids: list, part: str) -> dict:
+        """returns cached videos.list items for `video_ids`.
+
+        Returns:
+
+            items: dict. Maps each cached video ID to its item.
+        """
+        items = {}
+        with self._lock:
+            # note: SQLite limits the number of parameters in a query.
+            for i in range(0, len(video_ids), 500):
+                batch = list(video_ids[i:i+500])
+                rows = self._conn.execute(
+                    'SELECT video_id, item FROM videos WHERE part = ? AND video_id IN ({0})'.format(','.join('?' * len(batch))),
+                    [part] + batch
+                ).fetchall()
+                items.update((video_id, json.loads(item)) for video_id, item in rows)
+            self.hits += len(items)
+            self.misses += len(set(video_ids)) - len(items)
+        return items
+
+    def set_videos(self, items: list, part: str) -> None:
+        """caches videos.list items."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO videos (video_id, part, item, created) VALUES (?, ?, ?, ?)',
+                [(item['id'], part, json.dumps(item), now) for item in items]
+            )
+
+    def summary(self) -> str:
+        return 'cache: {0} hits, {1} misses'.format(self.hits, self.misses)
+
+
+def request_key(method: str, kwargs: dict) -> str:
+    """returns a key identifying a request, ignoring kwarg order and
+    None-valued kwargs."""
+    normalized = json.dumps([method, {k: v for k, v in kwargs.items() if v is not None}], sort_keys=True)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
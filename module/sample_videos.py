@@ -1,38 +1,217 @@
 """selects a random sample of videos and saves the sample to a csv file ondisk.
 
+Videos are streamed out of the csv snapshots in chunks and sampled in a
+single pass with reservoir sampling, so memory use does not grow with the
+number of rows (only the set of video IDs seen so far is kept, to skip
+videos that appear in more than one snapshot). Videos that have already been
+labeled (see `module.video_relevance.label_store`) are never sampled.
+
+With `--stratify channel` or `--stratify week`, a reservoir is kept for each
+channel or week of publication, and the sample is allocated across strata
+either in proportion to their size (`--allocation proportional`) or as
+evenly as possible (`--allocation equal`).
+
 Usage:
 
-    $ python -m sample_videos
+    $ python -m module sample --size 500 --before 2017-08-15
+
+    $ python -m module sample --size 500 --stratify week --allocation equal
 """
 
 import os
 import pandas as pd
 import numpy as np
-import settings
-
-def main():
-    max_date = "2017-08-15"
-    sample_size = 500
-    np.random.seed(872614)
-    inpath = os.path.join(settings.DATA_DIR, 'videos')
-    outpath = os.path.join(settings.DATA_DIR, 'generated', 'videos_to_label.csv')
-    all_videos = []
-    for fname in os.listdir(inpath):
-        videos = pd.read_csv(os.path.join(inpath, fname))
-        all_videos.append(videos)
-    all_videos = pd.concat(all_videos, axis=0)
-    assert all_videos.shape[1] == 5, 'there should be five columns'
-    assert all_videos.published_at.dtype == 'object'
-    videos_to_sample = all_videos[all_videos.published_at < max_date]
-    print('loaded {0} videos scraped before 2017-08-15'.format(videos_to_sample.shape[0]))
-    # samples N videos.
-    sampled_videos = videos_to_sample.sample(n=sample_size, replace=False, axis=0)
-    # shuffles the sampled videos.
-    sampled_videos = sampled_videos.sample(frac=1).reset_index(drop=True) 
+
+from module import settings, video_store
+from module.video_store import SNAPSHOT_COLUMNS
+from module.video_relevance import label_store
+
+# path to where the sample is saved.
+SAMPLE_PATH = os.path.join(settings.DATA_DIR, 'generated', 'videos_to_label.csv')
+
+STRATIFY_OPTIONS = ('channel', 'week')
+ALLOCATION_OPTIONS = ('proportional', 'equal')
+
+
+class Reservoir(object):
+    """uniform random sample of at most `size` items from a stream (i.e.
+    reservoir sampling, "algorithm R").
+
+    Arguments:
+
+        size: int. Maximum number of items in the sample.
+
+        random_state: np.random.RandomState.
+    """
+
+    def __init__(self, size: int, random_state: np.random.RandomState):
+        self.size = size
+        self.random_state = random_state
+        self.n_seen = 0
+        self.items = []
+
+    def extend(self, items: list) -> None:
+        """offers each of `items` to the sample, in order."""
+        n_fill = min(len(items), self.size - len(self.items))
+        self.items.extend(items[:n_fill])
+        rest = items[n_fill:]
+        if len(rest):
+            # the t-th item seen replaces a random item in the sample with
+            # probability size / t.
+            t = self.n_seen + n_fill + np.arange(1, len(rest) + 1)
+            slots = (self.random_state.random_sample(len(rest)) * t).astype(int)
+            for i in np.where(slots < self.size)[0]:
+                self.items[slots[i]] = rest[i]
+        self.n_seen += len(items)
+
+
+def main(size: int = 500,
+         seed: int = 872614,
+         before: str = None,
+         after: str = None,
+         stratify: str = None,
+         allocation: str = 'proportional',
+         include_labeled: bool = False,
+         chunk_size: int = 50000,
+         outpath: str = SAMPLE_PATH) -> int:
+    """samples videos from all snapshots and saves them to `outpath`.
+
+    Arguments:
+
+        size: int. Number of videos to sample.
+
+        seed: int. Random seed.
+
+        before, after: str. Only samples videos published before/after these
+            dates (e.g. "2017-08-15").
+
+        stratify: str. One of `STRATIFY_OPTIONS`, or None for a simple random sample.
+
+        allocation: str. One of `ALLOCATION_OPTIONS`.
+
+        include_labeled: bool. If True, also samples videos that have already
+            been labeled.
+
+        chunk_size: int. Number of rows read from the snapshots at a time.
+
+        outpath: str. Path to the saved sample.
+    """
+    random_state = np.random.RandomState(seed)
+    excluded = set() if include_labeled else set(label_store.load_labels().index)
+    chunks = video_store.iter_snapshot_chunks(chunk_size)
+    sampled_videos, n_eligible = sample(chunks, size, random_state, excluded=excluded,
+        before=before, after=after, stratify=stratify, allocation=allocation)
+    print('sampled {0} of {1} eligible videos'.format(sampled_videos.shape[0], n_eligible))
+    # writes published_at in the same format as the scraped snapshots.
+    sampled_videos.published_at = sampled_videos.published_at.dt.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    os.makedirs(os.path.dirname(outpath), exist_ok=True)
     sampled_videos.to_csv(outpath, index=False)
     print('saved {0} randomly sampled videos to {1}'.format(sampled_videos.shape[0], outpath))
     return 0
 
-if __name__ == '__main__':
-    main()
 
+def sample(chunks, size: int, random_state: np.random.RandomState, excluded: set = None,
+           before: str = None, after: str = None, stratify: str = None,
+           allocation: str = 'proportional'):
+    """samples videos from a stream of chunks in a single pass.
+
+    Arguments:
+
+        chunks: Iterable[pd.DataFrame]. Chunks of videos (e.g. from
+            `video_store.iter_snapshot_chunks`).
+
+        excluded: set. Video IDs that are never sampled.
+
+        See `main` for the other arguments.
+
+    Returns:
+
+        sampled_videos, n_eligible: Tuple[pd.DataFrame, int]. Shuffled sample
+            with columns `SNAPSHOT_COLUMNS`, and the number of distinct
+            videos it was drawn from.
+    """
+    assert stratify is None or stratify in STRATIFY_OPTIONS, 'stratify must be one of {0}'.format(STRATIFY_OPTIONS)
+    assert allocation in ALLOCATION_OPTIONS, 'allocation must be one of {0}'.format(ALLOCATION_OPTIONS)
+    excluded = set(excluded) if excluded is not None else set()
+    reservoirs = {}
+    for chunk in chunks:
+        chunk = chunk[SNAPSHOT_COLUMNS]
+        if before is not None:
+            chunk = chunk[chunk.published_at < before]
+        if after is not None:
+            chunk = chunk[chunk.published_at >= after]
+        # note: also skips videos seen in an earlier snapshot or earlier in this chunk.
+        is_new = []
+        for video_id in chunk.video_id.values:
+            is_new.append(video_id not in excluded)
+            excluded.add(video_id)
+        chunk = chunk[np.array(is_new, dtype=bool)]
+        rows = chunk.values.tolist()
+        for stratum, positions in _strata(chunk, stratify):
+            if stratum not in reservoirs:
+                reservoirs[stratum] = Reservoir(size, random_state)
+            reservoirs[stratum].extend([rows[i] for i in positions])
+    counts = {stratum: reservoir.n_seen for stratum, reservoir in reservoirs.items()}
+    rows = []
+    for stratum, n in allocate(counts, size, allocation).items():
+        items = reservoirs[stratum].items
+        # note: a uniform subsample of a uniform sample is a uniform sample.
+        rows.extend(items[i] for i in random_state.choice(len(items), size=n, replace=False))
+    sampled_videos = pd.DataFrame(rows, columns=SNAPSHOT_COLUMNS)
+    sampled_videos['published_at'] = pd.to_datetime(sampled_videos.published_at)
+    # shuffles the sampled videos.
+    sampled_videos = sampled_videos.iloc[random_state.permutation(sampled_videos.shape[0])].reset_index(drop=True)
+    return sampled_videos, sum(counts.values())
+
+
+def allocate(counts: dict, size: int, allocation: str = 'proportional') -> dict:
+    """divides `size` samples across strata with `counts` videos each.
+
+    "proportional" allocates in proportion to each stratum's count (rounding
+    by largest remainder). "equal" gives each stratum the same number of
+    samples, and redistributes samples that small strata cannot fill.
+
+    Returns:
+
+        allocations: dict. Number of samples from each stratum.
+    """
+    strata = sorted(counts)
+    capacity = np.array([counts[stratum] for stratum in strata])
+    size = min(size, capacity.sum())
+    allocations = np.zeros(len(strata), dtype=int)
+    if allocation == 'proportional':
+        quotas = size * capacity / max(capacity.sum(), 1)
+        allocations = np.floor(quotas).astype(int)
+        remainders = quotas - allocations
+        allocations[np.argsort(-remainders, kind='stable')[:size - allocations.sum()]] += 1
+    else:
+        while allocations.sum() < size:
+            not_full = np.where(allocations < capacity)[0]
+            share = max((size - allocations.sum()) // len(not_full), 1)
+            for i in not_full[:size - allocations.sum()]:
+                allocations[i] += min(share, capacity[i] - allocations[i])
+    return dict(zip(strata, allocations.tolist()))
+
+
+def _strata(videos: pd.DataFrame, stratify: str = None):
+    """yields (stratum, positions) for each stratum in `videos`, where
+    `positions` are the row positions of the stratum's videos in order."""
+    if stratify is None:
+        yield None, range(videos.shape[0])
+        return
+    if stratify == 'channel':
+        keys = videos.channel_title.fillna('').values
+    else:
+        keys = videos.published_at.dt.to_period('W').dt.start_time.values
+    codes, strata = pd.factorize(keys)
+    # note: a stable sort keeps each stratum's rows in stream order.
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(strata) + 1))
+    for i, stratum in enumerate(strata):
+        yield stratum, order[bounds[i]:bounds[i+1]]
+
+
+if __name__ == '__main__':
+    import sys
+    from module.__main__ import main as cli
+    sys.exit(cli(['sample'] + sys.argv[1:]))
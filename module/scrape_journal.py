@@ -0,0 +1,211 @@
+"""checkpoint journal for resumable scrape runs.
+
+Each scrape run gets an append-only journal (one JSON record per line) in
+`data/generated/scrape_runs`, recording:
+
+    - the query-defining arguments of the run;
+    - every page of results fetched for each query, with its next page token;
+    - which queries have been fully paginated, and whether each reached the
+      end of its results (see `query_complete`);
+    - which video detail batches have been written to the run's details csv;
+    - the snapshot file name, once the run has finished.
+
+Video details are streamed to a csv alongside the journal as each batch
+arrives. If a run is interrupted, `ScrapeJournal.resume` replays the journal
+so that completed queries and pages are not fetched again, unfinished queries
+continue from their last page token, and only the video details that have not
+been written yet are requested.
+"""
+
+import os
+import csv
+import json
+import datetime
+import threading
+import pandas as pd
+
+from module import settings
+
+# directory where run journals and details csvs are saved.
+RUNS_PATH = os.path.join(settings.DATA_DIR, 'generated', 'scrape_runs')
+
+# arguments that determine which queries a run makes. These are restored
+# from the journal when a run is resumed.
+QUERY_ARGS = ['max_results', 'published_after', 'max_pages', 'region_code', 'relevance_language']
+
+# columns of the details csv.
+DETAILS_COLUMNS = ['video_id', 'title', 'published_at', 'channel_title', 'duration']
+
+
+class ScrapeJournal(object):
+    """append-only journal of a single scrape run.
+
+    Use `ScrapeJournal.start` to start a new run and `ScrapeJournal.resume` to
+    resume the most recent unfinished run. All methods are thread safe.
+
+    Arguments:
+
+        run_id: str. Identifier of the run (the time it was started).
+
+        runs_path: str. Directory containing the journal and details csv.
+    """
+
+    def __init__(self, run_id: str, runs_path: str = RUNS_PATH):
+        self.run_id = run_id
+        self.path = os.path.join(runs_path, '{0}.jsonl'.format(run_id))
+        self.details_path = os.path.join(runs_path, '{0}.details.csv'.format(run_id))
+        self.args = {}
+        self.queries = {}
+        self.detail_video_ids = set()
+        self.snapshot = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def start(cls, args: dict, runs_path: str = RUNS_PATH) -> 'ScrapeJournal':
+        """starts the journal of a new run.
+
+        Arguments:
+
+            args: dict. Command line arguments of the run. Only `QUERY_ARGS`
+                are recorded.
+        """
+        run_id = datetime.datetime.now().strftime('%Y-%m-%dT%H-%M-%SZ')
+        journal = cls(run_id, runs_path=runs_path)
+        os.makedirs(runs_path, exist_ok=True)
+        journal._append({'type': 'start', 'args': {k: args[k] for k in QUERY_ARGS if k in args}})
+        return journal
+
+    @classmethod
+    def resume(cls, runs_path: str = RUNS_PATH) -> 'ScrapeJournal':
+        """loads the most recent unfinished run, or returns None if the most
+        recent run finished."""
+        if not os.path.isdir(runs_path):
+            return None
+        run_ids = sorted(fname[:-len('.jsonl')] for fname in os.listdir(runs_path) if fname.endswith('.jsonl'))
+        if len(run_ids) == 0:
+            return None
+        journal = cls(run_ids[-1], runs_path=runs_path)
+        journal._replay()
+        if journal.snapshot is not None:
+            return None
+        return journal
+
+    def _replay(self) -> None:
+        """applies the journal's records.
+
+        If the run was interrupted mid-write, the last line is truncated. It
+        is cut off the file, so that the next record is appended on a line of
+        its own rather than glued to the partial one.
+        """
+        end = 0
+        with open(self.path, 'rb+') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                end += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self._apply(record)
+            f.seek(0, os.SEEK_END)
+            if f.tell() > end:
+                f.truncate(end)
+
+    def _apply(self, record: dict) -> None:
+        kind = record['type']
+        if kind == 'start':
+            self.args = record['args']
+        elif kind == 'page':
+            progress = self.queries.setdefault(record['query'], {'items': [], 'page_token': None, 'pages': 0, 'done': False})
+            progress['items'].extend(record['items'])
+            progress['page_token'] = record['page_token']
+            progress['pages'] += 1
+        elif kind == 'done':
+            progress = self.queries.setdefault(record['query'], {'items': [], 'page_token': None, 'pages': 0, 'done': False})
+            progress['done'] = True
+            progress['complete'] = record.get('complete', False)
+        elif kind == 'details':
+            self.detail_video_ids.update(record['video_ids'])
+        elif kind == 'finished':
+            self.snapshot = record['snapshot']
+
+    def _append(self, record: dict) -> None:
+        with self._lock:
+            self._apply(record)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def query_progress(self, method: str, kwargs: dict) -> tuple:
+        """returns progress of a query made in this run.
+
+        Returns:
+
+            items, page_token, pages, done: Tuple[list, str, int, bool]. Items
+                fetched so far, the token of the next page to fetch, the
+                number of pages fetched and whether the query is complete.
+        """
+        with self._lock:
+            progress = self.queries.get(query_key(method, kwargs))
+            if progress is None:
+                return [], None, 0, False
+            return progress['items'][:], progress['page_token'], progress['pages'], progress['done']
+
+    def query_complete(self, method: str, kwargs: dict) -> bool:
+        """returns True if a query made in this run is done and was recorded
+        as complete, i.e. it did not skip any of the videos it searched for
+        (see `record_done`)."""
+        with self._lock:
+            progress = self.queries.get(query_key(method, kwargs))
+            return progress is not None and progress.get('complete', False)
+
+    def record_page(self, method: str, kwargs: dict, items: list, page_token: str) -> None:
+        """records a page of results and the token of the next page."""
+        self._append({'type': 'page', 'query': query_key(method, kwargs), 'items': items, 'page_token': page_token})
+
+    def record_done(self, method: str, kwargs: dict, complete: bool = False) -> None:
+        """records that a query has been fully paginated.
+
+        Arguments:
+
+            complete: bool. True if the query stopped because it ran out of
+                results, rather than at the page limit or at videos that had
+                already been scraped.
+        """
+        self._append({'type': 'done', 'query': query_key(method, kwargs), 'complete': complete})
+
+    def write_details(self, rows: list) -> None:
+        """appends a batch of video detail rows to the details csv.
+
+        Arguments:
+
+            rows: List[list]. Rows with columns `DETAILS_COLUMNS`.
+        """
+        with self._lock:
+            write_header = not os.path.isfile(self.details_path)
+            with open(self.details_path, 'a', newline='') as f:
+                writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+                if write_header:
+                    writer.writerow(DETAILS_COLUMNS)
+                writer.writerows(rows)
+        self._append({'type': 'details', 'video_ids': [row[0] for row in rows]})
+
+    def read_details(self) -> pd.DataFrame:
+        """reads all video details written in this run."""
+        if not os.path.isfile(self.details_path):
+            return pd.DataFrame([], columns=DETAILS_COLUMNS)
+        details = pd.read_csv(self.details_path)
+        # a batch is written again if the run was interrupted between writing
+        # it and recording it in the journal.
+        return details.drop_duplicates('video_id', keep='last')
+
+    def finish(self, snapshot: str) -> None:
+        """records that the run finished and saved `snapshot`."""
+        self._append({'type': 'finished', 'snapshot': snapshot})
+
+
+def query_key(method: str, kwargs: dict) -> str:
+    """returns a canonical string identifying a query."""
+    return json.dumps([method, {k: v for k, v in kwargs.items() if v is not None}], sort_keys=True)
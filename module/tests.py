@@ -1,7 +1,6 @@
 #!/bin/bash/python
 import unittest
-from config import DEVELOPER_KEY
-from video_scraper import youtube_playlistitems_list, load_videos
+from module.video_scraper import youtube_playlistitems_list, load_videos
 
 YOUTUBE_API_SERVICE_NAME = "youtube"
 YOUTUBE_API_VERSION = "v3"
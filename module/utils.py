@@ -2,27 +2,27 @@
 import os
 import re
 import argparse
+import resource
 from typing import List
-import pandas as pd
-import numpy as np
-import isodate
 
 from module import settings
 
+# note: pandas, numpy and isodate are imported by the functions that use them,
+# so that importing this module (e.g. from the `python -m module` CLI) is fast.
+
 def listfiles(path):
     for fname in os.listdir(path):
         if os.path.isfile(os.path.join(path, fname)) and not fname.startswith('.'):
             yield fname
 
 def get_videos():
-    """gets list of videos to download."""
-    path = os.path.join(settings.DATA_DIR, 'videos')
-    videos = []
-    for fname in listfiles(path):
-        data = pd.read_csv(os.path.join(path, fname))
-        videos.append(data)
-    videos = pd.concat(videos, axis=0)
-    return videos
+    """gets list of videos to download.
+
+    Videos are read from the consolidated store (see `module.video_store`),
+    which ingests any new csv snapshots in `data/videos` on load.
+    """
+    from module import video_store
+    return video_store.load_store()
 
 def get_video_ids():
     """wrapper to get_videos that only returns an np.array of video IDs."""
@@ -33,20 +33,58 @@ def get_speech_video_ids():
     """gets list of video ids to download, but only for video ids that are
     predicted to be speeches.
 
-    Assume that predicted labels are in 'labels.csv' in settings.OUTPUT_DIR.
+    Assume that predicted labels are in 'class_preds.csv' in settings.OUTPUT_DIR
+    (see `module.video_relevance.predict`).
     """
+    import pandas as pd
     data = pd.read_csv(os.path.join(settings.OUTPUT_DIR, 'class_preds.csv'))
     data.columns = ['id', 'label']
     return data.id[data.label == 1]
 
+# ISO-8601 durations of the form returned by the Youtube API (e.g. "PT11M42S",
+# "P1DT2H3M4S", "P0D").
+DURATION_REGEX = r'^P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:\.\d+)?)S)?)?$'
+
+# seconds in each component captured by DURATION_REGEX.
+DURATION_UNIT_SECONDS = (7 * 24 * 3600., 24 * 3600., 3600., 60., 1.)
+
 def duration_str_to_num(durations):
     """converts Youtube video duration from format like "PT11M42S" to float.
 
+    Since many videos share the same duration, only the unique durations are
+    parsed, with a single vectorized regex. Any duration that does not match
+    the regex (e.g. one with a year or month component) falls back to
+    `isodate.parse_duration`.
+
     Returns np.array where each element is the duration in seconds.
     """
-    durations_seconds = np.array([isodate.parse_duration(d).total_seconds() if pd.notnull(d) else np.nan for d in durations])
+    import numpy as np
+    import pandas as pd
+    import isodate
+    # note: null durations get code -1.
+    codes, uniques = pd.factorize(np.asarray(durations, dtype=object))
+    uniques = pd.Series(np.asarray(uniques, dtype=object))
+    components = uniques.str.extract(DURATION_REGEX, expand=True).astype(float)
+    uniques_seconds = components.fillna(0).values.dot(np.array(DURATION_UNIT_SECONDS))
+    for i in np.where(components.isnull().all(axis=1).values)[0]:
+        uniques_seconds[i] = isodate.parse_duration(uniques.iloc[i]).total_seconds()
+    durations_seconds = np.append(uniques_seconds, np.nan)[codes]
     return durations_seconds
 
+def peak_memory_mb(children: bool = False) -> float:
+    """returns the peak resident memory (in MB) of this process.
+
+    If `children` is True, adds the largest peak of any child process that
+    has terminated and been waited for. Child processes that are still
+    running (e.g. joblib's reusable worker processes) are not counted.
+
+    note: `ru_maxrss` is in KB on Linux.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if children:
+        peak += resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak / 1024
+
 def parse_unknown_args(args: List[str]) -> argparse.Namespace:
     """parses unknown args returned from second element of parser.parse_known_args().
 
@@ -100,5 +138,9 @@ def parse_unknown_args(args: List[str]) -> argparse.Namespace:
 
 def is_arg(s):
     """given a string (s), returns True if s is a command-line argument (i.e.
-    prefixed with '--' or '-'). False otherwise."""
-    return bool(re.search(r'^-{1,2}', s))
+    prefixed with '--' or '-'). False otherwise.
+
+    note: negative numbers (e.g. the "-1" in "--n_jobs -1") are values, not
+    arguments.
+    """
+    return bool(re.search(r'^-{1,2}(?![\d.])', s))
@@ -1,53 +1,424 @@
 """Downloads Youtube videos.
 
+Videos are downloaded by a pool of worker threads from an on-disk job queue
+(see `JobQueue`), so an interrupted run picks up where it left off:
+
+    - each video is a job with a status ("pending", "running", "done" or
+      "failed") and a retry count. Failed downloads are retried with
+      exponential backoff up to `--max_retries` times.
+    - bytes are written to `<video_id>.mp4.part`, and a retried download
+      resumes from the end of the partial file with an HTTP Range request.
+    - the SHA-256 checksum of each finished file is saved with its job.
+      `--verify` re-hashes finished files and re-queues any that changed.
+    - `--bandwidth` caps the total download rate across all workers.
+
+By default, downloads every video predicted to be a speech (see
+`utils.get_speech_video_ids`).
+
+Example usage::
+
+    python -m module download --workers 4 --bandwidth 2M
+
+    # downloads all videos from a single channel.
+    python -m module download --channel_title "Raila Odinga vs Uhuru Kenyatta 2017"
+
+    # prints the number of jobs with each status.
+    python -m module download --status
+
+    # appends download counts, bytes and durations to a JSON lines file.
+    python -m module download --metrics_path metrics.jsonl --prometheus_path download.prom
 """
 
 import os
-import sys
-from pytube import YouTube
-from pprint import pprint
-import settings
-import utils
-
-# gets list of video IDS that have already been downloaded.
-# note: each video ID has a '.mp4' suffix.
-output_dir = os.path.join(settings.DATA_DIR, 'videos', 'downloads')
-downloaded_videos = [fname for fname in utils.listfiles(output_dir) if not fname.startswith('.')]
-
-# loads all video IDs that are predicted to be speeches.
-# video_ids = utils.get_speech_video_ids()
-
-# TEMPORARY: loads all video IDs from the channel "Raila Odinga vs Uhuru Kenyatta 2017"
-videos = utils.get_videos()
-video_ids = videos[videos.channel_title == "Raila Odinga vs Uhuru Kenyatta 2017"].video_id
-
-# downloads videos by video ID.
-msg = 'You are about to attempt to download {0} videos. Do you wish to continue ([y]es/[n]o)?'.format(video_ids.shape[0])
-s = input(msg)
-if s in ['yes', 'y']:
-    print('downloading videos...')
-    base_url = "http://www.youtube.com/watch?v="
-    for video_id in video_ids:
-        if video_id + '.mp4' in downloaded_videos:
+import time
+import hashlib
+import sqlite3
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from module import settings, utils
+from module.metrics import METRICS
+from module.request_scheduler import TokenBucket
+
+# directory to which videos are downloaded.
+# note: each video is saved as "<video_id>.mp4".
+DOWNLOADS_PATH = os.path.join(settings.DATA_DIR, 'videos', 'downloads')
+
+# path to the job queue.
+QUEUE_PATH = os.path.join(settings.DATA_DIR, 'generated', 'downloads.sqlite')
+
+BASE_URL = "http://www.youtube.com/watch?v="
+
+# bytes read from the response at a time.
+CHUNK_SIZE = 64 * 1024
+
+STATUSES = ('pending', 'running', 'done', 'failed')
+
+
+class DownloadError(Exception):
+    pass
+
+
+class JobQueue(object):
+    """SQLite queue of download jobs, one per video. All methods are thread safe.
+
+    Arguments:
+
+        path: str. Path to the queue database.
+    """
+
+    def __init__(self, path: str = QUEUE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'video_id TEXT PRIMARY KEY, status TEXT NOT NULL, retries INTEGER NOT NULL DEFAULT 0, '
+                'next_attempt_at REAL NOT NULL DEFAULT 0, bytes INTEGER, sha256 TEXT, error TEXT, updated_at REAL)'
+            )
+
+    def add(self, video_ids) -> int:
+        """adds a pending job for each video that is not in the queue yet.
+
+        Returns the number of jobs added.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            n_before = self._conn.total_changes
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO jobs (video_id, status, updated_at) VALUES (?, ?, ?)',
+                [(video_id, 'pending', now) for video_id in video_ids]
+            )
+            return self._conn.total_changes - n_before
+
+    def reset_running(self) -> int:
+        """returns jobs left "running" by an interrupted run to "pending"."""
+        with self._lock, self._conn:
+            return self._conn.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'").rowcount
+
+    def claim(self) -> str:
+        """marks the next pending job that is due as "running" and returns its
+        video ID, or None if no pending job is due."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT video_id FROM jobs WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY retries, video_id LIMIT 1", (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE jobs SET status = 'running', updated_at = ? WHERE video_id = ?", (now, row[0]))
+            return row[0]
+
+    def next_attempt_in(self) -> float:
+        """returns seconds until the next pending job is due, or None if
+        there are no pending jobs."""
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(next_attempt_at) FROM jobs WHERE status = 'pending'").fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def mark_done(self, video_id: str, nbytes: int, sha256: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', bytes = ?, sha256 = ?, error = NULL, updated_at = ? WHERE video_id = ?",
+                (nbytes, sha256, time.time(), video_id)
+            )
+
+    def mark_failed(self, video_id: str, error: str, max_retries: int, backoff_base: float = 1.0) -> str:
+        """records a failed attempt. The job is retried after
+        `backoff_base * 2 ** retries` seconds, unless it has already been
+        retried `max_retries` times.
+
+        Returns the new status of the job.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            retries = self._conn.execute('SELECT retries FROM jobs WHERE video_id = ?', (video_id,)).fetchone()[0]
+            status = 'pending' if retries < max_retries else 'failed'
+            self._conn.execute(
+                'UPDATE jobs SET status = ?, retries = ?, next_attempt_at = ?, error = ?, updated_at = ? WHERE video_id = ?',
+                (status, retries + 1, now + backoff_base * 2 ** retries, error, now, video_id)
+            )
+        return status
+
+    def requeue(self, video_id: str) -> None:
+        """returns a job to "pending" with no retries."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'pending', retries = 0, next_attempt_at = 0, updated_at = ? WHERE video_id = ?",
+                (time.time(), video_id)
+            )
+
+    def jobs(self, status: str = None) -> list:
+        """returns (video_id, status, retries, bytes, sha256, error) of each
+        job, optionally only those with `status`."""
+        query = 'SELECT video_id, status, retries, bytes, sha256, error FROM jobs'
+        with self._lock:
+            if status is None:
+                return self._conn.execute(query + ' ORDER BY video_id').fetchall()
+            return self._conn.execute(query + ' WHERE status = ? ORDER BY video_id', (status,)).fetchall()
+
+    def counts(self) -> dict:
+        """returns the number of jobs with each status."""
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        counts = {status: 0 for status in STATUSES}
+        counts.update(dict(rows))
+        return counts
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class BandwidthLimiter(object):
+    """caps the total bytes per second read by all threads.
+
+    Arguments:
+
+        rate: float. Maximum bytes per second.
+    """
+
+    def __init__(self, rate: float):
+        self.bucket = TokenBucket(rate, capacity=rate)
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes: int) -> None:
+        """blocks until `nbytes` more bytes may be read."""
+        with self._lock:
+            wait = self.bucket.wait_time(nbytes)
+            self.bucket.take(nbytes)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class DownloadManager(object):
+    """downloads the videos in a `JobQueue` with a pool of worker threads.
+
+    Arguments:
+
+        queue: JobQueue. Jobs to run.
+
+        output_dir: str. Directory to which videos are downloaded.
+
+        resolver: callable. Returns the URL of the video file for a video ID.
+            Defaults to `resolve_url`.
+
+        workers: int. Number of concurrent downloads.
+
+        max_retries: int. Number of times a failed download is retried.
+
+        bandwidth: float. Maximum total bytes per second. None for no cap.
+
+        backoff_base: float. Seconds before the first retry of a failed download.
+    """
+
+    def __init__(self, queue: JobQueue, output_dir: str = DOWNLOADS_PATH, resolver=None,
+                 workers: int = 4, max_retries: int = 3, bandwidth: float = None,
+                 backoff_base: float = 1.0):
+        self.queue = queue
+        self.output_dir = output_dir
+        self.resolver = resolver if resolver is not None else resolve_url
+        self.workers = workers
+        self.max_retries = max_retries
+        self.limiter = BandwidthLimiter(bandwidth) if bandwidth else None
+        self.backoff_base = backoff_base
+
+    def run(self) -> dict:
+        """runs jobs until none are pending.
+
+        Returns the number of jobs with each status.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.queue.reset_running()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._work) for _ in range(self.workers)]
+            for future in futures:
+                future.result()
+        return self.queue.counts()
+
+    def download(self, video_id: str) -> None:
+        """downloads a single claimed job and records the result."""
+        path = os.path.join(self.output_dir, video_id + '.mp4')
+        if os.path.isfile(path):
+            # note: e.g. downloaded before the job queue existed.
             print('Already downloaded video (ID: {0})'.format(video_id))
-            continue
+            self.queue.mark_done(video_id, os.path.getsize(path), file_sha256(path))
+            METRICS.inc('downloads', status='skipped')
+            return
+        start = time.time()
         try:
-            yt = YouTube(''.join([base_url, video_id]))
-            if len(yt.get_videos()) == 0:
-                print('Failed to find video for video ID: {0}'.format(video_id))
-            if len(yt.filter('mp4')) == 0:
-                print('Failed to find MPEG-4 video for video ID: {0}'.format(video_id))
+            nbytes, sha256 = download_file(self.resolver(video_id), path, limiter=self.limiter)
+        except Exception as e:
+            status = self.queue.mark_failed(video_id, repr(e), self.max_retries, backoff_base=self.backoff_base)
+            METRICS.inc('downloads', status=status)
+            print('Failed to download video (ID: {0}, status: {1}): {2}'.format(video_id, status, e))
+        else:
+            self.queue.mark_done(video_id, nbytes, sha256)
+            METRICS.inc('downloads', status='done')
+            METRICS.observe('download_seconds', time.time() - start)
+            print('Downloaded video (ID: {0}, {1} bytes)'.format(video_id, nbytes))
 
-            # print(yt.get_videos())
-            # print(yt.filename)
+    def _work(self) -> None:
+        while True:
+            video_id = self.queue.claim()
+            if video_id is not None:
+                self.download(video_id)
+                continue
+            wait = self.queue.next_attempt_in()
+            if wait is None:
+                return
+            # note: waits at most a second, since another worker may requeue a job sooner.
+            time.sleep(min(wait, 1.0))
 
-            # set the filename:
-            yt.set_filename(video_id)
 
-            # filters MPEG-4 video with lowest resolution.
-            video = yt.filter('mp4')[0]
+def resolve_url(video_id: str) -> str:
+    """returns the URL of the lowest resolution MPEG-4 file of a video."""
+    from pytube import YouTube
+    yt = YouTube(''.join([BASE_URL, video_id]))
+    if len(yt.get_videos()) == 0:
+        raise DownloadError('Failed to find video for video ID: {0}'.format(video_id))
+    if len(yt.filter('mp4')) == 0:
+        raise DownloadError('Failed to find MPEG-4 video for video ID: {0}'.format(video_id))
+    # filters MPEG-4 video with lowest resolution.
+    return yt.filter('mp4')[0].url
 
-            # downloads video.
-            video.download(output_dir)
-        except Exception as e:
-            print(e)
+
+def download_file(url: str, path: str, limiter: BandwidthLimiter = None,
+                  chunk_size: int = CHUNK_SIZE, timeout: float = 60) -> tuple:
+    """downloads `url` to `path`, resuming from `path + '.part'` if it exists.
+
+    The partial file is only renamed to `path` once the number of bytes
+    received matches the response's Content-Length, so an interrupted
+    download is never mistaken for a finished one.
+
+    Returns:
+
+        nbytes, sha256: Tuple[int, str]. Size and SHA-256 checksum of the file.
+    """
+    part_path = path + '.part'
+    offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+    headers = {'Range': 'bytes={0}-'.format(offset)} if offset else {}
+    try:
+        response = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 416:
+            # note: the partial file is no longer consistent with the remote
+            # file, so the download is restarted on the next attempt.
+            os.remove(part_path)
+        raise
+    with response:
+        if offset and response.status != 206:
+            # the server ignored the Range header and is sending the whole file.
+            offset = 0
+        content_length = response.headers.get('Content-Length')
+        expected = offset + int(content_length) if content_length is not None else None
+        with open(part_path, 'ab' if offset else 'wb') as f:
+            while True:
+                chunk = response.read(chunk_size)
+                if not chunk:
+                    break
+                if limiter is not None:
+                    limiter.consume(len(chunk))
+                f.write(chunk)
+                METRICS.inc('bytes_downloaded', len(chunk))
+    nbytes = os.path.getsize(part_path)
+    if expected is not None and nbytes != expected:
+        raise DownloadError('Received {0} of {1} bytes from {2}'.format(nbytes, expected, url))
+    sha256 = file_sha256(part_path)
+    os.replace(part_path, path)
+    return nbytes, sha256
+
+
+def file_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def verify(queue: JobQueue, output_dir: str = DOWNLOADS_PATH) -> list:
+    """re-hashes each finished download and requeues any file that is missing
+    or whose checksum has changed.
+
+    Returns the video IDs that were requeued.
+    """
+    requeued = []
+    for video_id, _, _, _, sha256, _ in queue.jobs(status='done'):
+        path = os.path.join(output_dir, video_id + '.mp4')
+        if not os.path.isfile(path) or file_sha256(path) != sha256:
+            queue.requeue(video_id)
+            requeued.append(video_id)
+    return requeued
+
+
+def parse_bytes(s: str) -> float:
+    """parses a number of bytes with an optional K, M or G suffix (e.g. "2M")."""
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    if s[-1].upper() in units:
+        return float(s[:-1]) * units[s[-1].upper()]
+    return float(s)
+
+
+def main(workers: int = 4,
+         max_retries: int = 3,
+         bandwidth: float = None,
+         channel_title: str = None,
+         output_dir: str = DOWNLOADS_PATH,
+         queue_path: str = QUEUE_PATH,
+         verify_files: bool = False,
+         status: bool = False) -> None:
+    """queues videos and downloads every pending job.
+
+    Arguments:
+
+        workers: int. Number of concurrent downloads.
+
+        max_retries: int. Number of times a failed download is retried.
+
+        bandwidth: float. Maximum total download rate in bytes per second.
+
+        channel_title: str. If given, downloads all videos from this channel
+            rather than videos predicted to be speeches.
+
+        output_dir: str. Directory to which videos are downloaded.
+
+        queue_path: str. Path to the job queue.
+
+        verify_files: bool. If True, re-hashes finished downloads first and
+            requeues any that changed.
+
+        status: bool. If True, only prints the number of jobs with each status.
+    """
+    queue = JobQueue(queue_path)
+    try:
+        if status:
+            print(queue.counts())
+            return
+        if verify_files:
+            print('Requeued {0} videos that failed verification.'.format(len(verify(queue, output_dir))))
+        if channel_title is not None:
+            videos = utils.get_videos()
+            video_ids = videos[videos.channel_title == channel_title].video_id.unique()
+        else:
+            video_ids = utils.get_speech_video_ids().unique()
+        print('Added {0} of {1} videos to the download queue.'.format(queue.add(video_ids), len(video_ids)))
+        manager = DownloadManager(queue, output_dir=output_dir, workers=workers,
+                                  max_retries=max_retries, bandwidth=bandwidth)
+        with METRICS.timer('download'):
+            print('Finished downloading: {0}'.format(manager.run()))
+    finally:
+        queue.close()
+
+
+if __name__ == '__main__':
+    import sys
+    from module.__main__ import main as cli
+    sys.exit(cli(['download'] + sys.argv[1:]))
@@ -2,9 +2,14 @@
 
 How to use this script:
 
-Simply run the code from the command line (`python classify_videos.py`) and
-follow the prompts. It will save your hand labels and the predictions to
-'output/'.
+Simply run the code from the command line
+(`python -m module.video_relevance.active_learn`) and follow the prompts. It
+will save your hand labels to `data/manual/video_relevance/active_learning/`
+(see `label_store`) and the predictions to 'output/'.
+
+The next video to label is picked by uncertainty sampling (see
+`query_engine.QueryEngine`). Pass `--strategy entropy` to rank videos by
+entropy rather than margin.
 
 
 To watch a video with a specific YouTube ID, visit::
@@ -34,31 +39,110 @@ Notes:
 """
 
 import os
-import settings
-import utils
+import argparse
 import pandas as pd
 import numpy as np
-from actlearn.learner import BinaryActiveLearner
+import scipy.sparse as sp
 from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.pipeline import Pipeline, FeatureUnion
 
-def main():
-    videos = utils.get_videos()
-    videos.published_at = pd.to_datetime(videos.published_at)
+from module import settings, utils
+from module.video_relevance.preprocessing import one_hot
+from module.video_relevance.query_engine import QueryEngine, STRATEGIES
+from module.video_relevance import label_store
 
-    # filters videos to only include those from 2017.
-    videos = videos[videos.published_at.apply(lambda x: x.year) == 2017]
-    assert videos.published_at.min().year == 2017
+LABELS_DICT = {0: 'not_speech', 1: 'speech'}
+
+
+def main(dense=False, strategy='margin', pool_size=2000, save_every=10):
+    """runs an interactive active learning session.
+
+    Labels from all previous sessions (see `label_store`) are learned first.
+    New labels are saved to a new file in `label_store.ACTIVE_LEARNING_LABELS_PATH`
+    every `save_every` labels and at the end of the session.
+
+    Arguments:
+
+        dense: bool. If True, passes a dense feature matrix to the query
+            engine rather than a sparse CSR matrix.
+
+        strategy: str. Query strategy (see `query_engine.STRATEGIES`).
+
+        pool_size: int. Number of unlabeled videos rescored after each label.
+
+        save_every: int. Number of labels between saves.
+    """
+    videos, X = featurize()
+    if dense:
+        X = X.toarray()
 
     # raw documents.
     documents = videos.apply(lambda x: "{0}: {1} ({2}) -- {3})".format(x.video_id, x.channel_title, x.duration, x.title), axis=1).values
 
     # video IDs.
-    ids = videos.video_id.tolist()
+    ids = videos.video_id.values
+
+    # creates the query engine and learns labels from previous sessions.
+    engine = QueryEngine(X, ids, strategy=strategy, pool_size=pool_size)
+    y = label_store.load_labels()
+    engine.teach_many(y.index.values, y.values)
+    print('Learned {0} labels from previous sessions.'.format(len(engine.labels)))
+
+    # learns.
+    engine.start()
+    labels = {}
+    path = None
+    try:
+        while True:
+            video_id = engine.next_query()
+            if video_id is None:
+                break
+            s = input('{0}\n[1] {1}, [0] {2}, [s]kip, [q]uit: '.format(documents[engine.rows[video_id]], LABELS_DICT[1], LABELS_DICT[0])).strip()
+            if s == 'q':
+                break
+            if s not in ['0', '1']:
+                continue
+            engine.teach(video_id, int(s))
+            labels[video_id] = int(s)
+            if len(labels) % save_every == 0:
+                path = _save_labels(labels, path)
+    finally:
+        engine.stop()
+        if len(labels):
+            path = _save_labels(labels, path)
+            print('Saved {0} labels to {1}'.format(len(labels), path))
+
+    class_preds = engine.predict()
+    print(np.bincount(class_preds))
+
+    # saves predictions to disk.
+    preds = pd.DataFrame({'video_id': ids, 'label': class_preds})
+    os.makedirs(settings.OUTPUT_DIR, exist_ok=True)
+    preds.to_csv(os.path.join(settings.OUTPUT_DIR, 'class_preds.csv'), index=False)
+
+    # quick gut check on performance: checks what % of videos from the Raila
+    # Odinga vs Uhuru Kenyatta 2017 have been classified as speeches.
+    channel_videos_pos = np.where(videos.channel_title.values == "Raila Odinga vs Uhuru Kenyatta 2017")[0]
+    print(np.bincount(class_preds[channel_videos_pos]))
+    # excellent, close to 100% of these videos have been classified as speeches.
+
+
+def featurize():
+    """constructs features of each video from 2017.
+
+    Returns:
+
+        videos, X: Tuple[pd.DataFrame, sp.csr_matrix].
+    """
+    videos = utils.get_videos().drop_duplicates('video_id', keep='last').reset_index(drop=True)
+    videos.published_at = pd.to_datetime(videos.published_at)
+
+    # filters videos to only include those from 2017.
+    videos = videos[videos.published_at.apply(lambda x: x.year) == 2017].reset_index(drop=True)
+    assert videos.published_at.min().year == 2017
 
     # converts video title to bag of words representation.
     vectorizer = CountVectorizer(min_df=6, stop_words="english", lowercase=True)
-    bow = vectorizer.fit_transform(videos.title.values)
+    bow = vectorizer.fit_transform(videos.title.fillna('').values)
     print(bow.shape)
 
     # extracts duration of each video.
@@ -73,53 +157,33 @@ def main():
     channel_count.name = 'channel_count'
     videos = pd.merge(videos, channel_count.reset_index(), on='channel_title', how='left')
     min_channel_count = videos.channel_count.quantile(0.25)
-    videos.channel_title[videos.channel_count <= min_channel_count] = 'other'
-    assert videos.channel_title.value_counts().min() > min_channel_count
+    channel_title = videos.channel_title.where(videos.channel_count > min_channel_count, 'other')
 
     # discretizes channel_count into a 0-4 ranking.
-    channel_count = pd.qcut(videos.channel_count, q=5).cat.codes
+    channel_count = pd.qcut(videos.channel_count, q=5, duplicates='drop').cat.codes
     channel_count = channel_count.astype(np.int32).values.reshape(-1, 1)
 
-
     # consructs dummy variable for channel title.
-    channel_title_dummies = pd.get_dummies(videos.channel_title).astype(np.int32).values
+    channel_title_dummies = one_hot(channel_title.values)
 
-    feature_arrays = [bow.toarray(), duration, channel_count, channel_title_dummies]
+    feature_arrays = [bow, duration, channel_count, channel_title_dummies]
     assert all([arr.shape[0] == bow.shape[0] for arr in feature_arrays])
-    X = np.hstack(feature_arrays)
+    return videos, sp.hstack(feature_arrays, format='csr')
 
-    labels_dict = {0: 'not_speech', 1: 'speech'}
 
-    # outcome variable.
-    # try:
-    #     y = pd.read_csv('speech_labels.csv').values
-    # except FileNotFoundError as e:
-    #     y = np.zeros((X.shape[0],))
+def _save_labels(labels: dict, path: str = None) -> str:
+    """saves this session's labels, replacing the session's previous save."""
+    new_path = label_store.save_labels(pd.Series(labels))
+    if path is not None:
+        os.remove(path)
+    return new_path
 
-    # creates the active learner.
-    learner = BinaryActiveLearner(documents=documents, ids=ids, out_path=settings.OUTPUT_DIR, X=X, labels_dict=labels_dict, verbose=1)
-    learner.model.n_jobs = 1  # the package is buggy, so this is helpful.
-
-    # learns.
-    learner.update(manual_only=True)
-    learner.run()
-
-    learner.update(manual_only=True)
-    print(np.bincount(learner.class_preds))
-    learner.sample(5)
-
-    # to "fix" a specific id:
-    # learner.fix_label("VIDEO_ID", LABEL)
-    # learner.fix_label("ZbOstw7iE2k", 0)
-
-    # saves predictions to disk.
-    learner.save_preds(os.path.join(settings.OUTPUT_DIR, 'class_preds.csv'))
-
-    # quick gut check on performance: checks what % of videos from the Raila
-    # Odinga vs Uhuru Kenyatta 2017 have been classified as speeches.
-    channel_videos_pos = videos[videos.channel_title == "Raila Odinga vs Uhuru Kenyatta 2017"].index.tolist()
-    np.bincount(learner.class_preds[channel_videos_pos])
-    # excellent, close to 100% of these videos have been classified as speeches.
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dense', action='store_true', help='Use a dense feature matrix.')
+    parser.add_argument('--strategy', type=str, default='margin', choices=sorted(STRATEGIES), help='Query strategy.')
+    parser.add_argument('--pool_size', type=int, default=2000, help='Number of unlabeled videos rescored after each label.')
+    parser.add_argument('--save_every', type=int, default=10, help='Number of labels between saves.')
+    args = parser.parse_args()
+    main(**args.__dict__)
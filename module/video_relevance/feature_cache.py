@@ -0,0 +1,276 @@
+"""persistent cache of video features, keyed by video ID and featurizer.
+
+Titles and durations of scraped videos never change, so a video only needs
+to be featurized once by a given fitted `Featurizer`. Features are cached in
+`data/generated/features/<fingerprint>/`, where `<fingerprint>` is
+`Featurizer.fingerprint()`, as the three arrays of a CSR matrix
+(`data.bin`, `indices.bin`, `indptr.bin`), plus `video_ids.txt` mapping
+each row to a video ID. New rows are appended to the end of each file, and
+the arrays are memory-mapped when loaded, so loading the cache copies
+nothing. Appends hold an exclusive lock on the cache directory, so several
+processes (e.g. concurrent training runs) can share a cache.
+
+A cache is left behind whenever the featurizer changes. Caches that have
+not been used for a while can be deleted with `prune`.
+
+Example::
+
+    >>> cache = FeatureCache(featurizer)
+    >>> X = cache.transform(videos)  # only featurizes uncached videos.
+    >>> video_ids, X_all = cache.load()  # zero-copy view of all cached rows.
+
+Usage::
+
+    python -m module.video_relevance.feature_cache --prune [--max_age_days 30]
+"""
+
+import os
+import json
+import time
+import fcntl
+import shutil
+import argparse
+import contextlib
+import numpy as np
+import scipy.sparse as sp
+
+from module import settings
+
+# directory containing one feature cache per featurizer fingerprint.
+FEATURES_PATH = os.path.join(settings.DATA_DIR, 'generated', 'features')
+
+DATA_DTYPE = np.float64
+INDICES_DTYPE = np.int32
+INDPTR_DTYPE = np.int64
+
+# name of the lock file in each cache directory.
+LOCK_FNAME = '.lock'
+
+
+def memmap_matrix(X, path: str):
+    """saves a feature matrix to `path` and returns a read-only copy of it
+    backed by memory-mapped files.
+
+    joblib passes memory-mapped arrays to worker processes by file name
+    rather than pickling them, so every process evaluating a pipeline (and
+    every CV fold within it) reads the same pages of the same matrix.
+
+    Arguments:
+
+        X: sp.spmatrix or np.ndarray. Feature matrix.
+
+        path: str. Directory in which to save the matrix.
+
+    Returns:
+
+        X: sp.csr_matrix (or np.memmap if `X` is dense).
+    """
+    os.makedirs(path, exist_ok=True)
+    if not sp.issparse(X):
+        np.save(os.path.join(path, 'dense.npy'), np.asarray(X))
+        return np.load(os.path.join(path, 'dense.npy'), mmap_mode='r')
+    X = sp.csr_matrix(X)
+    # note: sorted up front, since the read-only arrays cannot be sorted in place later.
+    X.sort_indices()
+    arrays = {}
+    for name in ['data', 'indices', 'indptr']:
+        np.save(os.path.join(path, name + '.npy'), getattr(X, name))
+        arrays[name] = np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+    X_mmap = sp.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=X.shape, copy=False)
+    X_mmap.has_sorted_indices = True
+    return X_mmap
+
+
+class FeatureCache(object):
+    """append-only, memory-mapped feature matrix for a fitted featurizer.
+
+    Arguments:
+
+        featurizer: Featurizer. Fitted featurizer.
+
+        path: str. Directory of the cache. Defaults to a directory in
+            `FEATURES_PATH` named after the featurizer's fingerprint.
+    """
+
+    def __init__(self, featurizer, path: str = None):
+        self.featurizer = featurizer
+        self.path = path if path is not None else os.path.join(FEATURES_PATH, featurizer.fingerprint())
+        self._meta_path = os.path.join(self.path, 'meta.json')
+        self._ids_path = os.path.join(self.path, 'video_ids.txt')
+        if os.path.isdir(self.path):
+            # note: marks the cache as used (see `prune`).
+            os.utime(self.path)
+        self._reload()
+
+    def _reload(self) -> None:
+        """reads the metadata and the row of each video ID from disk."""
+        self.meta = {'n_rows': 0, 'n_cols': None, 'nnz': 0}
+        if os.path.isfile(self._meta_path):
+            with open(self._meta_path, 'r') as f:
+                self.meta = json.load(f)
+        self.rows = {}
+        if os.path.isfile(self._ids_path):
+            with open(self._ids_path, 'r') as f:
+                for row, line in enumerate(f):
+                    # note: ids appended after the last metadata update belong
+                    # to an interrupted append and are ignored.
+                    if row >= self.meta['n_rows']:
+                        break
+                    self.rows[line.rstrip('\n')] = row
+
+    def load(self):
+        """returns all cached features.
+
+        Returns:
+
+            video_ids, X: Tuple[List[str], sp.csr_matrix]. Video ID of each row
+                and a read-only CSR matrix backed by memory-mapped arrays.
+        """
+        n_rows, n_cols, nnz = self.meta['n_rows'], self.meta['n_cols'], self.meta['nnz']
+        video_ids = sorted(self.rows, key=self.rows.get)
+        if n_rows == 0:
+            return video_ids, sp.csr_matrix((0, n_cols or 0), dtype=DATA_DTYPE)
+        data = self._memmap('data.bin', DATA_DTYPE, nnz)
+        indices = self._memmap('indices.bin', INDICES_DTYPE, nnz)
+        indptr = self._memmap('indptr.bin', INDPTR_DTYPE, n_rows + 1)
+        return video_ids, sp.csr_matrix((data, indices, indptr), shape=(n_rows, n_cols), copy=False)
+
+    def transform(self, videos, video_ids=None):
+        """returns features of `videos`, featurizing and caching only the
+        videos that are not cached yet.
+
+        Arguments:
+
+            videos: pd.DataFrame. Videos to featurize.
+
+            video_ids: array-like. Video ID of each row of `videos`. Defaults
+                to `videos.video_id`.
+
+        Returns:
+
+            X: sp.csr_matrix (or np.ndarray if `featurizer.dense`). Features,
+                with rows in the same order as `videos`.
+        """
+        if video_ids is None:
+            video_ids = videos.video_id.values
+        video_ids = np.asarray(video_ids)
+        is_new = np.array([video_id not in self.rows for video_id in video_ids], dtype=bool)
+        if is_new.any():
+            new_videos = videos[is_new]
+            new_ids, first = np.unique(video_ids[is_new], return_index=True)
+            self.append(new_ids, sp.csr_matrix(self.featurizer.transform(new_videos.iloc[first])))
+        _, X = self.load()
+        X = X[[self.rows[video_id] for video_id in video_ids]]
+        if self.featurizer.dense:
+            return X.toarray()
+        return X
+
+    def append(self, video_ids, X: sp.csr_matrix) -> None:
+        """appends features of new videos to the cache.
+
+        Videos that another process appended since this cache was loaded are
+        skipped.
+        """
+        with self._locked():
+            self._reload()
+            is_new = np.array([video_id not in self.rows for video_id in video_ids], dtype=bool)
+            if is_new.any():
+                self._append(np.asarray(video_ids)[is_new], sp.csr_matrix(X)[np.flatnonzero(is_new)])
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """holds an exclusive lock on the cache directory."""
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, LOCK_FNAME), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _append(self, video_ids, X: sp.csr_matrix) -> None:
+        if self.meta['n_cols'] is not None:
+            assert X.shape[1] == self.meta['n_cols'], 'feature dimensions do not match cache.'
+        nnz = self.meta['nnz']
+        # note: files are truncated to the sizes in the metadata first, in
+        # case a previous append was interrupted.
+        self._append_array('data.bin', X.data.astype(DATA_DTYPE), nnz)
+        self._append_array('indices.bin', X.indices.astype(INDICES_DTYPE), nnz)
+        if self.meta['n_rows'] == 0:
+            self._append_array('indptr.bin', np.zeros(1, dtype=INDPTR_DTYPE), 0)
+        self._append_array('indptr.bin', (X.indptr[1:] + nnz).astype(INDPTR_DTYPE), self.meta['n_rows'] + 1)
+        with open(self._ids_path, 'r+b' if os.path.isfile(self._ids_path) else 'wb') as f:
+            for _ in range(self.meta['n_rows']):
+                f.readline()
+            f.seek(f.tell())
+            f.truncate()
+            f.write(''.join('{0}\n'.format(video_id) for video_id in video_ids).encode('utf-8'))
+        for video_id in video_ids:
+            self.rows[video_id] = len(self.rows)
+        self.meta = {'n_rows': self.meta['n_rows'] + X.shape[0], 'n_cols': X.shape[1], 'nnz': nnz + X.nnz}
+        tmp_path = self._meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def _memmap(self, fname, dtype, length):
+        if length == 0:
+            # note: empty files cannot be memory-mapped.
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, fname), dtype=dtype, mode='r', shape=(length,))
+
+    def _append_array(self, fname, arr, length) -> None:
+        """truncates a file to `length` elements of `arr.dtype` and appends `arr`."""
+        path = os.path.join(self.path, fname)
+        with open(path, 'r+b' if os.path.isfile(path) else 'wb') as f:
+            f.truncate(length * arr.dtype.itemsize)
+            f.seek(0, os.SEEK_END)
+            f.write(arr.tobytes())
+
+
+def prune(max_age_days: float = 30, keep=(), path: str = FEATURES_PATH) -> list:
+    """deletes feature caches that have not been used for `max_age_days` days.
+
+    A cache counts as used whenever a `FeatureCache` is opened on it.
+
+    Arguments:
+
+        max_age_days: float. Caches last used longer ago than this are deleted.
+
+        keep: Iterable[str]. Fingerprints of caches that are never deleted.
+
+        path: str. Directory containing one cache per fingerprint.
+
+    Returns:
+
+        pruned: List[str]. Fingerprints of the deleted caches.
+    """
+    if not os.path.isdir(path):
+        return []
+    min_mtime = time.time() - max_age_days * 24 * 60 * 60
+    pruned = []
+    for fingerprint in sorted(os.listdir(path)):
+        cache_path = os.path.join(path, fingerprint)
+        if fingerprint in keep or not os.path.isdir(cache_path) or os.path.getmtime(cache_path) >= min_mtime:
+            continue
+        with open(os.path.join(cache_path, LOCK_FNAME), 'w') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # note: another process is appending to the cache.
+                continue
+            shutil.rmtree(cache_path)
+        pruned.append(fingerprint)
+    return pruned
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--prune', action='store_true', help='Delete feature caches that have not been used recently.')
+    parser.add_argument('--max_age_days', type=float, default=30, help='Delete caches last used longer ago than this.')
+    args = parser.parse_args()
+    if args.prune:
+        pruned = prune(args.max_age_days)
+        print('Deleted {0} feature caches from {1}'.format(len(pruned), FEATURES_PATH))
+    else:
+        parser.print_help()
@@ -0,0 +1,171 @@
+"""all hand labels of video relevance, merged from every labeling session.
+
+Labels come from two sources:
+
+- `data/manual/video_relevance/labels*.csv`: labels from manual labeling
+  sessions (e.g. of `data/generated/videos_to_label.csv`).
+- `data/manual/video_relevance/active_learning/*.csv`: labels saved by
+  active learning sessions (see `module.video_relevance.active_learn`).
+
+Each file has at least the columns `video_id` and `label`. Files are read in
+order (manual files first, then active learning files, each sorted by file
+name), so a file that sorts later is a later labeling session.
+
+When a video has been given different labels, the conflict is resolved by
+one of `CONFLICT_POLICIES`:
+
+- "latest": keeps the label from the latest file.
+- "drop": drops the video.
+- "raise": raises a `LabelConflictError`.
+
+Labeled videos are joined to the scraped videos through the unique video ID
+index in `module.video_store.load_unique`, rather than by scanning the full
+store.
+
+Example::
+
+    >>> X_raw, y = load_labeled_videos(on_conflict='drop')
+"""
+
+import os
+import datetime
+from typing import Tuple
+import pandas as pd
+
+from module import settings, video_store
+from module.utils import listfiles
+
+# path to manually labeled videos.
+LABELS_PATH = os.path.join(settings.DATA_DIR, 'manual', 'video_relevance')
+
+# path to videos labeled during active learning sessions.
+ACTIVE_LEARNING_LABELS_PATH = os.path.join(LABELS_PATH, 'active_learning')
+
+CONFLICT_POLICIES = ('latest', 'drop', 'raise')
+
+
+class LabelConflictError(ValueError):
+    """raised when a video has been given different labels."""
+
+    def __init__(self, conflicts: pd.DataFrame):
+        self.conflicts = conflicts
+        video_ids = conflicts.video_id.unique()
+        super().__init__('{0} videos have conflicting labels (e.g. {1}).'.format(
+            len(video_ids), ', '.join(video_ids[:5])))
+
+
+def list_label_files(labels_path: str = LABELS_PATH,
+                     active_learning_path: str = ACTIVE_LEARNING_LABELS_PATH) -> list:
+    """returns paths to all label files, from earliest to latest."""
+    paths = []
+    for path, prefix in [(labels_path, 'labels'), (active_learning_path, '')]:
+        if os.path.isdir(path):
+            paths.extend(os.path.join(path, fname) for fname in sorted(listfiles(path))
+                         if fname.startswith(prefix) and fname.endswith('.csv'))
+    return paths
+
+
+def read_labels(paths: list) -> pd.DataFrame:
+    """reads non-null labels from each label file.
+
+    Returns:
+
+        labels: pd.DataFrame. Columns `video_id`, `label` and `source` (the
+            path of the file each label was read from), in file order.
+    """
+    labels = []
+    for path in paths:
+        these_labels = pd.read_csv(path, usecols=['video_id', 'label'])
+        these_labels = these_labels[these_labels.label.notnull() & these_labels.video_id.notnull()]
+        labels.append(these_labels.assign(source=path))
+    if len(labels) == 0:
+        return pd.DataFrame({'video_id': [], 'label': [], 'source': []})
+    return pd.concat(labels, axis=0, ignore_index=True)
+
+
+def resolve_conflicts(labels: pd.DataFrame, on_conflict: str = 'latest') -> pd.Series:
+    """returns one label per video.
+
+    Arguments:
+
+        labels: pd.DataFrame. Labels returned by `read_labels`.
+
+        on_conflict: str. One of `CONFLICT_POLICIES`.
+
+    Returns:
+
+        y: pd.Series. Labels indexed by unique video ID.
+    """
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError('on_conflict must be one of {0}.'.format(CONFLICT_POLICIES))
+    n_labels = labels.groupby('video_id').label.nunique()
+    conflicted = set(n_labels.index[n_labels > 1])
+    if len(conflicted):
+        conflicts = labels[[video_id in conflicted for video_id in labels.video_id.values]]
+        if on_conflict == 'raise':
+            raise LabelConflictError(conflicts)
+        print('{0} videos have conflicting labels ({1}).'.format(len(conflicted), on_conflict))
+        if on_conflict == 'drop':
+            labels = labels[[video_id not in conflicted for video_id in labels.video_id.values]]
+    labels = labels.drop_duplicates('video_id', keep='last')
+    return labels.set_index('video_id').label
+
+
+def load_labels(on_conflict: str = 'latest', **kwargs) -> pd.Series:
+    """returns one label per labeled video.
+
+    Arguments:
+
+        on_conflict: str. One of `CONFLICT_POLICIES`.
+
+        **kwargs: passed to `list_label_files`.
+    """
+    return resolve_conflicts(read_labels(list_label_files(**kwargs)), on_conflict=on_conflict)
+
+
+def load_labeled_videos(on_conflict: str = 'latest', store_kwargs: dict = None, **kwargs) -> Tuple[pd.DataFrame, pd.Series]:
+    """loads labels and unprocessed features of each labeled video.
+
+    Labeled videos that are not in the video store are dropped.
+
+    Arguments:
+
+        on_conflict: str. One of `CONFLICT_POLICIES`.
+
+        store_kwargs: dict. Passed to `module.video_store.lookup_videos`.
+
+        **kwargs: passed to `list_label_files`.
+
+    Returns:
+
+        X_raw, y: Tuple[pd.DataFrame, pd.Series]. Videos and labels, both
+            indexed by video ID.
+    """
+    y = load_labels(on_conflict=on_conflict, **kwargs)
+    X_raw = video_store.lookup_videos(y.index.values, **(store_kwargs or {}))
+    if X_raw.shape[0] < y.shape[0]:
+        print('{0} labeled videos are not in the video store.'.format(y.shape[0] - X_raw.shape[0]))
+        y = y.loc[X_raw.index]
+    assert (y.index == X_raw.index).all()
+    return X_raw, y
+
+
+def save_labels(labels: pd.Series, path: str = ACTIVE_LEARNING_LABELS_PATH) -> str:
+    """saves labels from an active learning session to a new file.
+
+    Arguments:
+
+        labels: pd.Series. Labels indexed by video ID.
+
+        path: str. Directory in which to save the labels.
+
+    Returns:
+
+        path: str. Path to the saved labels, named after the current time so
+            that later sessions sort after earlier ones.
+    """
+    os.makedirs(path, exist_ok=True)
+    fname = 'labels_{0}.csv'.format(datetime.datetime.now().strftime('%Y-%m-%dT%H-%M-%S-%f'))
+    labels = pd.DataFrame({'video_id': labels.index.values, 'label': labels.values})
+    labels.to_csv(os.path.join(path, fname), index=False)
+    return os.path.join(path, fname)
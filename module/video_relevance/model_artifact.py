@@ -0,0 +1,100 @@
+"""saves and loads the video relevance model as a single artifact.
+
+An artifact is a joblib file containing the fitted `Featurizer`, the fitted
+best estimator and metadata about how the model was trained, plus a json
+copy of the metadata (`<path>.json`) that can be read without loading the
+model. Artifacts are saved uncompressed, so the numpy arrays in the model are
+memory-mapped rather than copied when loaded with `mmap_mode='r'`.
+
+Example::
+
+    >>> save_model('model.joblib', featurizer, pipeline, {'test_score': 0.9})
+    >>> featurizer, pipeline, metadata = load_model('model.joblib')
+"""
+
+import os
+import json
+import hashlib
+import datetime
+import joblib
+import pandas as pd
+import sklearn
+
+# version of the artifact format. Increment when the contents of the artifact change.
+FORMAT_VERSION = 1
+
+
+def save_model(path: str, featurizer, pipeline, metadata: dict = None) -> dict:
+    """saves the fitted featurizer and estimator to a single artifact.
+
+    Arguments:
+
+        path: str. Path of the artifact (e.g. ".../model.joblib").
+
+        featurizer: Featurizer. Fitted featurizer.
+
+        pipeline: sklearn estimator. Fitted estimator that takes the
+            featurizer's output.
+
+        metadata: dict. Any json-serializable metadata (e.g. scores).
+
+    Returns:
+
+        metadata: dict. Metadata saved with the artifact.
+    """
+    metadata = dict(metadata or {})
+    metadata.update({
+        'format_version': FORMAT_VERSION,
+        'created': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+        'featurizer_fingerprint': featurizer.fingerprint(),
+        'sklearn_version': sklearn.__version__,
+    })
+    artifact = {'featurizer': featurizer, 'pipeline': pipeline, 'metadata': metadata}
+    # note: written to a temporary file first, so that a scorer never loads a
+    # partially written artifact.
+    joblib.dump(artifact, path + '.tmp')
+    os.replace(path + '.tmp', path)
+    with open(path + '.json', 'w') as f:
+        json.dump(metadata, f, indent=2, sort_keys=True, default=str)
+    return metadata
+
+
+def load_model(path: str, mmap_mode: str = 'r'):
+    """loads an artifact saved by `save_model`.
+
+    Arguments:
+
+        path: str. Path of the artifact.
+
+        mmap_mode: str. Passed to `joblib.load`. With 'r', the numpy arrays in
+            the model are memory-mapped read-only.
+
+    Returns:
+
+        featurizer, pipeline, metadata: Tuple[Featurizer, sklearn estimator, dict].
+
+    Raises:
+
+        ValueError: if the artifact has a different format version, or if
+            its featurizer's fingerprint differs from the one it was saved
+            with (e.g. it was unpickled by a different version of
+            scikit-learn, or `preprocessing.FEATURIZER_VERSION` has been
+            bumped since), since the estimator would then be given features
+            it was not trained on.
+    """
+    artifact = joblib.load(path, mmap_mode=mmap_mode)
+    metadata = artifact['metadata']
+    if metadata.get('format_version') != FORMAT_VERSION:
+        raise ValueError('{0} has artifact format version {1}, expected {2}.'.format(
+            path, metadata.get('format_version'), FORMAT_VERSION))
+    fingerprint = artifact['featurizer'].fingerprint()
+    if metadata.get('featurizer_fingerprint') != fingerprint:
+        raise ValueError('{0} was saved with featurizer {1}, but its featurizer has fingerprint {2}.'.format(
+            path, metadata.get('featurizer_fingerprint'), fingerprint))
+    return artifact['featurizer'], artifact['pipeline'], metadata
+
+
+def data_hash(y: pd.Series) -> str:
+    """returns a hash of labels indexed by video ID, independent of row order."""
+    labels = sorted(zip(y.index.astype(str), y.values.astype(float)))
+    return hashlib.sha1(repr(labels).encode('utf-8')).hexdigest()
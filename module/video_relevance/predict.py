@@ -0,0 +1,168 @@
+"""scores scraped videos as "relevant" (1) or "not relevant" (0) using the
+model artifact saved by `module.video_relevance.train` (see
+`module.video_relevance.model_artifact`).
+
+Videos are scored in fixed-size chunks, optionally across a pool of
+processes, and predictions are appended to `output/class_preds.csv` as each
+chunk is scored, so memory use does not grow with the corpus. A full run
+writes to a temporary file that replaces `class_preds.csv` only once every
+video has been scored, so an interrupted run leaves the previous predictions
+in place.
+
+A video scraped in several runs is scored from its latest snapshot, as in
+`module.video_store.load_unique`.
+
+Example usage::
+
+    # scores every scraped video.
+    python -m module predict --model_path $OUTPATH/model.joblib --n_jobs 4
+
+    # only scores videos that are not in class_preds.csv yet (e.g. after
+    # each daily scrape).
+    python -m module predict --model_path $OUTPATH/model.joblib --new_only
+"""
+
+import os
+import csv
+import functools
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+from module import settings, video_store
+from module.video_relevance.preprocessing import transform_chunks
+from module.video_relevance import model_artifact
+
+# path to where predictions are saved.
+PREDS_PATH = os.path.join(settings.OUTPUT_DIR, 'class_preds.csv')
+
+# featurizer and pipeline of each model loaded by this process, by model path
+# and modification time.
+# note: each worker process loads a model the first time it scores videos with
+# it, and reuses it for every later task.
+_models = {}
+
+
+def main(model_path: str,
+         preds_path: str = PREDS_PATH,
+         chunk_size: int = 10000,
+         n_jobs: int = 1,
+         new_only: bool = False) -> None:
+    """scores scraped videos and saves predictions to `preds_path`.
+
+    Arguments:
+
+        model_path: str. Path to the model artifact saved by `train.main`.
+
+        preds_path: str. Path to the predictions csv.
+
+        chunk_size: int. Maximum number of videos scored at once.
+
+        n_jobs: int. Number of processes. Each process scores whole snapshots.
+
+        new_only: bool. If True, only scores videos that are not in
+            `preds_path` yet, and appends their predictions to it.
+    """
+    # note: paths are read from `video_store` at call time rather than bound
+    # as default arguments, so that they can be redirected (e.g. in tests).
+    snapshots_path = video_store.SNAPSHOTS_PATH
+    scored = set()
+    if new_only and os.path.isfile(preds_path):
+        scored = set(pd.read_csv(preds_path).video_id.values)
+        out_path = preds_path
+    else:
+        # starts a new predictions file, which replaces `preds_path` once
+        # every video has been scored.
+        out_path = preds_path + '.tmp'
+        os.makedirs(os.path.dirname(os.path.abspath(preds_path)), exist_ok=True)
+        with open(out_path, 'w', newline='') as f:
+            csv.writer(f).writerow(['video_id', 'label'])
+    if new_only:
+        # note: new videos are few, so they are read from the store in one go.
+        videos = video_store.load_unique(path=video_store.UNIQUE_STORE_PATH, store_path=video_store.STORE_PATH,
+                                         snapshots_path=snapshots_path).reset_index()
+        videos = videos[~videos.video_id.isin(scored)]
+        tasks = [videos.iloc[i:i+chunk_size] for i in range(0, videos.shape[0], chunk_size)]
+        score = functools.partial(score_videos, model_path=model_path)
+    else:
+        # note: the latest snapshots are scored first, so that the latest row
+        # of each video is the one kept by `_write_preds`.
+        tasks = video_store.list_snapshots(snapshots_path)[::-1]
+        score = functools.partial(score_snapshot, model_path=model_path, chunk_size=chunk_size, snapshots_path=snapshots_path)
+    if n_jobs == 1:
+        n_scored = _write_preds(map(score, tasks), out_path, scored)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            n_scored = _write_preds(executor.map(score, tasks), out_path, scored)
+    if out_path != preds_path:
+        os.replace(out_path, preds_path)
+    print('Saved predictions for {0} videos to {1}'.format(n_scored, preds_path))
+    return None
+
+
+def load_model(model_path: str):
+    """loads the fitted featurizer and pipeline saved by `train.main`.
+
+    The model's arrays are memory-mapped rather than copied, so loading is
+    fast and worker processes share the same pages.
+
+    Returns:
+
+        featurizer, pipeline: Tuple[Featurizer, sklearn.pipeline.Pipeline].
+    """
+    featurizer, pipeline, metadata = model_artifact.load_model(model_path, mmap_mode='r')
+    return featurizer, pipeline
+
+
+def get_model(model_path: str):
+    """returns the featurizer and pipeline saved at `model_path`, loading
+    them only the first time they are used in this process (or after the
+    model has been saved again)."""
+    key = (model_path, os.path.getmtime(model_path))
+    if key not in _models:
+        _models[key] = load_model(model_path)
+    return _models[key]
+
+
+def score_videos(videos: pd.DataFrame, model_path: str) -> pd.DataFrame:
+    """returns predicted label of each video, using the model saved at
+    `model_path`."""
+    featurizer, pipeline = get_model(model_path)
+    if videos.shape[0] == 0:
+        return pd.DataFrame({'video_id': [], 'label': []})
+    video_ids, X = next(transform_chunks(featurizer, [videos]))
+    return pd.DataFrame({'video_id': video_ids, 'label': pipeline.predict(X).astype(int)})
+
+
+def score_snapshot(fname: str, model_path: str, chunk_size: int = 10000,
+                   snapshots_path: str = video_store.SNAPSHOTS_PATH) -> pd.DataFrame:
+    """returns predicted label of each video in a csv snapshot, featurizing
+    `chunk_size` videos at a time."""
+    chunks = video_store.iter_snapshot_chunks(chunk_size, snapshots_path=snapshots_path, fnames=[fname])
+    preds = [score_videos(chunk, model_path) for chunk in chunks]
+    return pd.concat(preds, axis=0) if len(preds) else score_videos(pd.DataFrame([]), model_path)
+
+
+def _write_preds(results, preds_path: str, scored: set) -> int:
+    """appends each DataFrame of predictions in `results` to `preds_path` as
+    soon as it is available, skipping videos that have already been scored.
+
+    `results` must be ordered from the latest snapshot to the oldest, so that
+    each video keeps the prediction for its latest row. Within a DataFrame,
+    the last row of a video is kept, as in `video_store.load_unique`.
+
+    Returns the number of predictions written.
+    """
+    n_written = 0
+    for preds in results:
+        is_new = [video_id not in scored for video_id in preds.video_id.values]
+        preds = preds[is_new].drop_duplicates('video_id', keep='last')
+        scored.update(preds.video_id.values)
+        preds.to_csv(preds_path, mode='a', header=False, index=False)
+        n_written += preds.shape[0]
+    return n_written
+
+
+if __name__ == '__main__':
+    import sys
+    from module.__main__ import main as cli
+    sys.exit(cli(['predict'] + sys.argv[1:]))
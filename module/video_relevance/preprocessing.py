@@ -2,30 +2,75 @@
 """
 
 import datetime
+import hashlib
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 
 from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.pipeline import Pipeline, FeatureUnion
-from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
 
 from module.utils import get_videos, duration_str_to_num
 
+# version of the featurization code. Part of `Featurizer.fingerprint`, so it
+# must be bumped whenever a change to this module changes the features of a
+# video, or cached features (see `module.video_relevance.feature_cache`)
+# computed by the old code would be reused.
+FEATURIZER_VERSION = 1
+
+# `CountVectorizer` kwargs that only apply to a vocabulary, which a
+# `HashingVectorizer` does not have.
+VOCABULARY_KWARGS = ('max_features', 'min_df', 'max_df', 'vocabulary')
+
 
 class Featurizer(BaseEstimator, TransformerMixin):
     """constructs a feature union of text and numeric features for each video.
+
+    Features are returned as a sparse CSR matrix, so memory grows with the
+    number of non-zero features rather than rows x vocabulary. Set
+    `dense=True` only when a downstream estimator requires a dense array.
+
+    By default, title and channel title are vectorized with a
+    `CountVectorizer`, which must see the whole corpus to build its
+    vocabulary. With `hashing=True`, they are instead hashed into a fixed
+    feature space with a `HashingVectorizer`, which keeps no vocabulary. The
+    only fitted state is then the handful of duration bins and medians in
+    `NumericFeatures`, so videos can be featurized in chunks (see
+    `transform_chunks`) in constant memory, and in separate processes.
+
+    Arguments:
+
+        dense: bool. If True, `transform` returns a dense np.ndarray.
+
+        hashing: bool. If True, uses a `HashingVectorizer` for text features.
+
+        n_features: int. Number of hashed features per text field. Only used
+            if `hashing=True`.
+
+        *args, **kwargs: passed to each `CountVectorizer` (or
+            `HashingVectorizer` if `hashing=True`, in which case
+            `VOCABULARY_KWARGS` are not allowed).
     """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, dense: bool = False, hashing: bool = False, n_features: int = 2 ** 18, **kwargs):
+        if hashing:
+            vocabulary_kwargs = [k for k in VOCABULARY_KWARGS if k in kwargs]
+            if len(vocabulary_kwargs):
+                raise ValueError('{0} only apply to a vocabulary and cannot be used with hashing=True. '
+                                 'Use n_features to set the number of hashed features.'.format(', '.join(vocabulary_kwargs)))
+        self.dense = dense
+        self.hashing = hashing
+        self.n_features = n_features
         self.featurizer = FeatureUnion(
             transformer_list=[
                 ('text_title', Pipeline([
                     ('selector', ItemSelector(key='title')),
-                    ('count_vectorizer', CountVectorizer(*args, **kwargs)),
+                    self._vectorizer(*args, **kwargs),
                 ])),
                 ('text_channel_title', Pipeline([
                     ('selector', ItemSelector(key='channel_title')),
-                    ('count_vectorizer', CountVectorizer(*args, **kwargs)),
+                    self._vectorizer(*args, **kwargs),
                 ])),
                 ('numeric', NumericFeatures()),
             ],
@@ -37,11 +82,65 @@ class Featurizer(BaseEstimator, TransformerMixin):
             },
         )
 
+    def _vectorizer(self, *args, **kwargs):
+        """returns a (name, vectorizer) pipeline step for a text field."""
+        if self.hashing:
+            # note: alternate_sign=False and norm=None so that hashed features
+            # are non-negative counts, like those of CountVectorizer.
+            kwargs.setdefault('norm', None)
+            return ('hashing_vectorizer', HashingVectorizer(*args, n_features=self.n_features, alternate_sign=False, **kwargs))
+        return ('count_vectorizer', CountVectorizer(*args, **kwargs))
+
     def fit(self, X, y=None):
-        return self.featurizer.fit(X)
+        self.featurizer.fit(X)
+        return self
+
+    def fingerprint(self) -> str:
+        """returns a hash of `FEATURIZER_VERSION` and the featurizer's
+        parameters and fitted state.
+
+        Two fitted featurizers with the same fingerprint produce the same
+        features for the same video.
+        """
+        fingerprint = hashlib.sha1()
+        fingerprint.update(repr((FEATURIZER_VERSION, self.hashing, self.n_features, sorted(self.featurizer.transformer_weights.items()))).encode())
+        for name, transformer in self.featurizer.transformer_list:
+            fingerprint.update(name.encode())
+            if isinstance(transformer, Pipeline):
+                vectorizer = transformer.steps[-1][1]
+                fingerprint.update(repr(sorted(vectorizer.get_params().items())).encode())
+                # note: sorted, since dict order depends on the order of the training data.
+                fingerprint.update(repr(sorted(getattr(vectorizer, 'vocabulary_', {}).items())).encode())
+            else:
+                fingerprint.update(transformer.bins.tobytes())
+                fingerprint.update(transformer.medians.tobytes())
+        return fingerprint.hexdigest()
 
     def transform(self, X):
-        return self.featurizer.transform(X).todense()
+        features = sp.csr_matrix(self.featurizer.transform(X))
+        if self.dense:
+            return features.toarray()
+        return features
+
+
+def transform_chunks(featurizer, chunks):
+    """featurizes an iterable of video DataFrames one chunk at a time.
+
+    Arguments:
+
+        featurizer: Featurizer. Fitted featurizer.
+
+        chunks: Iterable[pd.DataFrame]. Chunks of videos (e.g. from
+            `module.video_store.iter_snapshot_chunks`).
+
+    Yields:
+
+        video_ids, X: Tuple[np.ndarray, sp.csr_matrix]. Video IDs and
+            features of each chunk.
+    """
+    for chunk in chunks:
+        chunk = chunk.assign(title=chunk.title.fillna(''), channel_title=chunk.channel_title.fillna(''))
+        yield chunk.video_id.values, featurizer.transform(chunk)
 
 
 class ItemSelector(BaseEstimator, TransformerMixin):
@@ -83,28 +182,54 @@ class ItemSelector(BaseEstimator, TransformerMixin):
 
 
 class NumericFeatures(BaseEstimator, TransformerMixin):
-    """Extract numeric features from each video."""
+    """Extract numeric features from each video.
+
+    Duration bins and the medians used to fill missing values are learned in
+    `fit`, so that the same values are used when transforming training data
+    and new videos.
+    """
     election_date = datetime.datetime(2017, 8, 8)
 
     def fit(self, videos, y=None):
-        seconds = duration_str_to_num(videos.duration.values)
+        seconds = _duration_seconds(videos)
         _, self.bins = pd.qcut(seconds, q=10, retbins=True)
+        self.medians = np.nanmedian(self._features(videos), axis=0)
         return self
 
     def transform(self, videos):
-        seconds = duration_str_to_num(videos.duration.values)
-        seconds_bin = np.array([np.searchsorted(self.bins, x) - 1 if pd.notnull(x) else np.nan for x in seconds])
-        seconds_bin = seconds_bin.clip(self.bins.min(), self.bins.max())
-        title_length = videos.title.apply(lambda x: len(x) if pd.notnull(x) else np.nan)
-        channel_title_length = videos.channel_title.apply(lambda x: len(x) if pd.notnull(x) else np.nan)
-        days_from_election = pd.to_datetime(videos.published_at).apply(lambda x: (x - self.election_date).days if pd.notnull(x) else np.nan).values
-        X = np.stack([seconds_bin, title_length, channel_title_length, days_from_election], axis=1)
-        # fills NAs with column medians.
-        medians = np.nanmedian(X, axis=0)
+        X = self._features(videos)
+        # fills NAs with column medians from the training data.
         inds = np.where(np.isnan(X))
-        X[inds] = np.take(medians, inds[1])
+        X[inds] = np.take(self.medians, inds[1])
         assert np.isnan(X).sum() == 0
         return X
 
+    def _features(self, videos):
+        """returns features of each video, with NaN where a feature is missing."""
+        seconds = _duration_seconds(videos)
+        seconds_bin = (np.searchsorted(self.bins, seconds) - 1).clip(0, len(self.bins) - 2).astype(float)
+        seconds_bin[np.isnan(seconds)] = np.nan
+        title_length = videos.title.str.len().values.astype(float)
+        channel_title_length = videos.channel_title.str.len().values.astype(float)
+        published_at = pd.to_datetime(videos.published_at, utc=True).dt.tz_convert(None)
+        days_from_election = np.floor((published_at - self.election_date).values / np.timedelta64(1, 'D'))
+        return np.stack([seconds_bin, title_length, channel_title_length, days_from_election], axis=1)
+
     def get_feature_names(self):
         return ['seconds_bin', 'title_length', 'channel_title_length', 'days_from_election']
+
+
+def one_hot(values) -> sp.csr_matrix:
+    """returns a sparse one-hot encoding of `values`, with one column per
+    unique value (in sorted order)."""
+    codes, categories = pd.factorize(np.asarray(values), sort=True)
+    n = codes.shape[0]
+    return sp.csr_matrix((np.ones(n, dtype=np.int32), (np.arange(n), codes)), shape=(n, categories.shape[0]))
+
+
+def _duration_seconds(videos):
+    """returns duration of each video in seconds, using the pre-parsed
+    `duration_seconds` column from the video store when available."""
+    if 'duration_seconds' in videos:
+        return videos.duration_seconds.values.astype(float)
+    return duration_str_to_num(videos.duration.values)
@@ -0,0 +1,207 @@
+"""uncertainty-sampling query engine for active learning.
+
+The engine keeps an incrementally updated classifier (any estimator with
+`partial_fit` and `predict_proba`) and a priority queue of unlabeled videos
+ordered by how uncertain the classifier is about them. Each label is learned
+with a single `partial_fit` call, and a background thread then rescores a
+random candidate pool of unlabeled videos (plus the most uncertain videos
+from the previous queue) rather than the whole corpus. Queries are popped
+from the current queue, so the next query never waits on rescoring.
+
+Example::
+
+    >>> engine = QueryEngine(X, video_ids, strategy='entropy')
+    >>> engine.start()
+    >>> video_id = engine.next_query()
+    >>> engine.teach(video_id, 1)
+    >>> engine.stop()
+"""
+
+import copy
+import heapq
+import threading
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+
+CLASSES = np.array([0, 1])
+
+
+def margin(proba: np.ndarray) -> np.ndarray:
+    """returns 1 minus the difference between the two most probable classes."""
+    proba = np.sort(proba, axis=1)
+    return 1 - (proba[:, -1] - proba[:, -2])
+
+
+def entropy(proba: np.ndarray) -> np.ndarray:
+    """returns the entropy of the predicted class distribution."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return -np.nansum(proba * np.log(proba), axis=1)
+
+
+def least_confident(proba: np.ndarray) -> np.ndarray:
+    """returns 1 minus the probability of the most probable class."""
+    return 1 - proba.max(axis=1)
+
+
+# query strategies. Each takes an (n, n_classes) array of predicted
+# probabilities and returns the uncertainty of each row (higher is more
+# uncertain).
+STRATEGIES = {
+    'margin': margin,
+    'entropy': entropy,
+    'least_confident': least_confident,
+}
+
+
+class QueryEngine(object):
+    """picks the next video to label by uncertainty sampling.
+
+    Arguments:
+
+        X: sp.csr_matrix or np.ndarray. Features of every video.
+
+        video_ids: array-like. Video ID of each row of `X`.
+
+        model: sklearn estimator with `partial_fit` and `predict_proba`.
+            Defaults to a linear `SGDClassifier` with the "modified_huber"
+            loss.
+
+        strategy: str or callable. Name of a strategy in `STRATEGIES`, or a
+            function with the same signature.
+
+        pool_size: int. Number of random unlabeled videos rescored after each
+            label.
+
+        keep_size: int. Number of the most uncertain videos from the previous
+            queue that are rescored along with the random pool.
+
+        seed: int. Random seed.
+    """
+
+    def __init__(self, X, video_ids, model=None, strategy='margin', pool_size: int = 2000,
+                 keep_size: int = 200, seed: int = None):
+        self.X = X
+        self.video_ids = np.asarray(video_ids)
+        self.rows = {video_id: row for row, video_id in enumerate(self.video_ids)}
+        self.model = model if model is not None else SGDClassifier(loss='modified_huber', random_state=seed)
+        self.strategy = STRATEGIES[strategy] if isinstance(strategy, str) else strategy
+        self.pool_size = pool_size
+        self.keep_size = keep_size
+        self.random_state = np.random.RandomState(seed)
+        self.labels = {}
+        self.is_fitted = False
+        # queue of (-uncertainty, row) tuples.
+        self.queue = []
+        # rows that have been returned by `next_query` but not labeled yet.
+        self.pending = set()
+        self._lock = threading.Lock()
+        self._rescore = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """starts rescoring in a background thread."""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """stops the background thread."""
+        self._stopped.set()
+        self._rescore.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def teach(self, video_id: str, label: int) -> None:
+        """updates the model with a new label and schedules rescoring."""
+        self.teach_many([video_id], [label])
+
+    def teach_many(self, video_ids, labels) -> None:
+        """updates the model with new labels (e.g. previous sessions' labels)
+        and schedules rescoring."""
+        rows = [self.rows[video_id] for video_id in video_ids if video_id in self.rows]
+        labels = [int(label) for video_id, label in zip(video_ids, labels) if video_id in self.rows]
+        if len(rows) == 0:
+            return
+        with self._lock:
+            self.model.partial_fit(self.X[rows], labels, classes=CLASSES)
+            self.is_fitted = True
+            for row, label in zip(rows, labels):
+                self.labels[row] = label
+                self.pending.discard(row)
+        self._rescore.set()
+        if self._thread is None:
+            self.rescore()
+
+    def next_query(self) -> str:
+        """returns the video ID of the most uncertain unlabeled video.
+
+        Until the first label is learned, or if the queue has run out, returns
+        a random unlabeled video.
+        """
+        with self._lock:
+            while len(self.queue):
+                _, row = heapq.heappop(self.queue)
+                if row not in self.labels and row not in self.pending:
+                    self.pending.add(row)
+                    return self.video_ids[row]
+        unlabeled = self._sample_unlabeled(1)
+        if len(unlabeled) == 0:
+            return None
+        with self._lock:
+            self.pending.add(unlabeled[0])
+        return self.video_ids[unlabeled[0]]
+
+    def rescore(self) -> None:
+        """rescores a candidate pool and replaces the queue.
+
+        The model is copied under the lock, so labels can be learned while the
+        pool is being scored.
+        """
+        with self._lock:
+            if not self.is_fitted:
+                return
+            model = copy.deepcopy(self.model)
+            kept = [row for _, row in heapq.nsmallest(self.keep_size, self.queue)]
+        rows = np.union1d(self._sample_unlabeled(self.pool_size), np.asarray(kept, dtype=int))
+        if rows.shape[0] == 0:
+            return
+        uncertainty = self.strategy(model.predict_proba(self.X[rows]))
+        queue = list(zip(-uncertainty, rows.tolist()))
+        heapq.heapify(queue)
+        with self._lock:
+            self.queue = queue
+
+    def predict(self, chunk_size: int = 10000) -> np.ndarray:
+        """returns the predicted label of every video, scoring `chunk_size`
+        videos at a time. Labeled videos get their label."""
+        with self._lock:
+            model = copy.deepcopy(self.model)
+            labels = dict(self.labels)
+        preds = np.concatenate([model.predict(self.X[i:i+chunk_size]) for i in range(0, self.X.shape[0], chunk_size)])
+        for row, label in labels.items():
+            preds[row] = label
+        return preds.astype(int)
+
+    def _sample_unlabeled(self, n: int) -> np.ndarray:
+        """returns up to `n` random unlabeled rows."""
+        n_rows = self.X.shape[0]
+        with self._lock:
+            excluded = set(self.labels) | self.pending
+            if len(excluded) >= n_rows:
+                return np.array([], dtype=int)
+            # note: oversamples, so that excluded rows rarely leave the pool short.
+            rows = self.random_state.randint(0, n_rows, size=min(n_rows, 2 * n + len(excluded)))
+            rows = np.unique([row for row in rows if row not in excluded])
+            if rows.shape[0] == 0:
+                rows = np.array([row for row in range(n_rows) if row not in excluded])
+            return self.random_state.permutation(rows)[:n]
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._rescore.wait()
+            self._rescore.clear()
+            if self._stopped.is_set():
+                break
+            self.rescore()
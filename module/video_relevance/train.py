@@ -9,30 +9,72 @@ take can be passed as command line arguments.
 
 Example usage::
 
-    python -m module.video_relevance.train \
+    python -m module train \
         --verbosity 3 \
         --max_features 1000  --stop_words english --binary \
         --periodic_checkpoint_folder $OUTPATH \
         --generations 200 --population_size 25 \
         --scoring f1_macro --cv 5 \
-        --n_jobs 1 --max_eval_time_mins 5 \
+        --n_jobs -1 --max_eval_time_mins 5 \
         --warm_start
+
+To hash text features into a fixed feature space instead of building a
+vocabulary (see `Featurizer`), pass e.g. `--hashing --n_features 65536` in
+place of `--max_features`. Vocabulary-only arguments (`--max_features`,
+`--min_df`, `--max_df`) are rejected with `--hashing`.
+
+Features are cached by video ID for each fitted featurizer (see
+`module.video_relevance.feature_cache`), so repeated runs only featurize
+videos they have not seen before. Pass `--no_feature_cache` to disable this.
+
+Labels are read from every labeling session (see
+`module.video_relevance.label_store`). Pass e.g. `--on_conflict drop` to drop
+videos with conflicting labels rather than keeping the latest label.
+
+The fitted featurizer and best pipeline are saved together, with their train
+and test scores and a hash of the labels, as a single artifact in
+`$OUTPATH/model.joblib` (see `module.video_relevance.model_artifact`).
+
+Pipelines are evaluated in `--n_jobs` processes (-1 uses every core). Fitted
+pipeline steps are cached in `$OUTPATH/tpot_memory` (TPOT's `memory`
+argument), so a run restarted with the same checkpoint folder and data does
+not refit steps that an earlier run already fitted. Pass `--memory` to use a
+different cache directory.
+
+The training features are computed once and saved to `$OUTPATH/X_train` as
+read-only memory-mapped arrays, which worker processes and CV folds share
+instead of each holding a pickled copy. Without a checkpoint folder, they are
+saved to a temporary directory that is removed once the best pipeline has
+been scored. Peak memory of the search is reported at the end of the run and
+saved with the model. It is the peak of the main process plus the largest
+peak of any worker process, measured once `tpot.fit` returns and TPOT's
+worker pool has been shut down (see `module.utils.peak_memory_mb`).
+
+Pass `--metrics_path metrics.jsonl` to append the duration of each phase
+(loading data, featurizing, the search, scoring and saving) and a summary of
+the run to a JSON lines file, and/or `--prometheus_path train.prom` to write
+them to a Prometheus textfile (see `module.metrics`).
 """
 
 import os
 import sys
 import argparse
 import inspect
+import time
+import tempfile
 import datetime
+import contextlib
 from typing import List, Tuple
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
-from tpot import TPOTClassifier
 
-from module.utils import get_videos, parse_unknown_args
+from module.utils import peak_memory_mb
 from module.video_relevance.preprocessing import Featurizer
-from module import settings
+from module.video_relevance.feature_cache import FeatureCache, memmap_matrix
+from module.video_relevance.model_artifact import save_model, data_hash
+from module.video_relevance.label_store import load_labeled_videos
+from module.metrics import METRICS
 
 # random seed used to ensure train/dev/test split is the same on every run.
 SEED = 531992
@@ -40,63 +82,155 @@ SEED = 531992
 # train/test sizes
 TRAIN_SIZE = 0.8
 
-# path to where labels are saved.
-LABELS_PATH = os.path.join(settings.DATA_DIR, 'manual', 'video_relevance')
+# file name of the model artifact saved in `periodic_checkpoint_folder`.
+MODEL_FNAME = 'model.joblib'
+
+# name of the directory in `periodic_checkpoint_folder` where fitted pipeline
+# steps are cached between runs.
+MEMORY_DIRNAME = 'tpot_memory'
+
+# name of the directory in `periodic_checkpoint_folder` where the training
+# feature matrix is saved.
+MATRIX_DIRNAME = 'X_train'
 
 
 def main(**kwargs) -> None:
+    # note: tpot (and with it deap and every estimator it searches over) is
+    # slow to import, so it is only imported once training starts.
+    from tpot import TPOTClassifier
+    # if True, features are recomputed rather than read from the feature cache.
+    no_feature_cache = kwargs.pop('no_feature_cache', False)
     # divides kwargs between `Featurizer` and `TPOTClassifier` kwargs.
     tpot_kwargs = {}
     keys = list(kwargs.keys())
+    tpot_args = inspect.signature(TPOTClassifier.__init__).parameters
     for k in keys:
-        if k in inspect.getargspec(TPOTClassifier).args:
+        if k in tpot_args:
             tpot_kwargs[k] = kwargs.pop(k)
-    # loads all data into memory.
-    paths = [os.path.join(LABELS_PATH, fname) for fname in os.listdir(LABELS_PATH)]
-    X_raw, y = load_data(paths)
+    checkpoint_folder = tpot_kwargs.get('periodic_checkpoint_folder')
+    if checkpoint_folder is not None and 'memory' not in tpot_kwargs:
+        # note: joblib keys cached steps on their input data, so the cache is
+        # only reused when the training data is unchanged.
+        tpot_kwargs['memory'] = os.path.join(checkpoint_folder, MEMORY_DIRNAME)
+    # how to resolve conflicting labels (see `label_store.CONFLICT_POLICIES`).
+    on_conflict = kwargs.pop('on_conflict', 'latest')
+    # KLUDGE: preprocesses text deterministically (i.e. NOT part of the TPOT hyperparameter
+    # optimization pipeline).
+    # note: built before loading the data, so that invalid featurizer
+    # arguments fail right away.
+    featurizer = build_featurizer(tpot_kwargs.get('config_dict'), **kwargs)
+    with METRICS.timer('load_data'):
+        X_raw, y = load_data(on_conflict=on_conflict)
     X_raw.title.fillna('', inplace=True)
     X_raw.channel_title.fillna('', inplace=True)
     # splits data into train and test sets.
     X_train, X_test, y_train, y_test = train_test_split(X_raw, y,
         random_state=SEED, train_size=TRAIN_SIZE, test_size=1-TRAIN_SIZE, shuffle=True)
-    # KLUDGE: preprocesses text deterministically (i.e. NOT part of the TPOT hyperparameter
-    # optimization pipeline).
-    featurizer = Featurizer(**kwargs)
-    featurizer.fit(X_train)
-    X_train = featurizer.transform(X_train)
-    if 'verbosity' in tpot_kwargs and tpot_kwargs['verbosity'] > 0:
-        print(f'Beginning hyper-parameter search with training data shape: {X_train.shape}.')
-    tpot = TPOTClassifier(**tpot_kwargs)
-    tpot.fit(X_train, y_train)
-    if 'periodic_checkpoint_folder' in tpot_kwargs:
-        tpot.export(os.path.join(tpot_kwargs['periodic_checkpoint_folder'], 'best_pipeline.py'))
+    with matrix_dir(checkpoint_folder) as matrix_path:
+        with METRICS.timer('featurize'):
+            featurizer.fit(X_train)
+            feature_cache = None if no_feature_cache else FeatureCache(featurizer)
+            # saves the training features once, as read-only memory-mapped arrays
+            # shared by every CV fold and worker process.
+            X_train = memmap_matrix(featurize(featurizer, X_train, feature_cache), matrix_path)
+        if 'verbosity' in tpot_kwargs and tpot_kwargs['verbosity'] > 0:
+            print(f'Beginning hyper-parameter search with training data shape: {X_train.shape} '
+                  f'(peak memory so far: {round(peak_memory_mb(), 1)} MB).')
+        tpot = TPOTClassifier(**tpot_kwargs)
+        time0 = time.time()
+        with METRICS.timer('search'):
+            tpot.fit(X_train, y_train)
+        search_seconds = time.time() - time0
+        # note: includes the search's worker processes, which have exited by now.
+        search_peak_memory_mb = peak_memory_mb(children=True)
+        n_evaluations = len(tpot.evaluated_individuals_)
+        with METRICS.timer('score'):
+            X_test = featurize(featurizer, X_test, feature_cache)
+            train_score = tpot.score(X_train, y_train)
+            test_score = tpot.score(X_test, y_test)
+    METRICS.set('n_train', y_train.shape[0])
+    METRICS.set('n_test', y_test.shape[0])
+    METRICS.set('train_score', train_score)
+    METRICS.set('test_score', test_score)
+    METRICS.inc('pipeline_evaluations', n_evaluations)
+    METRICS.set('evaluations_per_second', n_evaluations / search_seconds)
+    METRICS.set('peak_memory_mb', search_peak_memory_mb)
+    if checkpoint_folder is not None:
+        tpot.export(os.path.join(checkpoint_folder, 'best_pipeline.py'))
+        # saves the fitted featurizer and best pipeline as a single artifact
+        # for batch prediction (see `module.video_relevance.predict`).
+        metadata = {
+            'data_hash': data_hash(y),
+            'n_train': int(y_train.shape[0]),
+            'n_test': int(y_test.shape[0]),
+            'train_score': float(train_score),
+            'test_score': float(test_score),
+            'scoring': tpot_kwargs.get('scoring'),
+            'pipeline': str(tpot.fitted_pipeline_),
+            'n_jobs': tpot_kwargs.get('n_jobs', 1),
+            'n_evaluations': n_evaluations,
+            'evaluations_per_second': n_evaluations / search_seconds,
+            'peak_memory_mb': search_peak_memory_mb,
+        }
+        with METRICS.timer('save'):
+            save_model(os.path.join(checkpoint_folder, MODEL_FNAME),
+                       featurizer, tpot.fitted_pipeline_, metadata)
     if 'verbosity' in tpot_kwargs and tpot_kwargs['verbosity'] > 0:
-        X_test = featurizer.transform(X_test)
-        print(f'Train set score: {tpot.score(X_train, y_train).round(4)}')
-        print(f'Test set score: {tpot.score(X_test, y_test).round(4)}')
+        print(f'Evaluated {n_evaluations} pipelines in {round(search_seconds, 1)}s '
+              f'({round(n_evaluations / search_seconds, 3)} evaluations/s).')
+        print(f'Train set score: {round(train_score, 4)}')
+        print(f'Test set score: {round(test_score, 4)}')
+        print(f'Peak memory of the search: {round(search_peak_memory_mb, 1)} MB '
+              f'(main process plus largest worker).')
     return None
 
 
-def load_data(paths: List[str]) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    """loads labels and unprocessed features.
+@contextlib.contextmanager
+def matrix_dir(checkpoint_folder: str = None):
+    """yields the directory where the training matrix is saved.
+
+    Without a checkpoint folder, the matrix is saved to a temporary directory
+    that is removed on exit (i.e. once the best pipeline has been scored).
+    """
+    if checkpoint_folder is not None:
+        yield os.path.join(checkpoint_folder, MATRIX_DIRNAME)
+        return
+    with tempfile.TemporaryDirectory() as path:
+        yield path
+
+
+def build_featurizer(config_dict: str = None, **kwargs) -> Featurizer:
+    """returns an unfitted featurizer for the TPOT configuration `config_dict`.
+
+    Only the "TPOT sparse" configuration supports sparse features, so every
+    other configuration gets dense features.
+    """
+    return Featurizer(dense=config_dict != 'TPOT sparse', **kwargs)
+
+
+def featurize(featurizer: Featurizer, X_raw: pd.DataFrame, feature_cache: FeatureCache = None):
+    """transforms videos indexed by video ID, reading features of previously
+    featurized videos from `feature_cache` if given."""
+    if feature_cache is None:
+        return featurizer.transform(X_raw)
+    return feature_cache.transform(X_raw, video_ids=X_raw.index.values)
+
+
+def load_data(on_conflict: str = 'latest', **kwargs) -> Tuple[pd.DataFrame, pd.Series]:
+    """loads labels and unprocessed features (see `label_store.load_labeled_videos`).
+
+    Arguments:
+
+        **kwargs: passed to `label_store.load_labeled_videos` (e.g. to read
+            another store or labels directory).
 
     Returns:
 
-        y, X_raw: Tuple[pd.DataFrame, pd.DataFrame]
+        X_raw, y: Tuple[pd.DataFrame, pd.Series]
     """
-    videos = get_videos().set_index('video_id')
-    labels = []
-    for path in paths:
-        these_labels = pd.read_csv(path).set_index('video_id').label
-        labels.append(these_labels)
-    y = pd.concat(labels, axis=0)
-    y = y[y.notnull()]
-    X_raw = videos.loc[y.index.values]
-    assert (y.index == X_raw.index).all()
-    assert y.shape[0] == X_raw.shape[0]
-    return X_raw, y
+    return load_labeled_videos(on_conflict=on_conflict, **kwargs)
 
 
 if __name__ == '__main__':
-    args = parse_unknown_args(sys.argv[1:])
-    main(**args.__dict__)
+    from module.__main__ import main as cli
+    sys.exit(cli(['train'] + sys.argv[1:]))
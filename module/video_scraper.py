@@ -6,15 +6,22 @@ Usage
 
 [example] Request videos since 1 April 2017::
     
-    python3 video_scraper.py --max-results 50 --published-after "2017-04-01T00:00:00Z" --max-pages 5 --region-code KE --relevance-language sw
+    python -m module scrape --max-results 50 --published-after "2017-04-01T00:00:00Z" --max-pages 5 --region-code KE --relevance-language sw
 
 [example] Request videos over past week::
     
-    python3 video_scraper.py --max-results 50 --max-pages 5 --region-code KE --relevance-language sw
+    python -m module scrape --max-results 50 --max-pages 5 --region-code KE --relevance-language sw
+
+[example] Resume the most recent run if it was interrupted::
+
+    python -m module scrape --resume
 
 Test::
     
-    python3 video_scraper.py --max-results 5 --max-pages 1 --region-code KE --relevance-language sw
+    python -m module scrape --max-results 5 --max-pages 1 --region-code KE --relevance-language sw
+
+The YouTube Data API key is read from `DEVELOPER_KEY` in `module/config.py`,
+or else from the YOUTUBE_DEVELOPER_KEY environment variable.
 
 Search procedure
 ----------------
@@ -25,6 +32,20 @@ Search procedure
 
 (3) Keyword search for other videos not found via (1) or (2).
 
+Searches are sent concurrently by a pool of up to `--workers` threads. Since
+(3) does not depend on (1) or (2), keyword searches are sent alongside the
+channel searches. Results are always deduplicated in the order (1), (2), (3),
+so the output does not depend on the number of workers.
+
+Channel and keyword searches stop paginating once they reach videos that
+have already been scraped. Channel searches are also incremental: each only
+asks for videos published after the latest video it returned in a previous
+run that ran out of results (its high-water mark, see
+`module.high_water_marks`). Use `--full-window` to search the whole
+`--published-after` window instead. Keyword searches are ordered by
+relevance, so they have no high-water marks and always search the whole
+window.
+
 This code is based on the Youtube API code sample here: 
 https://developers.google.com/youtube/v3/docs/search/list.
 
@@ -44,60 +65,126 @@ https://github.com/youtube/api-samples/tree/master/python
 # import sys
 # sys.path.append('.')
 import os
-import settings
 import json
-import datetime
+import argparse
 import csv
 import pandas as pd
-from apiclient.discovery import build
-from apiclient.errors import HttpError
-from oauth2client.tools import argparser
-from config import DEVELOPER_KEY
-
-YOUTUBE_API_SERVICE_NAME = "youtube"
-YOUTUBE_API_VERSION = "v3"
-
-def youtube_search_list(max_pages=5, **kwargs):
-    """calls YouTube data API search.list method."""
-    youtube = build(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION,
-        developerKey=DEVELOPER_KEY)
-
-    # Call the search.list method to retrieve results matching the specified
-    # query term.
-    search_response = youtube.search().list(**kwargs).execute()
-    # print(search_response)
-    # print(search_response.keys())
-
-    # Extract video ids
-    results = search_response['items'][:]
-    # video_ids = [search_result["id"]["videoId"] for search_result in search_response['items']]
-    page = 1
-    while 'nextPageToken' in search_response and len(search_response['nextPageToken']) and page < max_pages:
-        search_response = youtube.search().list(pageToken=search_response['nextPageToken'], **kwargs).execute()
-        for search_result in search_response['items']:
-            results.append(search_result)
-        page += 1
-        # print(len(results))
+from concurrent.futures import ThreadPoolExecutor
+from googleapiclient.errors import HttpError
+try:
+    from module.config import DEVELOPER_KEY
+except ImportError:
+    # note: e.g. when scraping a local fake API server (see benchmarks.fake_youtube).
+    DEVELOPER_KEY = os.environ.get('YOUTUBE_DEVELOPER_KEY')
+from module import settings, video_store, youtube_client, request_scheduler, scrape_journal, response_cache, high_water_marks
+from module.high_water_marks import HighWaterMarks
+from module.metrics import METRICS
+
+# schedules all API requests. Replaced in __main__ with a scheduler configured
+# from the command line arguments.
+scheduler = request_scheduler.RequestScheduler()
+
+# checkpoint journal of the current scrape run. Set in __main__.
+journal = None
+
+# cache of API responses. Set in __main__ unless --no-cache is given.
+cache = None
+
+def youtube_search_list(max_pages=5, priority=request_scheduler.PRIORITY_NORMAL, known_video_ids=None, **kwargs):
+    """calls YouTube data API search.list method.
+
+    If a scrape run is being journaled, each page is recorded as it arrives
+    and a query that was started in an interrupted run continues from its
+    last page token.
+
+    If `known_video_ids` is given, pagination stops early once the search
+    reaches videos that have already been scraped: for searches ordered by
+    date, as soon as a page contains a known video; otherwise, once a page
+    contains only known videos.
+
+    A search ordered by date that runs out of results is journaled as
+    complete, which allows its high-water mark to be raised (see
+    `update_high_water_marks`). A search that stops early at a known video is
+    not complete, since the videos after the known one were not searched.
+
+    If the scheduler refuses a request for lack of quota, the results from
+    the pages fetched so far are returned.
+    """
+    youtube = youtube_client.get_client(DEVELOPER_KEY)
+
+    results, page_token, page, done = [], None, 0, False
+    if journal is not None:
+        results, page_token, page, done = journal.query_progress('search.list', kwargs)
+        if page > 0 and not done and (not page_token or page >= max_pages):
+            # the run was interrupted after the query's last page was
+            # recorded, but before the query was recorded as done. Without a
+            # page token, fetching again would start over from the first page.
+            done = True
+            journal.record_done('search.list', kwargs, complete=not page_token)
+    try:
+        while not done and page < max_pages:
+            # Call the search.list method to retrieve results matching the specified
+            # query term.
+            page_kwargs = dict(kwargs, pageToken=page_token) if page_token else kwargs
+            search_response = cached_execute('search.list', youtube.search().list, priority=priority, **page_kwargs)
+            # print(search_response)
+            # print(search_response.keys())
+
+            # Extract video ids
+            results.extend(search_response['items'])
+            # video_ids = [search_result["id"]["videoId"] for search_result in search_response['items']]
+            page += 1
+            page_token = search_response.get('nextPageToken')
+            complete = not page_token
+            done = complete or page >= max_pages
+            if known_video_ids is not None and len(search_response['items']):
+                known = [search_result['id']['videoId'] in known_video_ids for search_result in search_response['items']]
+                if kwargs.get('order') == 'date' and any(known):
+                    # every later result is older than a known video.
+                    done = True
+                elif all(known):
+                    done = True
+            if journal is not None:
+                journal.record_page('search.list', kwargs, search_response['items'], page_token)
+                if done:
+                    journal.record_done('search.list', kwargs, complete=complete)
+            # print(len(results))
+    except request_scheduler.QuotaExceededError as e:
+        print('Stopped search early ({0} results kept): {1}'.format(len(results), e))
     # if verbose:
     #     video_ids = [r["id"]["videoId"] for r in results]
     #     print('Ids: {0}'.format(','.join(video_ids)))
     #     print('Number of unique ids: {0}'.format(len(set(video_ids))))
     return results
 
-def youtube_videos_list(video_ids, **kwargs):
-    """calls YouTube data API videos.list method."""
-    youtube = build(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION,
-        developerKey=DEVELOPER_KEY)
+def youtube_videos_list(video_ids, priority=request_scheduler.PRIORITY_HIGH, **kwargs):
+    """calls YouTube data API videos.list method.
 
-    # Call the videos.list method to retrieve details for each video.
-    video_response = youtube.videos().list(id=",".join(video_ids), **kwargs).execute()
+    Videos whose details are in the response cache are not requested again.
+    """
+    video_ids = list(video_ids)
+    cached = {}
+    if cache is not None:
+        cached = cache.get_videos(video_ids, part=kwargs.get('part'))
+    missing_video_ids = [video_id for video_id in video_ids if video_id not in cached]
 
-    # Add each result to the list.
     video_results = []
-    for video_result in video_response['items']:
-        video_results.append(video_result)
+    if len(missing_video_ids):
+        youtube = youtube_client.get_client(DEVELOPER_KEY)
+
+        # Call the videos.list method to retrieve details for each video.
+        video_response = scheduler.execute('videos.list', youtube.videos().list(id=",".join(missing_video_ids), **kwargs), priority=priority)
 
-    return video_results
+        # Add each result to the list.
+        for video_result in video_response['items']:
+            video_results.append(video_result)
+        if cache is not None:
+            cache.set_videos(video_results, part=kwargs.get('part'))
+
+    # returns results in the order of `video_ids`.
+    fetched = {video_result['id']: video_result for video_result in video_results}
+    fetched.update(cached)
+    return [fetched[video_id] for video_id in video_ids if video_id in fetched]
 
 # def youtube_channel_sections_list(channel_id):
 #     youtube = build(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION,
@@ -108,14 +195,28 @@ def youtube_videos_list(video_ids, **kwargs):
 #     ).execute()
 #     return channel_sections_list_response
 
-def youtube_playlistitems_list(max_pages=5, **kwargs):
+def cached_execute(method, list_method, priority=request_scheduler.PRIORITY_NORMAL, **kwargs):
+    """executes `list_method(**kwargs)` through the scheduler, returning the
+    cached response instead if there is one."""
+    if cache is not None:
+        response = cache.get(method, kwargs)
+        if response is not None:
+            METRICS.inc('cache_hits', method=method)
+            METRICS.inc('pages', method=method)
+            return response
+    response = scheduler.execute(method, list_method(**kwargs), priority=priority)
+    METRICS.inc('pages', method=method)
+    if cache is not None:
+        cache.set(method, kwargs, response)
+    return response
+
+def youtube_playlistitems_list(max_pages=5, priority=request_scheduler.PRIORITY_NORMAL, **kwargs):
     """calls YouTube data API playlistitems.list method."""
-    youtube = build(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION,
-        developerKey=DEVELOPER_KEY)
+    youtube = youtube_client.get_client(DEVELOPER_KEY)
 
     # Call the search.list method to retrieve results matching the specified
     # query term.
-    playlistitems_response = youtube.playlistItems().list(**kwargs).execute()
+    playlistitems_response = cached_execute('playlistItems.list', youtube.playlistItems().list, priority=priority, **kwargs)
     # print(playlistitems_response)
     # print(playlistitems_response.keys())
 
@@ -124,7 +225,7 @@ def youtube_playlistitems_list(max_pages=5, **kwargs):
     # video_ids = [search_result["id"]["videoId"] for search_result in playlistitems_response['items']]
     page = 1
     while 'nextPageToken' in playlistitems_response and len(playlistitems_response['nextPageToken']) and page < max_pages:
-        playlistitems_response = youtube.playlistItems().list(pageToken=playlistitems_response['nextPageToken'], **kwargs).execute()
+        playlistitems_response = cached_execute('playlistItems.list', youtube.playlistItems().list, priority=priority, pageToken=playlistitems_response['nextPageToken'], **kwargs)
         for search_result in playlistitems_response['items']:
             results.append(search_result)
         page += 1
@@ -136,42 +237,108 @@ def youtube_playlistitems_list(max_pages=5, **kwargs):
     return results
 
 def load_videos():
-    """loads existing videos from csv."""
-    path = os.path.join(settings.DATA_DIR, 'videos')
-    scraped_videos = []
-    for fname in os.listdir(path):
-        if fname.endswith('.csv') and not fname.startswith('.'):
-            print('loading existing videos from: {0}'.format(fname))
-            scraped_videos_batch = pd.read_csv(os.path.join(path, fname))
-            # print(scraped_videos_batch.head(2))
-            scraped_videos.append(scraped_videos_batch)
-    if len(scraped_videos):
-        scraped_videos = pd.concat(scraped_videos, axis=0)
-    else:
-        scraped_videos = pd.DataFrame()
+    """loads existing videos from the consolidated video store."""
+    scraped_videos = video_store.load_store()
+    print('loaded existing videos from {0} snapshots'.format(scraped_videos.source.nunique()))
     return scraped_videos
 
-def dedupe_video_ids(search_results, video_ids=[]):
-    """dedupes search_results based on list of existing video IDs."""
+def submit_searches(executor, queries, max_pages=5, priority=request_scheduler.PRIORITY_NORMAL, known_video_ids=None):
+    """submits a `youtube_search_list` call for each dict of kwargs in
+    `queries` to `executor`.
+
+    Returns a list of futures in the same order as `queries`.
+    """
+    return [executor.submit(youtube_search_list, max_pages=max_pages, priority=priority, known_video_ids=known_video_ids, **kwargs) for kwargs in queries]
+
+def update_high_water_marks(marks, keys, queries, futures):
+    """raises the high-water mark of each search key to the latest
+    `publishedAt` in the results of the corresponding future.
+
+    Marks are only raised for searches ordered by date that the journal
+    records as complete, i.e. that ran out of results, so that every video
+    published after the old mark was returned. A search that stopped at a
+    video that had already been scraped (e.g. found by a keyword search), at
+    `max_pages` or for lack of quota may have skipped videos older than the
+    ones it returned, and a search ordered by relevance may skip videos of
+    any date, so raising their marks would exclude those videos from every
+    later run.
+    """
+    for key, kwargs, future in zip(keys, queries, futures):
+        results = future.result()
+        if kwargs.get('order') != 'date' or journal is None or not journal.query_complete('search.list', kwargs):
+            continue
+        marks.update(key, [search_result['snippet']['publishedAt'] for search_result in results])
+
+def gather_results(futures):
+    """waits for `futures` and concatenates their results in submission order.
+
+    Results are combined in the order the requests were submitted, not the
+    order in which they complete, so deduplication downstream is
+    deterministic regardless of the number of workers.
+    """
+    results = []
+    for future in futures:
+        results.extend(future.result())
+    return results
+
+def fetch_video_details(video_ids, **kwargs):
+    """calls `youtube_videos_list` for a batch of video IDs and converts each
+    result to a row of the snapshot csv.
+
+    If a scrape run is being journaled, the rows are written to the run's
+    details csv as soon as they arrive.
+    """
+    rows = []
+    for video_result in youtube_videos_list(video_ids=video_ids, **kwargs):
+        rows.append([video_result['id'], video_result['snippet']['title'].encode('ascii', 'ignore').decode(), video_result['snippet']['publishedAt'], video_result['snippet']['channelTitle'].encode('ascii', 'ignore').decode(), video_result['contentDetails']['duration']])
+    if journal is not None and len(rows):
+        journal.write_details(rows)
+    return rows
+
+def dedupe_video_ids(search_results, video_ids=None):
+    """dedupes search_results based on set of existing video IDs.
+
+    `video_ids` is updated in place with the IDs of the retained results.
+    """
+    if video_ids is None:
+        video_ids = set()
     search_results_dedupe = []
     # removes any duplicate videos
     for search_result in search_results:
         # print(related_result['snippet']['title'])
         video_id = search_result["id"]["videoId"]
         if video_id not in video_ids:
-            video_ids.append(video_id)
+            video_ids.add(video_id)
             search_results_dedupe.append(search_result)
+    METRICS.inc('videos', len(search_results_dedupe), status='new')
+    METRICS.inc('videos', len(search_results) - len(search_results_dedupe), status='duplicate')
     print('Deduplication: removed {0} of {1} search results'.format(len(search_results) - len(search_results_dedupe), len(search_results)))
     return search_results_dedupe, video_ids
 
-if __name__ == "__main__":
-    one_week_ago = (datetime.datetime.now() - datetime.timedelta(days=7)).strftime(format="%Y-%m-%dT%H:%M:%SZ")
-    argparser.add_argument("--max-results", help="Max results", type=int, default=50)
-    argparser.add_argument("--published-after", help="Published after (e.g. '2017-04-01T00:00:00Z'. Default is one week ago", type=str, default=one_week_ago)
-    argparser.add_argument("--max-pages", help="Max pages", type=int, default=10)
-    argparser.add_argument("--region-code", help="Region code'", type=str, default="US")
-    argparser.add_argument("--relevance-language", help="Relevance language'", type=str, default="en")
-    args = argparser.parse_args()
+def main(args: argparse.Namespace) -> None:
+    """runs the search procedure and saves new videos to a snapshot csv.
+
+    Arguments:
+
+        args: argparse.Namespace. Command line arguments of
+            `python -m module scrape` (see `module.__main__`).
+    """
+    global scheduler, cache, journal
+    scheduler = request_scheduler.RequestScheduler(quota=args.quota, rate=args.rate)
+    # note: paths are read from the modules at call time rather than bound as
+    # default arguments, so that they can be redirected (e.g. to a temporary
+    # data directory by `benchmarks.bench_load`).
+    cache = None if args.no_cache else response_cache.ResponseCache(path=response_cache.CACHE_PATH)
+    journal = scrape_journal.ScrapeJournal.resume(runs_path=scrape_journal.RUNS_PATH) if args.resume else None
+    resumed = journal is not None
+    if resumed:
+        print('Resuming run {0}'.format(journal.run_id))
+        for k, v in journal.args.items():
+            setattr(args, k, v)
+    else:
+        if args.resume:
+            print('No interrupted run to resume. Starting a new run.')
+        journal = scrape_journal.ScrapeJournal.start(vars(args), runs_path=scrape_journal.RUNS_PATH)
     verbose = True
     # class args(object):
     #     max_results = 50
@@ -187,109 +354,161 @@ if __name__ == "__main__":
         'relevanceLanguage': args.relevance_language
     }
     
-    # loads existing videos.
-    scraped_videos = load_videos()
-    orig_video_ids = []
-    if scraped_videos.shape[0]:
-        orig_video_ids = scraped_videos.video_id.tolist()
-    video_ids = orig_video_ids[:]
+    # note: the snapshot is named after the run, so a resumed run that was
+    # interrupted while saving overwrites its own snapshot.
+    fname = "youtube_search_results_{0}.csv".format(journal.run_id)
+
+    # loads IDs of existing videos. The videos of a resumed run that was
+    # interrupted while saving may already be in the store, so they are left
+    # out, or they would no longer count as new.
+    with METRICS.timer('load_index'):
+        video_index = video_store.VideoIdIndex.load(path=video_store.VIDEO_IDS_PATH, store_path=video_store.STORE_PATH,
+                                                     snapshots_path=video_store.SNAPSHOTS_PATH, exclude_sources=[fname] if resumed else ())
+    video_ids = set(video_index)
     print('Loaded {0} existing videos'.format(len(video_ids)))
 
+    # loads the latest publishedAt seen by each channel search. Channel
+    # searches only ask for videos published after their mark.
+    marks = HighWaterMarks.load(path=high_water_marks.HIGH_WATER_MARKS_PATH)
+
     # loads channels to search.
     with open(os.path.join(settings.DATA_DIR, 'youtube_channels.json'), 'r') as f:
         channels = json.load(f)
 
     try:
-        print('Searching for videos published after {0}'.format(args.published_after))
-        # (1) Get and filter recent uploads from several channels that tend to post full speeches.
-        channel_ids = [ch['channelId'] for ch in channels if ch['mostly_speeches'] == True]
-        kwargs = {
-            "type": "video",
-            "part": "id,snippet",
-            "order": "date",
-        }
-        kwargs.update(base_kws)
-        channel_results = []
-        for channel_id in channel_ids:
-            print('Looking for videos on channel: {0}'.format(channel_id))
-            kwargs['channelId'] = channel_id
-            channel_results_batch = youtube_search_list(max_pages=args.max_pages, **kwargs)
-            kwargs['channelId'] = None
-            channel_results.extend(channel_results_batch)
-
-        channel_results_dedupe, video_ids = dedupe_video_ids(channel_results, video_ids)
-        print('Found {0} videos from channel searching.'.format(len(channel_results_dedupe)))
-
-        # (2) Get and filter related videos based on videos extracted in (1).
-        kwargs = {
-            'type': 'video',
-            'part': 'id,snippet',
-        }
-        kwargs.update(base_kws)
-        related_results = []
-        for channel_result in channel_results_dedupe:
-            print('Searching videos related to: "{0}"'.format(channel_result['snippet']['title'].encode('ascii', 'ignore').decode()))
-            kwargs['relatedToVideoId'] = channel_result['id']['videoId']
-            related_results_batch = youtube_search_list(max_pages=args.max_pages, **kwargs)
-            kwargs['relatedToVideoId'] = None
-            related_results.extend(related_results_batch)
-
-        related_results_dedupe, video_ids = dedupe_video_ids(related_results, video_ids)
-        print('Found {0} videos from related videos searching.'.format(len(related_results_dedupe)))
-        
-        # (3) Keyword search for other videos not found via (1) or (2).
-        with open(os.path.join(settings.DATA_DIR, 'search_terms.json'), 'r') as f:
-            search_terms = json.load(f)
-        keywords = [' '.join([x,y]) for x in search_terms['entity_terms_primary'] for y in search_terms['campaign_terms_primary']]
-        kwargs = {
-            "type": "video",
-            "part": "id,snippet",
-            # "q": args.q,
-        }
-        kwargs.update(base_kws)
-        search_results = []
-        for kw in keywords:
-            print('Searching keyword: {0}'.format(kw))
-            kwargs['q'] = kw
-            search_results_batch = youtube_search_list(max_pages=args.max_pages, **kwargs)
-            kwargs['q'] = None
-            search_results.extend(search_results_batch)
-
-        search_results_dedupe, video_ids = dedupe_video_ids(search_results, video_ids)
-        print('Found {0} videos from keyword searching.'.format(len(search_results_dedupe)))
-
-        # concatenates all search results and requests content details for
-        # each video.
-        video_results = search_results_dedupe + related_results_dedupe + channel_results_dedupe
-        new_video_ids = list(set([vr['id']['videoId'] for vr in video_results]))
-        assert all([video_id not in orig_video_ids for video_id in new_video_ids])
-        # if len(new_video_ids) == 0:
-        #     print('No new videos found. Nothing saved to disk.')
-        # else:
-        kwargs = {
-            'part': 'id,snippet,contentDetails'
-        }
-        video_results_detail = []
-        for i in range(0, len(new_video_ids), 50):
-            # print(i)
-            video_results_detail_batch = youtube_videos_list(video_ids=new_video_ids[i:i+50], **kwargs)
-            video_results_detail.extend(video_results_detail_batch)
-        assert len(new_video_ids) == len(video_results_detail)
-
-        # combines the results into a dataframe.
-        results = []
-        for video_result in video_results_detail:
-            results.append([video_result['id'], video_result['snippet']['title'].encode('ascii', 'ignore').decode(), video_result['snippet']['publishedAt'], video_result['snippet']['channelTitle'].encode('ascii', 'ignore').decode(), video_result['contentDetails']['duration']])
-        results = pd.DataFrame(results, columns=['video_id', 'title', 'published_at', 'channel_title', 'duration'])
-        results.sort_values('published_at', ascending=False, inplace=True)
-        # results = sorted(results, key=lambda x: x[2], reverse=True)
-        assert results.shape[0] == len(new_video_ids)
-
-        # saves video results to file.
-        dt = datetime.datetime.strftime(datetime.datetime.now(), format="%Y-%m-%dT%H-%M-%SZ")
-        fname = "youtube_search_results_{0}.csv".format(dt)
-        pd.DataFrame.to_csv(results, os.path.join(settings.DATA_DIR, 'videos', fname), header=True, index=False, quoting=csv.QUOTE_ALL)
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            print('Searching for videos published after {0}'.format(args.published_after))
+            # (1) Get and filter recent uploads from several channels that tend to post full speeches.
+            channel_ids = [ch['channelId'] for ch in channels if ch['mostly_speeches'] == True]
+            kwargs = {
+                "type": "video",
+                "part": "id,snippet",
+                "order": "date",
+            }
+            kwargs.update(base_kws)
+            channel_queries = []
+            channel_keys = []
+            for channel_id in channel_ids:
+                print('Looking for videos on channel: {0}'.format(channel_id))
+                key = 'channelId:{0}'.format(channel_id)
+                channel_keys.append(key)
+                channel_queries.append(dict(kwargs, channelId=channel_id, publishedAfter=args.published_after if args.full_window else marks.published_after(key, args.published_after)))
+            channel_futures = submit_searches(executor, channel_queries, max_pages=args.max_pages, known_video_ids=video_index)
+
+            # (3) Keyword search for other videos not found via (1) or (2).
+            # Keyword searches do not depend on (1) or (2), so they are
+            # submitted right away and only gathered and deduplicated after (2).
+            with open(os.path.join(settings.DATA_DIR, 'search_terms.json'), 'r') as f:
+                search_terms = json.load(f)
+            keywords = [' '.join([x,y]) for x in search_terms['entity_terms_primary'] for y in search_terms['campaign_terms_primary']]
+            kwargs = {
+                "type": "video",
+                "part": "id,snippet",
+                # "q": args.q,
+            }
+            kwargs.update(base_kws)
+            # note: keyword searches are ordered by relevance, so they have no
+            # high-water marks (see `update_high_water_marks`) and always
+            # search the full window.
+            keyword_queries = []
+            for kw in keywords:
+                print('Searching keyword: {0}'.format(kw))
+                keyword_queries.append(dict(kwargs, q=kw))
+            keyword_futures = submit_searches(executor, keyword_queries, max_pages=args.max_pages, priority=request_scheduler.PRIORITY_LOW, known_video_ids=video_index)
+
+            with METRICS.timer('channel_search'):
+                channel_results = gather_results(channel_futures)
+            update_high_water_marks(marks, channel_keys, channel_queries, channel_futures)
+            channel_results_dedupe, video_ids = dedupe_video_ids(channel_results, video_ids)
+            print('Found {0} videos from channel searching.'.format(len(channel_results_dedupe)))
+
+            # (2) Get and filter related videos based on videos extracted in (1).
+            kwargs = {
+                'type': 'video',
+                'part': 'id,snippet',
+            }
+            kwargs.update(base_kws)
+            related_queries = []
+            for channel_result in channel_results_dedupe:
+                print('Searching videos related to: "{0}"'.format(channel_result['snippet']['title'].encode('ascii', 'ignore').decode()))
+                related_queries.append(dict(kwargs, relatedToVideoId=channel_result['id']['videoId']))
+            related_futures = submit_searches(executor, related_queries, max_pages=args.max_pages, priority=request_scheduler.PRIORITY_LOW)
+
+            with METRICS.timer('related_search'):
+                related_results = gather_results(related_futures)
+            related_results_dedupe, video_ids = dedupe_video_ids(related_results, video_ids)
+            print('Found {0} videos from related videos searching.'.format(len(related_results_dedupe)))
+
+            # note: keyword searches run alongside (1) and (2), so this only
+            # times the wait for those still running.
+            with METRICS.timer('keyword_search'):
+                search_results = gather_results(keyword_futures)
+            search_results_dedupe, video_ids = dedupe_video_ids(search_results, video_ids)
+            print('Found {0} videos from keyword searching.'.format(len(search_results_dedupe)))
+
+            # concatenates all search results and requests content details for
+            # each video.
+            video_results = search_results_dedupe + related_results_dedupe + channel_results_dedupe
+            new_video_ids = [vr['id']['videoId'] for vr in video_results]
+            assert video_index.ids.isdisjoint(new_video_ids)
+            # if len(new_video_ids) == 0:
+            #     print('No new videos found. Nothing saved to disk.')
+            # else:
+            kwargs = {
+                'part': 'id,snippet,contentDetails'
+            }
+            # video details are streamed to the run's details csv as each batch
+            # arrives. Details written before an interruption are not requested again.
+            missing_video_ids = [video_id for video_id in new_video_ids if video_id not in journal.detail_video_ids]
+            detail_futures = [executor.submit(fetch_video_details, video_ids=missing_video_ids[i:i+50], **kwargs) for i in range(0, len(missing_video_ids), 50)]
+            failed_batches = 0
+            with METRICS.timer('video_details'):
+                for future in detail_futures:
+                    try:
+                        future.result()
+                    except request_scheduler.QuotaExceededError:
+                        failed_batches += 1
+            METRICS.set('detail_batches_failed', failed_batches)
+
+        if failed_batches > 0:
+            # note: nothing is saved, so the run can be finished with --resume,
+            # which only requests the missing details.
+            print('Details of {0} of {1} batches were not fetched for lack of quota. Run again '
+                  'with --resume once the quota resets to finish run {2}.'.format(failed_batches, len(detail_futures), journal.run_id))
+            print(scheduler.summary())
+            return
+
+        with METRICS.timer('save'):
+            # combines the results into a dataframe.
+            results = journal.read_details()
+            results.sort_values('published_at', ascending=False, inplace=True)
+            # results = sorted(results, key=lambda x: x[2], reverse=True)
+            # note: the API returns no details for videos that were deleted or
+            # made private since they were found.
+            results = results[results.video_id.isin(new_video_ids).values]
+            if results.shape[0] < len(new_video_ids):
+                print('No details were returned for {0} videos. They are not saved.'.format(len(new_video_ids) - results.shape[0]))
+
+            # saves video results to file.
+            pd.DataFrame.to_csv(results, os.path.join(video_store.SNAPSHOTS_PATH, fname), header=True, index=False, quoting=csv.QUOTE_ALL)
+            video_store.append_snapshot(results, source=fname, store_path=video_store.STORE_PATH)
+            journal.finish(fname)
+            video_index.update(new_video_ids)
+            video_index.save()
+            marks.save()
+        METRICS.set('videos_saved', results.shape[0])
         print('Saved {0} new videos to {1}'.format(results.shape[0], fname))
+        print(youtube_client.STATS.summary())
+        print(scheduler.summary())
+        if cache is not None:
+            print(cache.summary())
     except HttpError as e:
         print("An HTTP error %d occurred:\n%s" % (e.resp.status, e.content))
+    except request_scheduler.QuotaExceededError as e:
+        print('Out of quota ({0}). Run again with --resume once the quota resets to finish run {1}.'.format(e, journal.run_id))
+
+if __name__ == "__main__":
+    import sys
+    from module.__main__ import main as cli
+    sys.exit(cli(['scrape'] + sys.argv[1:]))
 
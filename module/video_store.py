@@ -0,0 +1,344 @@
+"""consolidated columnar store of all scraped videos.
+
+Each scrape run saves a `youtube_search_results_*.csv` snapshot to
+`data/videos`. Rather than re-parsing every snapshot on each load, the
+snapshots are consolidated into a Parquet dataset with a typed
+`published_at` column and pre-parsed `duration_seconds`. The dataset is a
+directory holding one part file per snapshot, named
+"part-<sequence>-<snapshot file name>.parquet", so that appending a snapshot
+only writes that snapshot (see `append_snapshot`) and a full load is a single
+`read_parquet` of the directory regardless of how many scrape runs exist. Any
+snapshot that is not yet in the store is ingested the next time the store is
+loaded (see `load_store`).
+
+Usage::
+
+    python -m module.video_store [--rebuild]
+"""
+
+import os
+import shutil
+import argparse
+import pandas as pd
+
+from module import settings
+from module.utils import listfiles, duration_str_to_num
+
+# path to the directory containing the csv snapshot from each scrape run.
+SNAPSHOTS_PATH = os.path.join(settings.DATA_DIR, 'videos')
+
+# path to the consolidated store (a directory of Parquet part files).
+STORE_PATH = os.path.join(settings.DATA_DIR, 'generated', 'videos.parquet')
+
+# path to the latest row of each video, keyed by unique video ID (see `load_unique`).
+UNIQUE_STORE_PATH = os.path.join(settings.DATA_DIR, 'generated', 'videos_unique.parquet')
+
+# path to the index of scraped video IDs (see `VideoIdIndex`).
+VIDEO_IDS_PATH = os.path.join(settings.DATA_DIR, 'generated', 'video_ids.txt')
+
+# columns in each csv snapshot.
+SNAPSHOT_COLUMNS = ['video_id', 'title', 'published_at', 'channel_title', 'duration']
+
+# columns in the consolidated store. `source` is the snapshot file name each
+# row was ingested from.
+STORE_COLUMNS = SNAPSHOT_COLUMNS + ['duration_seconds', 'source']
+
+# prefix and suffix of the part file names in the store directory. Files
+# whose names start with "." (e.g. partly written parts) are ignored when the
+# directory is read.
+PART_PREFIX = 'part-'
+PART_SUFFIX = '.parquet'
+
+
+def list_snapshots(path: str = SNAPSHOTS_PATH) -> list:
+    """returns sorted list of csv snapshot file names in `path`."""
+    return sorted(fname for fname in listfiles(path) if fname.endswith('.csv'))
+
+
+def read_snapshot(path: str) -> pd.DataFrame:
+    """reads a single csv snapshot and returns it with store columns/types."""
+    videos = pd.read_csv(path)
+    return type_snapshot(videos, source=os.path.basename(path))
+
+
+def type_snapshot(videos: pd.DataFrame, source: str) -> pd.DataFrame:
+    """converts a snapshot DataFrame to the store's columns and types.
+
+    `published_at` is parsed to a (tz-naive, UTC) datetime and the ISO-8601
+    `duration` is parsed to `duration_seconds`.
+    """
+    videos = videos[SNAPSHOT_COLUMNS].copy()
+    videos['published_at'] = pd.to_datetime(videos.published_at, utc=True).dt.tz_convert(None)
+    videos['duration_seconds'] = duration_str_to_num(videos.duration.values)
+    videos['source'] = source
+    return videos
+
+
+def load_store(store_path: str = STORE_PATH,
+               snapshots_path: str = SNAPSHOTS_PATH,
+               sync: bool = True) -> pd.DataFrame:
+    """loads the consolidated video store.
+
+    Arguments:
+
+        store_path: str. Path to the store directory.
+
+        snapshots_path: str. Path to the directory of csv snapshots.
+
+        sync: bool. If True, ingests any snapshot in `snapshots_path` that is
+            not yet in the store and saves it to the store as a new part.
+
+    Returns:
+
+        videos: pd.DataFrame. One row per scraped video, with columns
+            `STORE_COLUMNS`, in the order the snapshots were ingested.
+    """
+    parts = _list_parts(store_path)
+    if len(parts):
+        videos = pd.read_parquet(store_path)[STORE_COLUMNS]
+    else:
+        videos = _empty_store()
+    if sync:
+        ingested = {_part_source(fname) for fname in parts}
+        new_snapshots = [fname for fname in list_snapshots(snapshots_path) if fname not in ingested]
+        if len(new_snapshots):
+            new_videos = [read_snapshot(os.path.join(snapshots_path, fname)) for fname in new_snapshots]
+            for fname, snapshot in zip(new_snapshots, new_videos):
+                _write_part(snapshot, store_path, fname)
+            videos = _concat([videos] + new_videos)
+    return videos
+
+
+def load_unique(path: str = UNIQUE_STORE_PATH,
+                store_path: str = STORE_PATH,
+                snapshots_path: str = SNAPSHOTS_PATH) -> pd.DataFrame:
+    """loads the latest row of each scraped video, indexed by video ID.
+
+    A video scraped in several runs has one row per run in the store. This
+    returns only the row from the latest run, with a unique `video_id` index,
+    so that looking up videos by ID is a hash lookup rather than a scan (see
+    `lookup_videos`). The deduplicated table is saved to `path` and rebuilt
+    only when the store or snapshot directory is newer than it.
+    """
+    sources_mtime = max([os.path.getmtime(p) for p in [store_path, snapshots_path] if os.path.exists(p)] + [0])
+    if os.path.isfile(path) and os.path.getmtime(path) >= sources_mtime:
+        return pd.read_parquet(path).set_index('video_id')
+    videos = load_store(store_path=store_path, snapshots_path=snapshots_path)
+    videos = videos.drop_duplicates('video_id', keep='last')
+    _write_store(videos, path)
+    return videos.set_index('video_id')
+
+
+def lookup_videos(video_ids, **kwargs) -> pd.DataFrame:
+    """returns the latest row of each video in `video_ids`, in the same order.
+
+    Videos that have not been scraped are dropped.
+
+    Arguments:
+
+        video_ids: array-like. Video IDs to look up.
+
+        **kwargs: passed to `load_unique`.
+
+    Returns:
+
+        videos: pd.DataFrame. Videos indexed by video ID.
+    """
+    videos = load_unique(**kwargs)
+    rows = videos.index.get_indexer(pd.Index(video_ids))
+    return videos.iloc[rows[rows >= 0]]
+
+
+def append_snapshot(videos: pd.DataFrame, source: str, store_path: str = STORE_PATH) -> str:
+    """appends a newly scraped snapshot to the store as a new part file.
+
+    Only the snapshot itself is written, so the cost of an append does not
+    grow with the size of the store. Does nothing if a snapshot with the same
+    `source` file name has already been ingested.
+
+    Arguments:
+
+        videos: pd.DataFrame. Snapshot with columns `SNAPSHOT_COLUMNS`.
+
+        source: str. File name of the csv snapshot (e.g.
+            "youtube_search_results_2017-06-25T13-11-38Z.csv").
+
+        store_path: str. Path to the store directory.
+
+    Returns:
+
+        part_path: str. Path to the new part file, or None if the snapshot
+            was already in the store.
+    """
+    if source in {_part_source(fname) for fname in _list_parts(store_path)}:
+        return None
+    return _write_part(type_snapshot(videos, source=source), store_path, source)
+
+
+def iter_snapshot_chunks(chunk_size: int = 10000,
+                         snapshots_path: str = SNAPSHOTS_PATH,
+                         fnames: list = None):
+    """streams videos from the csv snapshots in chunks of at most
+    `chunk_size` rows, so that memory use does not grow with the corpus.
+
+    Arguments:
+
+        chunk_size: int. Maximum number of rows per chunk.
+
+        snapshots_path: str. Path to the directory of csv snapshots.
+
+        fnames: List[str]. Snapshots to read. Defaults to all snapshots. Pass
+            disjoint subsets to split the corpus across processes.
+
+    Yields:
+
+        videos: pd.DataFrame. Chunk of videos with columns `STORE_COLUMNS`.
+    """
+    if fnames is None:
+        fnames = list_snapshots(snapshots_path)
+    for fname in fnames:
+        for chunk in pd.read_csv(os.path.join(snapshots_path, fname), chunksize=chunk_size):
+            yield type_snapshot(chunk, source=fname)
+
+
+class VideoIdIndex(object):
+    """set of all scraped video IDs, backed by a sorted ID file on disk.
+
+    The index is loaded once per scrape run and queried in constant time. If
+    the ID file is missing or older than the store or snapshot directory, it
+    is rebuilt from the store.
+
+    Example::
+
+        >>> index = VideoIdIndex.load()
+        >>> 'kGil6cCKsII' in index
+        True
+        >>> index.update(['newVideoId1'])
+        >>> index.save()
+
+    Arguments:
+
+        ids: Iterable[str]. Video IDs in the index.
+
+        path: str. Path to the ID file (one ID per line).
+    """
+
+    def __init__(self, ids=(), path: str = VIDEO_IDS_PATH):
+        self.ids = set(ids)
+        self.path = path
+
+    def __contains__(self, video_id) -> bool:
+        return video_id in self.ids
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, path: str = VIDEO_IDS_PATH,
+             store_path: str = STORE_PATH,
+             snapshots_path: str = SNAPSHOTS_PATH,
+             exclude_sources=()) -> 'VideoIdIndex':
+        """loads the index from disk, rebuilding it from the store if stale.
+
+        Arguments:
+
+            exclude_sources: Iterable[str]. Snapshot file names whose videos
+                are left out of a rebuilt index, e.g. the snapshot of a scrape
+                run that was interrupted while saving and is being resumed. An
+                index rebuilt without them is not saved.
+        """
+        sources_mtime = max([os.path.getmtime(p) for p in [store_path, snapshots_path] if os.path.exists(p)] + [0])
+        if os.path.isfile(path) and os.path.getmtime(path) >= sources_mtime:
+            with open(path, 'r') as f:
+                return cls((line.strip() for line in f if line.strip()), path=path)
+        videos = load_store(store_path=store_path, snapshots_path=snapshots_path)
+        exclude_sources = list(exclude_sources)
+        if len(exclude_sources):
+            videos = videos[~videos.source.isin(exclude_sources).values]
+        index = cls(videos.video_id.values, path=path)
+        if len(exclude_sources) == 0:
+            index.save()
+        return index
+
+    def update(self, video_ids) -> None:
+        """adds video IDs to the index."""
+        self.ids.update(video_ids)
+
+    def save(self) -> None:
+        """atomically writes the index to disk as a sorted ID file."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for video_id in sorted(self.ids):
+                f.write(video_id + '\n')
+        os.replace(tmp_path, self.path)
+
+
+def _concat(frames: list) -> pd.DataFrame:
+    frames = [frame for frame in frames if frame.shape[0] > 0]
+    if len(frames) == 0:
+        return _empty_store()
+    return pd.concat(frames, axis=0, ignore_index=True)[STORE_COLUMNS]
+
+
+def _empty_store() -> pd.DataFrame:
+    videos = pd.DataFrame({col: pd.Series([], dtype=object) for col in STORE_COLUMNS})
+    videos['published_at'] = pd.Series([], dtype='datetime64[ns]')
+    videos['duration_seconds'] = pd.Series([], dtype=float)
+    return videos[STORE_COLUMNS]
+
+
+def _write_store(videos: pd.DataFrame, store_path: str) -> None:
+    """writes the store to a temporary file first so that an interrupted write
+    never leaves a corrupt store behind."""
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    tmp_path = store_path + '.tmp'
+    videos.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, store_path)
+
+
+def _list_parts(store_path: str) -> list:
+    """returns sorted list of part file names in the store directory."""
+    if not os.path.isdir(store_path):
+        return []
+    return sorted(fname for fname in os.listdir(store_path)
+                  if fname.startswith(PART_PREFIX) and fname.endswith(PART_SUFFIX))
+
+
+def _part_source(fname: str) -> str:
+    """returns the snapshot file name of a part (e.g. "part-000003-x.csv.parquet" -> "x.csv")."""
+    return fname[len(PART_PREFIX):-len(PART_SUFFIX)].split('-', 1)[1]
+
+
+def _write_part(videos: pd.DataFrame, store_path: str, source: str) -> str:
+    """writes a typed snapshot to a new part file in the store directory.
+
+    The part is written to a hidden temporary file first, which readers of
+    the directory ignore, so that an interrupted write never leaves a corrupt
+    part behind. Parts share an explicit schema so that a snapshot whose
+    column is entirely missing (e.g. no durations) can still be read
+    together with the others.
+    """
+    import pyarrow as pa
+    os.makedirs(store_path, exist_ok=True)
+    types = {'published_at': pa.timestamp('ns'), 'duration_seconds': pa.float64()}
+    schema = pa.schema([(col, types.get(col, pa.string())) for col in STORE_COLUMNS])
+    fname = '{0}{1:06d}-{2}{3}'.format(PART_PREFIX, len(_list_parts(store_path)), source, PART_SUFFIX)
+    tmp_path = os.path.join(store_path, '.' + fname + '.tmp')
+    part_path = os.path.join(store_path, fname)
+    videos[STORE_COLUMNS].to_parquet(tmp_path, index=False, schema=schema)
+    os.replace(tmp_path, part_path)
+    return part_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the store from scratch from all csv snapshots.')
+    args = parser.parse_args()
+    if args.rebuild and os.path.isdir(STORE_PATH):
+        shutil.rmtree(STORE_PATH)
+    videos = load_store()
+    print('{0} videos from {1} snapshots in {2}'.format(videos.shape[0], videos.source.nunique(), STORE_PATH))
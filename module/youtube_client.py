@@ -0,0 +1,159 @@
+"""shared YouTube Data API client and HTTP connections.
+
+Building a client with `apiclient.discovery.build` fetches and parses the
+API's discovery document and opens a new HTTP connection, which is slow when
+done for every request. This module caches the discovery document on disk and
+builds one client per thread (httplib2 connections are not thread safe),
+which is then reused so that each thread keeps a persistent keep-alive
+connection to the API.
+
+`STATS` records how much time is spent building clients versus executing
+requests.
+
+Example::
+
+    >>> youtube = get_client(DEVELOPER_KEY)
+    >>> response = execute(youtube.search().list(part='id', q='raila'))
+    >>> print(STATS.summary())
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+from module import settings
+
+# note: httplib2 and the discovery client are imported when the first client
+# is built, since importing them takes longer than most CLI commands.
+
+YOUTUBE_API_SERVICE_NAME = "youtube"
+YOUTUBE_API_VERSION = "v3"
+
+# URL of the API discovery document. Set the YOUTUBE_DISCOVERY_URL environment
+# variable to use a different API server (e.g. a local fake API server).
+DISCOVERY_URL = os.environ.get(
+    'YOUTUBE_DISCOVERY_URL',
+    'https://www.googleapis.com/discovery/v1/apis/{0}/{1}/rest'.format(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION)
+)
+
+# directory where discovery documents are cached.
+DISCOVERY_CACHE_DIR = os.path.join(settings.DATA_DIR, 'generated')
+
+# seconds before an HTTP request times out.
+TIMEOUT = 60
+
+_local = threading.local()
+_discovery_lock = threading.Lock()
+
+
+class ClientStats(object):
+    """thread-safe counts and timings of client construction and requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.discovery_fetches = 0
+            self.discovery_seconds = 0.0
+            self.builds = 0
+            self.build_seconds = 0.0
+            self.requests = 0
+            self.request_seconds = 0.0
+
+    def record(self, kind: str, seconds: float) -> None:
+        """records one event of `kind` ('discovery', 'build' or 'request')."""
+        with self._lock:
+            if kind == 'discovery':
+                self.discovery_fetches += 1
+                self.discovery_seconds += seconds
+            elif kind == 'build':
+                self.builds += 1
+                self.build_seconds += seconds
+            elif kind == 'request':
+                self.requests += 1
+                self.request_seconds += seconds
+            else:
+                raise ValueError('unknown event kind: {0}'.format(kind))
+
+    def summary(self) -> str:
+        return (
+            'discovery: {0} fetches in {1:.2f}s; client construction: {2} clients in {3:.2f}s; '
+            'requests: {4} in {5:.2f}s'
+        ).format(self.discovery_fetches, self.discovery_seconds, self.builds,
+                 self.build_seconds, self.requests, self.request_seconds)
+
+
+STATS = ClientStats()
+
+
+def get_client(developer_key: str):
+    """returns this thread's YouTube API client, building it on first use.
+
+    Arguments:
+
+        developer_key: str. YouTube Data API key.
+
+    Returns:
+
+        youtube: apiclient.discovery.Resource.
+    """
+    youtube = getattr(_local, 'youtube', None)
+    if youtube is None or _local.developer_key != developer_key:
+        import httplib2
+        from googleapiclient.discovery import build_from_document
+        discovery = get_discovery_document()
+        start = time.time()
+        http = httplib2.Http(timeout=TIMEOUT)
+        youtube = build_from_document(discovery, developerKey=developer_key, http=http)
+        STATS.record('build', time.time() - start)
+        _local.youtube = youtube
+        _local.developer_key = developer_key
+    return youtube
+
+
+def execute(request):
+    """executes an API request, recording its duration in `STATS`."""
+    start = time.time()
+    try:
+        return request.execute()
+    finally:
+        STATS.record('request', time.time() - start)
+
+
+def get_discovery_document(url: str = None, cache_dir: str = None) -> str:
+    """returns the API discovery document, fetching it only if it is not
+    already cached on disk.
+
+    The cache file name includes a hash of `url`, so documents from different
+    API servers are cached separately.
+
+    `url` and `cache_dir` default to `DISCOVERY_URL` and `DISCOVERY_CACHE_DIR`,
+    which are read on each call so that they can be changed at runtime (e.g.
+    by `benchmarks.bench_load`).
+    """
+    url = url if url is not None else DISCOVERY_URL
+    cache_dir = cache_dir if cache_dir is not None else DISCOVERY_CACHE_DIR
+    fname = 'youtube_discovery_{0}_{1}.json'.format(YOUTUBE_API_VERSION, hashlib.sha1(url.encode()).hexdigest()[:8])
+    path = os.path.join(cache_dir, fname)
+    with _discovery_lock:
+        if os.path.isfile(path):
+            with open(path, 'r') as f:
+                return f.read()
+        import httplib2
+        start = time.time()
+        resp, content = httplib2.Http(timeout=TIMEOUT).request(url)
+        STATS.record('discovery', time.time() - start)
+        if resp.status >= 400:
+            raise IOError('failed to fetch discovery document from {0} (HTTP {1})'.format(url, resp.status))
+        discovery = content.decode('utf-8')
+        json.loads(discovery)  # fails early on a malformed document.
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(discovery)
+        os.replace(tmp_path, path)
+        return discovery
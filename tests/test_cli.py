@@ -0,0 +1,56 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from module import settings
+from module.__main__ import COMMANDS
+from module.utils import parse_unknown_args
+
+# modules that no command may import just to parse its arguments.
+HEAVY_MODULES = ['pandas', 'numpy', 'sklearn', 'tpot', 'isodate', 'httplib2', 'googleapiclient']
+
+# prints the top-level packages of HEAVY_MODULES imported while running the CLI with argv.
+SCRIPT = '''
+import sys, json
+from module.__main__ import main
+try:
+    main({0!r})
+except SystemExit:
+    pass
+print(json.dumps(sorted({{m.split('.')[0] for m in sys.modules}} & set({1!r}))))
+'''
+
+
+def imported_heavy_modules(argv):
+    output = subprocess.check_output([sys.executable, '-c', SCRIPT.format(argv, HEAVY_MODULES)],
+                                     cwd=settings.PROJECT_DIR, stderr=subprocess.DEVNULL)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+class CliTests(unittest.TestCase):
+
+    def test_help_imports_no_heavy_modules(self):
+        self.assertEqual(imported_heavy_modules(['--help']), [])
+        for command in COMMANDS:
+            self.assertEqual(imported_heavy_modules([command, '--help']), [], command)
+
+    def test_download_status_is_light(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            argv = ['download', '--status', '--queue_path', os.path.join(tmpdir, 'downloads.sqlite')]
+            # note: only the API client's light `errors` module (via request_scheduler).
+            self.assertEqual(set(imported_heavy_modules(argv)) - {'googleapiclient'}, set())
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_parse_unknown_args_negative_numbers(self):
+        args = parse_unknown_args(['--n_jobs', '-1', '--verbosity', '3', '--warm_start'])
+        self.assertEqual(vars(args), {'n_jobs': -1, 'verbosity': 3, 'warm_start': True})
+
+
+if __name__ == '__main__':
+    unittest.main()
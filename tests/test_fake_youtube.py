@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import httplib2
+from googleapiclient.discovery import build_from_document
+
+from module import youtube_client, video_scraper
+from module.request_scheduler import RequestScheduler, QuotaExceededError
+from benchmarks import bench_load
+from benchmarks.fake_youtube import FakeYouTube
+
+
+class FakeYouTubeTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fake = FakeYouTube.from_corpus(5000, seed=0)
+        discovery = httplib2.Http().request(cls.fake.start())[1]
+        cls.youtube = build_from_document(discovery, developerKey='fake-key', http=httplib2.Http())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fake.stop()
+
+    def setUp(self):
+        self.fake.fault_rate, self.fake.quota = 0.0, None
+        self.fake.reset_stats()
+
+    def test_search_paginates_by_date(self):
+        channel_id = self.fake.channels()[0]
+        kwargs = dict(part='id,snippet', channelId=channel_id, order='date', maxResults=50)
+        first = self.youtube.search().list(**kwargs).execute()
+        second = self.youtube.search().list(pageToken=first['nextPageToken'], **kwargs).execute()
+        items = first['items'] + second['items']
+        published = [item['snippet']['publishedAt'] for item in items]
+        self.assertEqual(len(items), 100)
+        self.assertEqual(published, sorted(published, reverse=True))
+        self.assertEqual(len({item['id']['videoId'] for item in items}), 100)
+        self.assertTrue(all(item['snippet']['channelId'] == channel_id for item in items))
+
+    def test_related_and_details(self):
+        video_id = self.fake.video_ids[0]
+        related = self.youtube.search().list(part='id', relatedToVideoId=video_id, maxResults=50).execute()['items']
+        again = self.youtube.search().list(part='id', relatedToVideoId=video_id, maxResults=50).execute()['items']
+        self.assertEqual(related, again)
+        video_ids = [item['id']['videoId'] for item in related[:3]]
+        videos = self.youtube.videos().list(part='id,snippet,contentDetails', id=','.join(video_ids)).execute()['items']
+        self.assertEqual([video['id'] for video in videos], video_ids)
+        self.assertIn('duration', videos[0]['contentDetails'])
+
+    def test_faults_are_retried_and_quota_is_enforced(self):
+        scheduler = RequestScheduler(quota=10000, rate=1000.0, burst=100, backoff_base=0.0, max_retries=20)
+        self.fake.fault_rate = 0.5
+        for _ in range(5):
+            scheduler.execute('videos.list', self.youtube.videos().list(part='id', id=self.fake.video_ids[0]))
+        self.assertGreater(scheduler.retries, 0)
+        self.fake.fault_rate, self.fake.quota = 0.0, self.fake.quota_used + 100
+        scheduler.execute('search.list', self.youtube.search().list(part='id', q='raila'))
+        with self.assertRaises(QuotaExceededError):
+            scheduler.execute('search.list', self.youtube.search().list(part='id', q='raila'))
+
+
+class LoadTestTests(unittest.TestCase):
+
+    def setUp(self):
+        self.discovery_url = youtube_client.DISCOVERY_URL
+        self.scheduler = video_scraper.scheduler
+
+    def test_load_test(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            results = bench_load.main(rows=3000, latency=0.0, channels=2, max_pages=2, outpath=os.path.join(tmpdir, 'results.json'))
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertGreater(results['videos'], 0)
+        self.assertTrue(results['finished'])
+        self.assertEqual(results['quota_used'], 100 * results['calls']['search.list'] + results['calls']['videos.list'])
+        # the scraper's globals and the API client are restored.
+        self.assertIs(video_scraper.scheduler, self.scheduler)
+        self.assertIsNone(video_scraper.journal)
+        self.assertEqual(youtube_client.DISCOVERY_URL, self.discovery_url)
+
+    def test_load_test_out_of_quota(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            # note: the API runs out of quota during the searches, so the run
+            # cannot fetch video details and is left to be resumed.
+            results = bench_load.main(rows=3000, latency=0.0, channels=2, max_pages=2, server_quota=500,
+                                     outpath=os.path.join(tmpdir, 'results.json'))
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertFalse(results['finished'])
+        self.assertGreater(results['refused'], 0)
+        # note: only requests already sent when the API first refused one
+        # can be refused by the API too. Later requests are refused locally.
+        self.assertLessEqual(results['server_statuses']['403'], 8)
+
+    def test_output_does_not_depend_on_workers(self):
+        dedupe_video_ids = video_scraper.dedupe_video_ids
+        video_ids = {}
+        for workers in [1, 8]:
+            kept = []
+
+            def dedupe(search_results, *args):
+                search_results, ids = dedupe_video_ids(search_results, *args)
+                kept.extend(search_result['id']['videoId'] for search_result in search_results)
+                return search_results, ids
+
+            tmpdir = tempfile.mkdtemp()
+            try:
+                # note: jitter makes concurrent requests complete out of order.
+                with mock.patch.object(video_scraper, 'dedupe_video_ids', side_effect=dedupe):
+                    results = bench_load.main(rows=3000, latency=0.0, jitter=0.01, workers=workers, channels=3,
+                                              max_pages=2, outpath=os.path.join(tmpdir, 'results.json'))
+            finally:
+                shutil.rmtree(tmpdir)
+            self.assertTrue(results['finished'])
+            video_ids[workers] = kept
+        self.assertGreater(len(video_ids[1]), 0)
+        self.assertEqual(video_ids[8], video_ids[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
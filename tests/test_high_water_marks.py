@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from concurrent.futures import Future
+
+from module import video_scraper
+from module.scrape_journal import ScrapeJournal
+from module.high_water_marks import HighWaterMarks
+
+
+def search_result(video_id, published_at):
+    return {'id': {'videoId': video_id}, 'snippet': {'publishedAt': published_at}}
+
+
+def page(items, next_page_token=None):
+    response = {'items': items}
+    if next_page_token is not None:
+        response['nextPageToken'] = next_page_token
+    return response
+
+
+class HighWaterMarksTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'generated', 'high_water_marks.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_update_and_published_after(self):
+        marks = HighWaterMarks.load(path=self.path)
+        self.assertEqual(marks.published_after('channelId:UC1', '2017-06-01T00:00:00Z'), '2017-06-01T00:00:00Z')
+        marks.update('channelId:UC1', ['2017-06-25T19:40:26.000Z', None, '2017-06-20T10:00:00.000Z'])
+        marks.update('channelId:UC1', ['2017-06-21T10:00:00.000Z'])
+        marks.update('channelId:UC1', [])
+        self.assertEqual(marks.published_after('channelId:UC1', '2017-06-01T00:00:00Z'), '2017-06-25T19:40:26.000Z')
+        # a later default wins over an older mark.
+        self.assertEqual(marks.published_after('channelId:UC1', '2017-07-01T00:00:00Z'), '2017-07-01T00:00:00Z')
+
+    def test_save_and_load(self):
+        marks = HighWaterMarks.load(path=self.path)
+        marks.update('channelId:UC1', ['2017-06-25T19:40:26.000Z'])
+        marks.save()
+        self.assertEqual(HighWaterMarks.load(path=self.path).marks, {'channelId:UC1': '2017-06-25T19:40:26.000Z'})
+
+
+class UpdateHighWaterMarksTests(unittest.TestCase):
+
+    def setUp(self):
+        self.runs_path = tempfile.mkdtemp()
+        self.journal = ScrapeJournal.start({}, runs_path=self.runs_path)
+        self.patches = [mock.patch.object(video_scraper, 'journal', self.journal),
+                        mock.patch.object(video_scraper, 'cache', None),
+                        mock.patch.object(video_scraper.youtube_client, 'get_client')]
+        for patch in self.patches:
+            patch.start()
+        self.marks = HighWaterMarks(path=os.path.join(self.runs_path, 'high_water_marks.json'))
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.runs_path)
+
+    def search(self, responses, known_video_ids=(), max_pages=5, **kwargs):
+        """runs a search whose pages are `responses` and updates the marks."""
+        kwargs = dict({'part': 'id,snippet', 'maxResults': 2}, **kwargs)
+        with mock.patch.object(video_scraper, 'cached_execute', side_effect=responses):
+            results = video_scraper.youtube_search_list(max_pages=max_pages, known_video_ids=set(known_video_ids), **kwargs)
+        future = Future()
+        future.set_result(results)
+        video_scraper.update_high_water_marks(self.marks, ['key'], [kwargs], [future])
+        return results
+
+    def test_raised_when_date_search_runs_out_of_results(self):
+        self.search([page([search_result('a2', '2017-06-25T00:00:00Z'), search_result('a1', '2017-06-24T00:00:00Z')], 'p2'),
+                     page([search_result('a0', '2017-06-23T00:00:00Z')])], order='date', channelId='UC1')
+        self.assertEqual(self.marks.marks, {'key': '2017-06-25T00:00:00Z'})
+
+    def test_not_raised_when_date_search_stops_at_known_video(self):
+        # a1 was found by another search, so older videos of the channel on
+        # page p2 may not have been scraped yet.
+        results = self.search([page([search_result('a2', '2017-06-25T00:00:00Z'), search_result('a1', '2017-06-24T00:00:00Z')], 'p2')],
+                              known_video_ids=['a1'], order='date', channelId='UC1')
+        self.assertEqual(len(results), 2)
+        self.assertEqual(self.marks.marks, {})
+
+    def test_raised_when_last_page_has_known_video(self):
+        self.search([page([search_result('a2', '2017-06-25T00:00:00Z'), search_result('a1', '2017-06-24T00:00:00Z')])],
+                    known_video_ids=['a1'], order='date', channelId='UC1')
+        self.assertEqual(self.marks.marks, {'key': '2017-06-25T00:00:00Z'})
+
+    def test_not_raised_at_page_limit(self):
+        self.search([page([search_result('a2', '2017-06-25T00:00:00Z'), search_result('a1', '2017-06-24T00:00:00Z')], 'p2')],
+                    max_pages=1, order='date', channelId='UC1')
+        self.assertTrue(self.journal.query_progress('search.list', {'part': 'id,snippet', 'maxResults': 2, 'order': 'date', 'channelId': 'UC1'})[3])
+        self.assertEqual(self.marks.marks, {})
+
+    def test_not_raised_when_out_of_quota(self):
+        self.search([page([search_result('a2', '2017-06-25T00:00:00Z')], 'p2'), video_scraper.request_scheduler.QuotaExceededError()],
+                    order='date', channelId='UC1')
+        self.assertEqual(self.marks.marks, {})
+
+    def test_not_raised_for_relevance_search(self):
+        # stops because every result is known, and would run out of results anyway.
+        self.search([page([search_result('a2', '2017-06-25T00:00:00Z')])], known_video_ids=['a2'], q='raila rally')
+        self.search([page([search_result('a3', '2017-06-26T00:00:00Z')])], q='uhuru rally')
+        self.assertEqual(self.marks.marks, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from module.metrics import Metrics
+from module.request_scheduler import RequestScheduler
+from tests.test_request_scheduler import FakeRequest, http_error
+
+
+class MetricsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'metrics.jsonl')
+        self.prometheus_path = os.path.join(self.tmpdir, 'run.prom')
+        self.metrics = Metrics()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_disabled_records_nothing(self):
+        self.metrics.inc('api_calls', method='search.list')
+        with self.metrics.timer('search'):
+            self.metrics.observe('api_request_seconds', 0.1)
+        self.metrics.close()
+        self.assertEqual(self.metrics.counters, {})
+        self.assertEqual(self.metrics.histograms, {})
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_writes_json_lines_and_prometheus(self):
+        self.metrics.configure('scrape', path=self.path, prometheus_path=self.prometheus_path)
+        with self.metrics.timer('search'):
+            self.metrics.inc('videos', 3, status='new')
+            self.metrics.inc('videos', 2, status='new')
+            self.metrics.observe('api_request_seconds', 0.02, method='search.list')
+            self.metrics.observe('api_request_seconds', 2.0, method='search.list')
+        self.metrics.close()
+        with open(self.path) as f:
+            events = [json.loads(line) for line in f]
+        self.assertEqual([e['event'] for e in events], ['phase', 'summary'])
+        self.assertEqual(events[0]['phase'], 'search')
+        self.assertIn({'name': 'videos', 'labels': {'status': 'new'}, 'value': 5}, events[1]['counters'])
+        with open(self.prometheus_path) as f:
+            lines = f.read().splitlines()
+        self.assertIn('# TYPE kenya_campaign_videos_total counter', lines)
+        self.assertIn('kenya_campaign_videos_total{job="scrape",status="new"} 5', lines)
+        self.assertIn('kenya_campaign_api_request_seconds_bucket{job="scrape",method="search.list",le="0.025"} 1', lines)
+        self.assertIn('kenya_campaign_api_request_seconds_bucket{job="scrape",method="search.list",le="+Inf"} 2', lines)
+        self.assertIn('kenya_campaign_api_request_seconds_count{job="scrape",method="search.list"} 2', lines)
+
+    def test_scheduler_counts_calls_quota_and_errors(self):
+        from module import request_scheduler
+        metrics, request_scheduler.METRICS = request_scheduler.METRICS, self.metrics
+        try:
+            self.metrics.configure('scrape', path=self.path)
+            scheduler = RequestScheduler(quota=1000, rate=1000.0, burst=100, backoff_base=0.0)
+            scheduler.execute('search.list', FakeRequest([http_error(503)]))
+        finally:
+            request_scheduler.METRICS = metrics
+        counters = {name: value for (name, _), value in self.metrics.counters.items()}
+        self.assertEqual(counters['api_calls'], 2)
+        self.assertEqual(counters['quota_units'], 200)
+        self.assertEqual(counters['api_errors'], 1)
+        self.assertEqual(counters['api_retries'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
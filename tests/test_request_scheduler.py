@@ -0,0 +1,92 @@
+import json
+import unittest
+
+import httplib2
+from apiclient.errors import HttpError
+
+from module.request_scheduler import RequestScheduler, QuotaExceededError, PRIORITY_HIGH, PRIORITY_LOW
+
+
+def http_error(status, reason=None):
+    content = json.dumps({'error': {'errors': [{'reason': reason}]}}).encode()
+    return HttpError(httplib2.Response({'status': status}), content)
+
+
+class FakeRequest(object):
+    """request that raises each error in `errors` in turn, then succeeds."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def execute(self):
+        self.calls += 1
+        if len(self.errors):
+            raise self.errors.pop(0)
+        return {'items': []}
+
+
+class RequestSchedulerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = RequestScheduler(quota=1000, rate=1000.0, burst=100, backoff_base=0.0, reserve=200)
+
+    def test_charges_quota_per_method(self):
+        self.scheduler.execute('search.list', FakeRequest())
+        self.scheduler.execute('videos.list', FakeRequest())
+        self.assertEqual(self.scheduler.used, 101)
+        self.assertEqual(self.scheduler.calls, {'search.list': 1, 'videos.list': 1})
+
+    def test_retries_transient_errors(self):
+        request = FakeRequest([http_error(503), http_error(403, 'rateLimitExceeded')])
+        self.assertEqual(self.scheduler.execute('videos.list', request), {'items': []})
+        self.assertEqual(request.calls, 3)
+        self.assertEqual(self.scheduler.retries, 2)
+
+    def test_gives_up_after_max_retries(self):
+        self.scheduler.max_retries = 1
+        request = FakeRequest([http_error(500), http_error(500), http_error(500)])
+        with self.assertRaises(HttpError):
+            self.scheduler.execute('videos.list', request)
+        self.assertEqual(request.calls, 2)
+
+    def test_does_not_retry_client_errors(self):
+        request = FakeRequest([http_error(400, 'badRequest')])
+        with self.assertRaises(HttpError):
+            self.scheduler.execute('videos.list', request)
+        self.assertEqual(request.calls, 1)
+
+    def test_quota_exceeded_from_api(self):
+        request = FakeRequest([http_error(403, 'quotaExceeded')])
+        with self.assertRaises(QuotaExceededError):
+            self.scheduler.execute('search.list', request)
+        self.assertEqual(request.calls, 1)
+        self.assertTrue(self.scheduler.exhausted)
+        # later requests are refused without calling the API.
+        request = FakeRequest()
+        with self.assertRaises(QuotaExceededError):
+            self.scheduler.execute('videos.list', request, priority=PRIORITY_HIGH)
+        self.assertEqual(request.calls, 0)
+        self.assertEqual(self.scheduler.refused, 1)
+
+    def test_other_403s_are_http_errors(self):
+        for reason in ['forbidden', 'accessNotConfigured', 'keyInvalid']:
+            request = FakeRequest([http_error(403, reason)])
+            with self.assertRaises(HttpError):
+                self.scheduler.execute('videos.list', request)
+            self.assertEqual(request.calls, 1)
+        self.assertFalse(self.scheduler.exhausted)
+
+    def test_reserves_quota_for_high_priority(self):
+        for _ in range(6):
+            self.scheduler.execute('search.list', FakeRequest(), priority=PRIORITY_LOW)
+        # a 7th low-priority search would leave less than 2 * 200 units.
+        with self.assertRaises(QuotaExceededError):
+            self.scheduler.execute('search.list', FakeRequest(), priority=PRIORITY_LOW)
+        self.scheduler.execute('search.list', FakeRequest(), priority=PRIORITY_HIGH)
+        self.assertEqual(self.scheduler.used, 700)
+        self.assertEqual(self.scheduler.refused, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from module import video_scraper
+from module.response_cache import ResponseCache, TTLS, request_key
+
+
+class ResponseCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = ResponseCache(path=os.path.join(self.tmpdir, 'youtube_cache.sqlite'))
+        self.kwargs = {'part': 'id,snippet', 'q': 'raila rally', 'maxResults': 50}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_request_key_normalization(self):
+        key = request_key('search.list', dict(self.kwargs, pageToken='CDIQAA'))
+        self.assertEqual(key, request_key('search.list', {'pageToken': 'CDIQAA', 'maxResults': 50, 'q': 'raila rally',
+                                                          'part': 'id,snippet', 'channelId': None}))
+        self.assertNotEqual(key, request_key('search.list', dict(self.kwargs, pageToken='CGQQAA')))
+        self.assertNotEqual(key, request_key('search.list', self.kwargs))
+        self.assertNotEqual(key, request_key('playlistItems.list', dict(self.kwargs, pageToken='CDIQAA')))
+
+    def test_pages_are_cached_separately(self):
+        self.cache.set('search.list', self.kwargs, {'items': [1], 'nextPageToken': 'CDIQAA'})
+        self.cache.set('search.list', dict(self.kwargs, pageToken='CDIQAA'), {'items': [2]})
+        self.assertEqual(self.cache.get('search.list', self.kwargs)['items'], [1])
+        self.assertEqual(self.cache.get('search.list', dict(self.kwargs, pageToken='CDIQAA'))['items'], [2])
+        self.assertIsNone(self.cache.get('search.list', dict(self.kwargs, pageToken='CGQQAA')))
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+
+    def test_responses_expire_after_method_ttl(self):
+        now = 1500000000.0
+        with mock.patch('module.response_cache.time.time', return_value=now):
+            self.cache.set('search.list', self.kwargs, {'items': [1]})
+            self.cache.set('videos.list', self.kwargs, {'items': [2]})
+        with mock.patch('module.response_cache.time.time', return_value=now + TTLS['search.list']):
+            self.assertEqual(self.cache.get('search.list', self.kwargs), {'items': [1]})
+        with mock.patch('module.response_cache.time.time', return_value=now + TTLS['search.list'] + 1):
+            self.assertIsNone(self.cache.get('search.list', self.kwargs))
+            # methods without a TTL are never served from `responses`.
+            self.assertIsNone(self.cache.get('videos.list', self.kwargs))
+
+    def test_videos_are_served_from_cache(self):
+        items = [{'id': 'a1', 'snippet': {'title': 'Raila rally'}}, {'id': 'a2', 'snippet': {'title': 'Uhuru speech'}}]
+        self.cache.set_videos(items, part='id,snippet')
+        self.assertEqual(self.cache.get_videos(['a2', 'a1', 'a3'], part='id,snippet'), {'a1': items[0], 'a2': items[1]})
+        self.assertEqual(self.cache.get_videos(['a1'], part='id,snippet,contentDetails'), {})
+
+        # every video is cached, so no client is built and no request is made.
+        with mock.patch.object(video_scraper, 'cache', self.cache), \
+                mock.patch.object(video_scraper, 'scheduler', None), \
+                mock.patch.object(video_scraper.youtube_client, 'get_client', side_effect=AssertionError('network call')):
+            self.assertEqual(video_scraper.youtube_videos_list(['a2', 'a1'], part='id,snippet'), [items[1], items[0]])
+
+    def test_next_day_run_reuses_only_videos(self):
+        now = 1500000000.0
+        items = [{'id': 'a1', 'snippet': {'title': 'Raila rally'}}]
+        with mock.patch('module.response_cache.time.time', return_value=now):
+            self.cache.set('search.list', self.kwargs, {'items': [{'id': {'videoId': 'a1'}}]})
+            self.cache.set_videos(items, part='id,snippet')
+        # the next day's run opens the same database.
+        cache = ResponseCache(path=self.cache.path)
+        with mock.patch('module.response_cache.time.time', return_value=now + 24 * 60 * 60):
+            self.assertIsNone(cache.get('search.list', self.kwargs))
+            self.assertEqual(cache.get_videos(['a1', 'a2'], part='id,snippet'), {'a1': items[0]})
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
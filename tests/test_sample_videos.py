@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from module import sample_videos
+from module.video_store import SNAPSHOT_COLUMNS
+
+
+def make_chunks(n_rows, chunk_size, n_channels=4):
+    videos = pd.DataFrame({
+        'video_id': ['v{0}'.format(i) for i in range(n_rows)],
+        'title': 'title',
+        'published_at': pd.Timestamp('2017-06-01') + pd.to_timedelta(np.arange(n_rows) % 28, unit='D'),
+        # note: channel c0 has far more videos than the others.
+        'channel_title': ['c0' if i % 10 < 7 else 'c{0}'.format(1 + i % (n_channels - 1)) for i in range(n_rows)],
+        'duration': 'PT1M',
+    })[SNAPSHOT_COLUMNS]
+    return [videos.iloc[i:i+chunk_size] for i in range(0, n_rows, chunk_size)]
+
+
+class SampleVideosTests(unittest.TestCase):
+
+    def test_reservoir_is_uniform(self):
+        random_state = np.random.RandomState(0)
+        counts = np.zeros(100)
+        for _ in range(2000):
+            reservoir = sample_videos.Reservoir(10, random_state)
+            for i in range(0, 100, 7):
+                reservoir.extend(list(range(i, min(i + 7, 100))))
+            counts[reservoir.items] += 1
+        # note: each item is expected to be sampled 2000 * 10 / 100 = 200 times.
+        self.assertLess(np.abs(counts - 200).max(), 60)
+
+    def test_sample_excludes_labeled_and_duplicates(self):
+        chunks = make_chunks(100, 30) + make_chunks(100, 30)
+        excluded = {'v{0}'.format(i) for i in range(50)}
+        sampled, n_eligible = sample_videos.sample(chunks, 80, np.random.RandomState(0), excluded=excluded)
+        self.assertEqual(n_eligible, 50)
+        self.assertEqual(sampled.shape[0], 50)
+        self.assertTrue(sampled.video_id.is_unique)
+        self.assertFalse(set(sampled.video_id) & excluded)
+
+    def test_stratified_allocation(self):
+        sampled, _ = sample_videos.sample(make_chunks(1000, 64), 40, np.random.RandomState(0),
+                                          stratify='channel', allocation='equal')
+        self.assertEqual(sampled.channel_title.value_counts().tolist(), [10, 10, 10, 10])
+        sampled, _ = sample_videos.sample(make_chunks(1000, 64), 40, np.random.RandomState(0),
+                                          stratify='channel', allocation='proportional')
+        self.assertEqual(sampled.channel_title.value_counts()['c0'], 28)
+        sampled, _ = sample_videos.sample(make_chunks(1000, 64), 40, np.random.RandomState(0), stratify='week')
+        self.assertEqual(sampled.shape[0], 40)
+
+    def test_allocate_equal_redistributes(self):
+        self.assertEqual(sample_videos.allocate({'a': 2, 'b': 100, 'c': 100}, 30, 'equal'), {'a': 2, 'b': 14, 'c': 14})
+
+
+if __name__ == '__main__':
+    unittest.main()
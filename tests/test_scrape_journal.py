@@ -0,0 +1,61 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from module.scrape_journal import ScrapeJournal
+
+
+class ScrapeJournalTests(unittest.TestCase):
+
+    def setUp(self):
+        self.runs_path = tempfile.mkdtemp()
+        self.kwargs = {'part': 'id,snippet', 'q': 'raila rally', 'channelId': None}
+
+    def tearDown(self):
+        shutil.rmtree(self.runs_path)
+
+    def test_resume_replays_progress(self):
+        journal = ScrapeJournal.start({'max_pages': 5, 'workers': 8}, runs_path=self.runs_path)
+        journal.record_page('search.list', self.kwargs, [{'id': 1}], 'page2')
+        journal.record_page('search.list', {'q': 'uhuru'}, [{'id': 2}], None)
+        journal.record_done('search.list', {'q': 'uhuru'})
+        journal.write_details([['a1', 'title', '2017-06-25T19:40:26.000Z', 'NTV', 'PT1M']])
+        # simulates a record truncated by an interruption.
+        with open(journal.path, 'a') as f:
+            f.write('{"type": "pa')
+
+        resumed = ScrapeJournal.resume(runs_path=self.runs_path)
+        self.assertEqual(resumed.run_id, journal.run_id)
+        self.assertEqual(resumed.args, {'max_pages': 5})
+        # key ignores None-valued kwargs and kwarg order.
+        self.assertEqual(resumed.query_progress('search.list', {'q': 'raila rally', 'part': 'id,snippet'}),
+                         ([{'id': 1}], 'page2', 1, False))
+        self.assertEqual(resumed.query_progress('search.list', {'q': 'uhuru'}), ([{'id': 2}], None, 1, True))
+        self.assertEqual(resumed.query_progress('videos.list', {'q': 'uhuru'}), ([], None, 0, False))
+        self.assertEqual(resumed.detail_video_ids, {'a1'})
+        self.assertEqual(resumed.read_details().video_id.tolist(), ['a1'])
+
+    def test_append_after_truncated_record(self):
+        journal = ScrapeJournal.start({'max_pages': 5}, runs_path=self.runs_path)
+        journal.record_page('search.list', {'q': 'uhuru'}, [{'id': 2}], 'page2')
+        with open(journal.path, 'a') as f:
+            f.write('{"type": "pa')
+
+        resumed = ScrapeJournal.resume(runs_path=self.runs_path)
+        resumed.record_page('search.list', {'q': 'uhuru'}, [{'id': 3}], None)
+        resumed.record_done('search.list', {'q': 'uhuru'})
+        replayed = ScrapeJournal.resume(runs_path=self.runs_path)
+        self.assertEqual(replayed.query_progress('search.list', {'q': 'uhuru'}), ([{'id': 2}, {'id': 3}], None, 2, True))
+        with open(journal.path) as f:
+            self.assertEqual([json.loads(line)['type'] for line in f], ['start', 'page', 'page', 'done'])
+
+    def test_finished_run_is_not_resumed(self):
+        journal = ScrapeJournal.start({}, runs_path=self.runs_path)
+        journal.finish('youtube_search_results_{0}.csv'.format(journal.run_id))
+        self.assertIsNone(ScrapeJournal.resume(runs_path=self.runs_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+
+import numpy as np
+
+from module.utils import duration_str_to_num
+
+
+class DurationStrToNumTests(unittest.TestCase):
+
+    def test_durations(self):
+        durations = ['PT11M42S', 'PT42S', 'PT1H', 'PT1H2M3S', 'P1DT1S', 'P0D', 'PT1.5S', 'PT11M42S']
+        expected = [702, 42, 3600, 3723, 86401, 0, 1.5, 702]
+        np.testing.assert_array_equal(duration_str_to_num(durations), expected)
+
+    def test_nulls(self):
+        seconds = duration_str_to_num(['PT1M', None, np.nan])
+        self.assertEqual(seconds[0], 60)
+        self.assertTrue(np.isnan(seconds[1:]).all())
+        self.assertEqual(duration_str_to_num([]).shape, (0,))
+
+
+if __name__ == '__main__':
+    unittest.main()
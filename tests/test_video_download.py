@@ -0,0 +1,125 @@
+import os
+import re
+import shutil
+import time
+import hashlib
+import tempfile
+import threading
+import unittest
+import socketserver
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from module import video_download
+
+# contents of each video served by the stand-in server.
+VIDEOS = {
+    'a1': os.urandom(200 * 1024),
+    'a2': os.urandom(50 * 1024),
+}
+
+
+class VideoHandler(BaseHTTPRequestHandler):
+    """serves `VIDEOS` at "/<video_id>.mp4", with support for Range requests."""
+
+    # video IDs to fail (with a 503) on their next request.
+    fail_once = set()
+
+    def do_GET(self):
+        video_id = os.path.basename(self.path)[:-len('.mp4')]
+        if video_id in self.fail_once:
+            self.fail_once.discard(video_id)
+            self.send_error(503)
+            return
+        if video_id not in VIDEOS:
+            self.send_error(404)
+            return
+        body = VIDEOS[video_id]
+        match = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(start, len(body) - 1, len(body)))
+            body = body[start:]
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    # note: `http.server.ThreadingHTTPServer` only exists from Python 3.7.
+    daemon_threads = True
+
+
+class VideoDownloadTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), VideoHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = 'http://127.0.0.1:{0}/'.format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.tmpdir, 'downloads')
+        self.queue = video_download.JobQueue(os.path.join(self.tmpdir, 'downloads.sqlite'))
+
+    def tearDown(self):
+        self.queue.close()
+        shutil.rmtree(self.tmpdir)
+
+    def manager(self, **kwargs):
+        return video_download.DownloadManager(self.queue, output_dir=self.output_dir,
+            resolver=lambda video_id: self.base_url + video_id + '.mp4', backoff_base=0.01, **kwargs)
+
+    def test_downloads_retries_and_fails(self):
+        VideoHandler.fail_once.add('a2')
+        self.queue.add(['a1', 'a2', 'missing'])
+        counts = self.manager(workers=3, max_retries=1).run()
+        self.assertEqual(counts, {'pending': 0, 'running': 0, 'done': 2, 'failed': 1})
+        jobs = {job[0]: job for job in self.queue.jobs()}
+        for video_id in ['a1', 'a2']:
+            with open(os.path.join(self.output_dir, video_id + '.mp4'), 'rb') as f:
+                self.assertEqual(f.read(), VIDEOS[video_id])
+            self.assertEqual(jobs[video_id][4], hashlib.sha256(VIDEOS[video_id]).hexdigest())
+        self.assertEqual(jobs['a2'][2], 1)
+        self.assertEqual(jobs['missing'][2], 2)
+
+    def test_resumes_partial_file(self):
+        os.makedirs(self.output_dir)
+        with open(os.path.join(self.output_dir, 'a1.mp4.part'), 'wb') as f:
+            f.write(VIDEOS['a1'][:1000])
+        self.queue.add(['a1'])
+        self.manager(workers=1).run()
+        with open(os.path.join(self.output_dir, 'a1.mp4'), 'rb') as f:
+            self.assertEqual(f.read(), VIDEOS['a1'])
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'a1.mp4.part')))
+
+    def test_verify_requeues_changed_files(self):
+        self.queue.add(['a2'])
+        self.manager().run()
+        with open(os.path.join(self.output_dir, 'a2.mp4'), 'ab') as f:
+            f.write(b'corrupt')
+        self.assertEqual(video_download.verify(self.queue, self.output_dir), ['a2'])
+        self.assertEqual(self.queue.counts()['pending'], 1)
+
+    def test_bandwidth_cap(self):
+        limiter = video_download.BandwidthLimiter(rate=100 * 1024)
+        path = os.path.join(self.tmpdir, 'a1.mp4')
+        # note: the first 100KB are a burst, so the remaining 100KB take about a second.
+        time0 = time.time()
+        video_download.download_file(self.base_url + 'a1.mp4', path, limiter=limiter)
+        self.assertGreater(time.time() - time0, 0.8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from module import video_scraper
+from module.scrape_journal import ScrapeJournal
+
+
+def search_result(video_id):
+    return {'id': {'videoId': video_id}}
+
+
+def page(video_ids, next_page_token=None):
+    response = {'items': [search_result(video_id) for video_id in video_ids]}
+    if next_page_token is not None:
+        response['nextPageToken'] = next_page_token
+    return response
+
+
+class DedupeVideoIdsTests(unittest.TestCase):
+
+    def test_keeps_first_occurrence_in_order(self):
+        search_results = [search_result(video_id) for video_id in ['a3', 'a1', 'a3', 'a2', 'a1', 'a4', 'a2']]
+        deduped, video_ids = video_scraper.dedupe_video_ids(search_results)
+        self.assertEqual([r['id']['videoId'] for r in deduped], ['a3', 'a1', 'a2', 'a4'])
+        # the first occurrence itself is kept, not a later copy.
+        self.assertIs(deduped[0], search_results[0])
+        self.assertIs(deduped[2], search_results[3])
+        self.assertEqual(video_ids, {'a1', 'a2', 'a3', 'a4'})
+
+    def test_skips_existing_video_ids(self):
+        existing = {'a1', 'a9'}
+        search_results = [search_result(video_id) for video_id in ['a2', 'a1', 'a3', 'a2']]
+        deduped, video_ids = video_scraper.dedupe_video_ids(search_results, existing)
+        self.assertEqual([r['id']['videoId'] for r in deduped], ['a2', 'a3'])
+        # `video_ids` is updated in place.
+        self.assertIs(video_ids, existing)
+        self.assertEqual(existing, {'a1', 'a2', 'a3', 'a9'})
+
+
+class ResumeSearchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.runs_path = tempfile.mkdtemp()
+        self.kwargs = {'part': 'id,snippet', 'q': 'raila rally', 'maxResults': 2}
+        self.patches = [mock.patch.object(video_scraper, 'cache', None),
+                        mock.patch.object(video_scraper.youtube_client, 'get_client')]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.runs_path)
+
+    def resume(self, responses, max_pages=5):
+        """resumes the interrupted run and repeats its search, whose
+        remaining pages are `responses`."""
+        journal = ScrapeJournal.resume(runs_path=self.runs_path)
+        with mock.patch.object(video_scraper, 'journal', journal), \
+                mock.patch.object(video_scraper, 'cached_execute', side_effect=responses) as execute:
+            results = video_scraper.youtube_search_list(max_pages=max_pages, **self.kwargs)
+        return [r['id']['videoId'] for r in results], execute, journal
+
+    def test_continues_from_last_page_token(self):
+        ScrapeJournal.start({}, runs_path=self.runs_path).record_page('search.list', self.kwargs, page(['a1', 'a2'])['items'], 'p2')
+        video_ids, execute, journal = self.resume([page(['a3'])])
+        self.assertEqual(video_ids, ['a1', 'a2', 'a3'])
+        self.assertEqual(execute.call_args[1]['pageToken'], 'p2')
+        self.assertTrue(journal.query_complete('search.list', self.kwargs))
+
+    def test_last_page_recorded_but_not_done(self):
+        # interrupted after recording the last page, before recording that
+        # the query was done.
+        journal = ScrapeJournal.start({}, runs_path=self.runs_path)
+        journal.record_page('search.list', self.kwargs, page(['a1', 'a2'])['items'], 'p2')
+        journal.record_page('search.list', self.kwargs, page(['a3'])['items'], None)
+        video_ids, execute, journal = self.resume([])
+        self.assertEqual(video_ids, ['a1', 'a2', 'a3'])
+        self.assertEqual(execute.call_count, 0)
+        self.assertTrue(journal.query_complete('search.list', self.kwargs))
+
+    def test_page_limit_recorded_but_not_done(self):
+        ScrapeJournal.start({}, runs_path=self.runs_path).record_page('search.list', self.kwargs, page(['a1', 'a2'])['items'], 'p2')
+        video_ids, execute, journal = self.resume([], max_pages=1)
+        self.assertEqual(video_ids, ['a1', 'a2'])
+        self.assertEqual(execute.call_count, 0)
+        self.assertEqual(journal.query_progress('search.list', self.kwargs)[3], True)
+        self.assertFalse(journal.query_complete('search.list', self.kwargs))
+
+
+if __name__ == '__main__':
+    unittest.main()
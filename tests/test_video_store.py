@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from module import video_store
+
+
+class VideoStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.snapshots_path = os.path.join(self.tmpdir, 'videos')
+        self.store_path = os.path.join(self.tmpdir, 'generated', 'videos.parquet')
+        os.makedirs(self.snapshots_path)
+        self.write_snapshot('youtube_search_results_2017-06-25T13-11-38Z.csv', [
+            ['a1', 'Raila rally', '2017-06-25T19:40:26.000Z', 'NTV Kenya', 'PT42M20S'],
+            ['a2', 'Uhuru speech', '2017-06-25T19:37:06.000Z', 'KTN News', 'PT1M34S'],
+        ])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_snapshot(self, fname, rows):
+        videos = pd.DataFrame(rows, columns=video_store.SNAPSHOT_COLUMNS)
+        videos.to_csv(os.path.join(self.snapshots_path, fname), index=False)
+        return videos
+
+    def load(self, **kwargs):
+        return video_store.load_store(store_path=self.store_path, snapshots_path=self.snapshots_path, **kwargs)
+
+    def test_load_types_columns(self):
+        videos = self.load()
+        self.assertEqual(videos.columns.tolist(), video_store.STORE_COLUMNS)
+        self.assertTrue(np.issubdtype(videos.published_at.dtype, np.datetime64))
+        self.assertEqual(videos.duration_seconds.tolist(), [2540.0, 94.0])
+        self.assertTrue(os.path.isdir(self.store_path))
+
+    def test_load_ingests_new_snapshots_once(self):
+        self.load()
+        self.write_snapshot('youtube_search_results_2017-06-26T13-11-38Z.csv', [
+            ['a3', 'NASA campaign', '2017-06-26T10:00:00.000Z', 'NTV Kenya', None],
+        ])
+        videos = self.load()
+        self.assertEqual(videos.video_id.tolist(), ['a1', 'a2', 'a3'])
+        self.assertTrue(np.isnan(videos.duration_seconds.iloc[2]))
+        self.assertEqual(self.load().shape[0], 3)
+
+    def test_append_snapshot(self):
+        self.load()
+        snapshot = pd.DataFrame([['a4', 'Jubilee', '2017-06-27T10:00:00.000Z', 'KTN News', 'PT10S']],
+                                columns=video_store.SNAPSHOT_COLUMNS)
+        video_store.append_snapshot(snapshot, source='new.csv', store_path=self.store_path)
+        video_store.append_snapshot(snapshot, source='new.csv', store_path=self.store_path)
+        videos = self.load(sync=False)
+        self.assertEqual(videos.video_id.tolist(), ['a1', 'a2', 'a4'])
+        self.assertEqual(sorted(os.listdir(self.store_path)), [
+            'part-000000-youtube_search_results_2017-06-25T13-11-38Z.csv.parquet',
+            'part-000001-new.csv.parquet',
+        ])
+
+    def test_append_snapshot_without_durations(self):
+        self.load()
+        snapshot = pd.DataFrame([['a5', 'ODM', '2017-06-28T10:00:00.000Z', 'KTN News', None]],
+                                columns=video_store.SNAPSHOT_COLUMNS)
+        video_store.append_snapshot(snapshot, source='new.csv', store_path=self.store_path)
+        videos = self.load(sync=False)
+        self.assertEqual(videos.video_id.tolist(), ['a1', 'a2', 'a5'])
+        self.assertTrue(np.isnan(videos.duration_seconds.iloc[2]))
+
+    def test_video_id_index(self):
+        ids_path = os.path.join(self.tmpdir, 'generated', 'video_ids.txt')
+        index = video_store.VideoIdIndex.load(path=ids_path, store_path=self.store_path, snapshots_path=self.snapshots_path)
+        self.assertIn('a1', index)
+        self.assertNotIn('zz', index)
+        index.update(['zz', 'a0'])
+        index.save()
+        with open(ids_path) as f:
+            self.assertEqual(f.read().split(), ['a0', 'a1', 'a2', 'zz'])
+        index = video_store.VideoIdIndex.load(path=ids_path, store_path=self.store_path, snapshots_path=self.snapshots_path)
+        self.assertEqual(len(index), 4)
+
+    def test_video_id_index_excludes_sources(self):
+        ids_path = os.path.join(self.tmpdir, 'generated', 'video_ids.txt')
+        self.load()
+        snapshot = self.write_snapshot('youtube_search_results_2017-06-26T13-11-38Z.csv', [
+            ['a3', 'NASA campaign', '2017-06-26T10:00:00.000Z', 'NTV Kenya', 'PT5S'],
+        ])
+        video_store.append_snapshot(snapshot, source='youtube_search_results_2017-06-26T13-11-38Z.csv', store_path=self.store_path)
+        index = video_store.VideoIdIndex.load(path=ids_path, store_path=self.store_path, snapshots_path=self.snapshots_path,
+                                              exclude_sources=['youtube_search_results_2017-06-26T13-11-38Z.csv'])
+        self.assertEqual(sorted(index), ['a1', 'a2'])
+        self.assertFalse(os.path.isfile(ids_path))
+
+    def test_iter_snapshot_chunks(self):
+        self.write_snapshot('youtube_search_results_2017-06-26T13-11-38Z.csv', [
+            ['a3', 'NASA campaign', '2017-06-26T10:00:00.000Z', 'NTV Kenya', 'PT5S'],
+        ])
+        chunks = list(video_store.iter_snapshot_chunks(chunk_size=1, snapshots_path=self.snapshots_path))
+        self.assertEqual([chunk.video_id.tolist() for chunk in chunks], [['a1'], ['a2'], ['a3']])
+        self.assertEqual(chunks[0].columns.tolist(), video_store.STORE_COLUMNS)
+        pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), self.load())
+        chunks = video_store.iter_snapshot_chunks(snapshots_path=self.snapshots_path,
+                                                  fnames=['youtube_search_results_2017-06-26T13-11-38Z.csv'])
+        self.assertEqual([chunk.video_id.tolist() for chunk in chunks], [['a3']])
+
+
+if __name__ == '__main__':
+    unittest.main()
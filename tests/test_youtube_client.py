@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from module import youtube_client
+from benchmarks.fake_youtube import FakeYouTube
+
+
+def get_client_in_thread(developer_key):
+    """returns the client built by `get_client` in a new thread."""
+    clients = []
+    thread = threading.Thread(target=lambda: clients.append(youtube_client.get_client(developer_key)))
+    thread.start()
+    thread.join()
+    return clients[0]
+
+
+class YoutubeClientTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fake = FakeYouTube.from_corpus(1000, seed=0)
+        cls.discovery_url = cls.fake.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fake.stop()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.patches = [mock.patch.object(youtube_client, 'DISCOVERY_URL', self.discovery_url),
+                        mock.patch.object(youtube_client, 'DISCOVERY_CACHE_DIR', self.tmpdir),
+                        mock.patch.object(youtube_client, '_local', threading.local())]
+        for patch in self.patches:
+            patch.start()
+        youtube_client.STATS.reset()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_one_client_per_thread(self):
+        youtube = youtube_client.get_client('fake-key')
+        self.assertIs(youtube_client.get_client('fake-key'), youtube)
+        other = get_client_in_thread('fake-key')
+        self.assertIsNot(other, youtube)
+        self.assertIs(youtube_client.get_client('fake-key'), youtube)
+        # a different key gets a new client.
+        self.assertIsNot(youtube_client.get_client('other-key'), youtube)
+        self.assertEqual(youtube_client.STATS.builds, 3)
+
+    def test_discovery_document_is_cached(self):
+        get_client_in_thread('fake-key')
+        self.assertEqual(youtube_client.STATS.discovery_fetches, 1)
+        self.assertEqual(len(os.listdir(self.tmpdir)), 1)
+        # the second build reads the cached document, even with the server unreachable.
+        with mock.patch('httplib2.Http.request', side_effect=AssertionError('network call')):
+            youtube = get_client_in_thread('fake-key')
+        self.assertEqual(youtube_client.STATS.discovery_fetches, 1)
+        self.assertEqual(youtube_client.STATS.builds, 2)
+        self.assertEqual(len(youtube.search().list(part='id', q='raila', maxResults=5).execute()['items']), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,12 @@
+import pandas as pd
+
+
+def make_videos() -> pd.DataFrame:
+    """returns four videos to fit and transform featurizers in tests."""
+    return pd.DataFrame({
+        'video_id': ['v1', 'v2', 'v3', 'v4'],
+        'title': ['Raila rally in Kisumu', 'Uhuru speech', 'Jubilee campaign rally', 'NASA speech'],
+        'channel_title': ['NTV Kenya', 'KTN News', 'NTV Kenya', 'Citizen TV'],
+        'published_at': ['2017-06-25T19:40:26Z', '2017-06-26T10:00:00Z', '2017-07-01T08:00:00Z', '2017-08-01T12:00:00Z'],
+        'duration': ['PT42M20S', 'PT1M34S', 'PT10M', 'PT5S'],
+    })
@@ -0,0 +1,82 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from module.video_relevance import feature_cache, preprocessing
+from module.video_relevance.feature_cache import FeatureCache
+from module.video_relevance.preprocessing import Featurizer
+from tests.video_relevance import make_videos
+
+
+class FeatureCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.videos = make_videos()
+        self.featurizer = Featurizer().fit(self.videos)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def cache(self, featurizer=None):
+        featurizer = featurizer or self.featurizer
+        return FeatureCache(featurizer, path=os.path.join(self.tmpdir, featurizer.fingerprint()))
+
+    def test_keyed_by_fingerprint(self):
+        self.assertEqual(FeatureCache(self.featurizer).path,
+                         os.path.join(feature_cache.FEATURES_PATH, self.featurizer.fingerprint()))
+        refit = Featurizer().fit(self.videos.iloc[::-1])
+        self.assertEqual(refit.fingerprint(), self.featurizer.fingerprint())
+        other = Featurizer().fit(self.videos.iloc[:2])
+        self.assertNotEqual(other.fingerprint(), self.featurizer.fingerprint())
+        # a change to the featurization code invalidates cached features.
+        fingerprint = self.featurizer.fingerprint()
+        with mock.patch.object(preprocessing, 'FEATURIZER_VERSION', preprocessing.FEATURIZER_VERSION + 1):
+            self.assertNotEqual(self.featurizer.fingerprint(), fingerprint)
+
+    def test_transform_appends_only_unseen_videos(self):
+        cache = self.cache()
+        X = cache.transform(self.videos.iloc[:3])
+        np.testing.assert_array_equal(X.toarray(), self.featurizer.transform(self.videos.iloc[:3]).toarray())
+        self.assertEqual(cache.meta['n_rows'], 3)
+        # v2 and v3 are cached, v4 is new and v4 repeated is appended once.
+        videos = self.videos.iloc[[3, 1, 3, 2]]
+        X = cache.transform(videos)
+        np.testing.assert_array_equal(X.toarray(), self.featurizer.transform(videos).toarray())
+        self.assertEqual(cache.meta['n_rows'], 4)
+        self.assertEqual(cache.rows, {'v1': 0, 'v2': 1, 'v3': 2, 'v4': 3})
+
+    def test_reload_after_append(self):
+        cache = self.cache()
+        cache.transform(self.videos.iloc[:2])
+        other = self.cache()
+        other.transform(self.videos.iloc[1:])
+        # `cache` is stale, so v3 and v4 are appended by `other` only once.
+        cache.append(['v3', 'v4'], self.featurizer.transform(self.videos.iloc[2:]))
+        reloaded = self.cache()
+        video_ids, X = reloaded.load()
+        self.assertEqual(video_ids, ['v1', 'v2', 'v3', 'v4'])
+        self.assertFalse(X.data.flags.owndata)
+        np.testing.assert_array_equal(X.toarray(), self.featurizer.transform(self.videos).toarray())
+
+    def test_prune(self):
+        old, recent = self.cache(), self.cache(Featurizer().fit(self.videos.iloc[:2]))
+        old.transform(self.videos)
+        recent.transform(self.videos)
+        kept = self.cache(Featurizer(hashing=True, n_features=16).fit(self.videos))
+        kept.transform(self.videos)
+        last_used = time.time() - 40 * 24 * 60 * 60
+        os.utime(old.path, (last_used, last_used))
+        os.utime(kept.path, (last_used, last_used))
+        pruned = feature_cache.prune(max_age_days=30, keep=[os.path.basename(kept.path)], path=self.tmpdir)
+        self.assertEqual(pruned, [os.path.basename(old.path)])
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), sorted([os.path.basename(recent.path), os.path.basename(kept.path)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
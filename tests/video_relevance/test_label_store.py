@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from module import video_store
+from module.video_relevance import label_store
+
+
+class LabelStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.labels_path = os.path.join(self.tmpdir, 'video_relevance')
+        self.active_learning_path = os.path.join(self.labels_path, 'active_learning')
+        os.makedirs(self.active_learning_path)
+        self.write_labels(os.path.join(self.labels_path, 'labels0.csv'), [['a1', 1.0], ['a2', 0.0], ['a3', None]])
+        self.write_labels(os.path.join(self.active_learning_path, 'labels_2018-01-01.csv'), [['a2', 1.0], ['a3', 0.0]])
+        snapshots_path = os.path.join(self.tmpdir, 'videos')
+        os.makedirs(snapshots_path)
+        pd.DataFrame([
+            ['a1', 'Raila rally', '2017-06-25T19:40:26.000Z', 'NTV Kenya', 'PT42M20S'],
+            ['a2', 'Uhuru speech', '2017-06-25T19:37:06.000Z', 'KTN News', 'PT1M34S'],
+            ['a1', 'Raila rally', '2017-06-25T19:40:26.000Z', 'NTV Kenya', 'PT42M20S'],
+        ], columns=video_store.SNAPSHOT_COLUMNS).to_csv(os.path.join(snapshots_path, 'youtube_search_results_0.csv'), index=False)
+        self.store_kwargs = {
+            'path': os.path.join(self.tmpdir, 'generated', 'videos_unique.parquet'),
+            'store_path': os.path.join(self.tmpdir, 'generated', 'videos.parquet'),
+            'snapshots_path': snapshots_path,
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_labels(self, path, rows):
+        pd.DataFrame(rows, columns=['video_id', 'label']).to_csv(path, index=False)
+
+    def load_labels(self, **kwargs):
+        return label_store.load_labels(labels_path=self.labels_path, active_learning_path=self.active_learning_path, **kwargs)
+
+    def test_conflict_policies(self):
+        self.assertEqual(self.load_labels(on_conflict='latest').to_dict(), {'a1': 1.0, 'a2': 1.0, 'a3': 0.0})
+        self.assertEqual(self.load_labels(on_conflict='drop').to_dict(), {'a1': 1.0, 'a3': 0.0})
+        with self.assertRaises(label_store.LabelConflictError):
+            self.load_labels(on_conflict='raise')
+
+    def test_load_labeled_videos_joins_unique_videos(self):
+        X_raw, y = label_store.load_labeled_videos(
+            store_kwargs=self.store_kwargs, labels_path=self.labels_path, active_learning_path=self.active_learning_path)
+        # note: a3 is labeled but was never scraped.
+        self.assertEqual(X_raw.index.tolist(), ['a1', 'a2'])
+        self.assertEqual(y.index.tolist(), ['a1', 'a2'])
+        self.assertEqual(X_raw.title.tolist(), ['Raila rally', 'Uhuru speech'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+
+from module.video_relevance import model_artifact
+from module.video_relevance.preprocessing import Featurizer
+from tests.video_relevance import make_videos
+
+
+class ModelArtifactTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'model.joblib')
+        self.videos = make_videos()
+        self.y = pd.Series([1, 0, 1, 0], index=self.videos.video_id.values)
+        self.featurizer = Featurizer().fit(self.videos)
+        self.pipeline = LogisticRegression().fit(self.featurizer.transform(self.videos), self.y.values)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_round_trip(self):
+        saved = model_artifact.save_model(self.path, self.featurizer, self.pipeline,
+                                          {'test_score': 0.9, 'data_hash': model_artifact.data_hash(self.y)})
+        featurizer, pipeline, metadata = model_artifact.load_model(self.path)
+        self.assertEqual(metadata, saved)
+        self.assertEqual(metadata['featurizer_fingerprint'], self.featurizer.fingerprint())
+        self.assertEqual(metadata['format_version'], model_artifact.FORMAT_VERSION)
+        self.assertEqual(metadata['test_score'], 0.9)
+        with open(self.path + '.json') as f:
+            self.assertEqual(json.load(f), saved)
+        self.assertEqual(featurizer.fingerprint(), self.featurizer.fingerprint())
+        np.testing.assert_array_equal(pipeline.predict_proba(featurizer.transform(self.videos)),
+                                      self.pipeline.predict_proba(self.featurizer.transform(self.videos)))
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+    def test_data_hash(self):
+        self.assertEqual(model_artifact.data_hash(self.y), model_artifact.data_hash(self.y.iloc[::-1]))
+        self.assertNotEqual(model_artifact.data_hash(self.y), model_artifact.data_hash(1 - self.y))
+        self.assertNotEqual(model_artifact.data_hash(self.y), model_artifact.data_hash(self.y.iloc[1:]))
+
+    def test_different_featurizer_fingerprint(self):
+        model_artifact.save_model(self.path, self.featurizer, self.pipeline)
+        artifact = joblib.load(self.path)
+        artifact['featurizer'] = Featurizer().fit(self.videos.iloc[:2])
+        joblib.dump(artifact, self.path)
+        with self.assertRaises(ValueError):
+            model_artifact.load_model(self.path)
+
+    def test_different_format_version(self):
+        model_artifact.save_model(self.path, self.featurizer, self.pipeline)
+        artifact = joblib.load(self.path)
+        artifact['metadata']['format_version'] = model_artifact.FORMAT_VERSION + 1
+        joblib.dump(artifact, self.path)
+        with self.assertRaises(ValueError):
+            model_artifact.load_model(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+
+from module import video_store
+from module.video_relevance import model_artifact, predict
+from module.video_relevance.preprocessing import Featurizer
+
+
+class PredictTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.snapshots_path = os.path.join(self.tmpdir, 'videos')
+        os.makedirs(self.snapshots_path)
+        self.patches = [
+            mock.patch.object(video_store, 'SNAPSHOTS_PATH', self.snapshots_path),
+            mock.patch.object(video_store, 'STORE_PATH', os.path.join(self.tmpdir, 'generated', 'videos.parquet')),
+            mock.patch.object(video_store, 'UNIQUE_STORE_PATH', os.path.join(self.tmpdir, 'generated', 'videos_unique.parquet')),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.write_snapshot('youtube_search_results_2017-06-25T13-11-38Z.csv', [
+            ['a1', 'Raila rally in Kisumu', '2017-06-25T19:40:26.000Z', 'NTV Kenya', 'PT42M20S'],
+            ['a2', 'Uhuru news', '2017-06-25T19:37:06.000Z', 'KTN News', 'PT1M34S'],
+            ['a3', 'Jubilee campaign rally', '2017-06-25T10:00:00.000Z', 'NTV Kenya', 'PT10M'],
+        ])
+        # a2 was scraped again, with a new title.
+        self.write_snapshot('youtube_search_results_2017-06-26T13-11-38Z.csv', [
+            ['a2', 'Uhuru rally in Nakuru', '2017-06-25T19:37:06.000Z', 'KTN News', 'PT1M34S'],
+            ['a4', 'NASA news', '2017-06-26T10:00:00.000Z', 'Citizen TV', 'PT5S'],
+        ])
+        # trains a model that labels rallies as relevant.
+        videos = video_store.load_unique(path=video_store.UNIQUE_STORE_PATH, store_path=video_store.STORE_PATH,
+                                         snapshots_path=self.snapshots_path).reset_index()
+        y = videos.title.str.contains('rally').astype(int).values
+        featurizer = Featurizer().fit(videos)
+        pipeline = LogisticRegression(C=100).fit(featurizer.transform(videos), y)
+        self.model_path = os.path.join(self.tmpdir, 'model.joblib')
+        model_artifact.save_model(self.model_path, featurizer, pipeline)
+        self.preds_path = os.path.join(self.tmpdir, 'output', 'class_preds.csv')
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def write_snapshot(self, fname, rows):
+        pd.DataFrame(rows, columns=video_store.SNAPSHOT_COLUMNS).to_csv(os.path.join(self.snapshots_path, fname), index=False)
+
+    def read_preds(self):
+        return pd.read_csv(self.preds_path).set_index('video_id').label.to_dict()
+
+    def test_full_run_scores_latest_row_of_each_video(self):
+        predict.main(self.model_path, preds_path=self.preds_path, chunk_size=2)
+        self.assertEqual(self.read_preds(), {'a1': 1, 'a2': 1, 'a3': 1, 'a4': 0})
+        self.assertEqual(pd.read_csv(self.preds_path).shape[0], 4)
+        self.assertFalse(os.path.exists(self.preds_path + '.tmp'))
+
+    def test_parallel_run(self):
+        predict.main(self.model_path, preds_path=self.preds_path, chunk_size=2, n_jobs=2)
+        self.assertEqual(self.read_preds(), {'a1': 1, 'a2': 1, 'a3': 1, 'a4': 0})
+        self.assertEqual(pd.read_csv(self.preds_path).shape[0], 4)
+
+    def test_interrupted_full_run_keeps_previous_predictions(self):
+        predict.main(self.model_path, preds_path=self.preds_path)
+        with mock.patch.object(predict, 'score_snapshot', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                predict.main(self.model_path, preds_path=self.preds_path)
+        self.assertEqual(self.read_preds(), {'a1': 1, 'a2': 1, 'a3': 1, 'a4': 0})
+
+    def test_new_only_appends_unscored_videos(self):
+        predict.main(self.model_path, preds_path=self.preds_path)
+        self.write_snapshot('youtube_search_results_2017-06-27T13-11-38Z.csv', [
+            ['a4', 'NASA news', '2017-06-26T10:00:00.000Z', 'Citizen TV', 'PT5S'],
+            ['a5', 'ODM rally in Mombasa', '2017-06-27T10:00:00.000Z', 'NTV Kenya', 'PT20M'],
+        ])
+        predict.main(self.model_path, preds_path=self.preds_path, new_only=True)
+        preds = pd.read_csv(self.preds_path)
+        self.assertEqual(preds.video_id.tolist()[4:], ['a5'])
+        self.assertEqual(self.read_preds(), {'a1': 1, 'a2': 1, 'a3': 1, 'a4': 0, 'a5': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
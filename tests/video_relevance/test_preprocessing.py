@@ -0,0 +1,82 @@
+import unittest
+
+import numpy as np
+import scipy.sparse as sp
+
+from module.video_relevance.preprocessing import Featurizer, NumericFeatures, transform_chunks
+from tests.video_relevance import make_videos
+
+
+class NumericFeaturesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.videos = make_videos()
+        self.numeric = NumericFeatures().fit(self.videos)
+
+    def test_fit(self):
+        np.testing.assert_allclose(self.numeric.bins, [5, 31.7, 58.4, 85.1, 195.2, 347, 498.8, 794, 1376, 1958, 2540])
+        np.testing.assert_array_equal(self.numeric.medians, [4.5, 16.5, 9, -40.5])
+
+    def test_transform(self):
+        # the longest and shortest training videos fall in the last and first bins.
+        np.testing.assert_array_equal(self.numeric.transform(self.videos), [
+            [9, 21, 9, -44],
+            [3, 12, 8, -43],
+            [6, 22, 9, -38],
+            [0, 11, 10, -7],
+        ])
+
+    def test_transform_out_of_range_and_missing_durations(self):
+        videos = self.videos.assign(duration=['PT1S', 'PT2H', 'PT3M', None])
+        X = self.numeric.transform(videos)
+        # durations outside the training range are clipped to the first and
+        # last bins, and a missing duration gets the training median bin.
+        np.testing.assert_array_equal(X[:, 0], [0, 9, 3, 4.5])
+        np.testing.assert_array_equal(X[:, 1:], self.numeric.transform(self.videos)[:, 1:])
+
+    def test_missing_values_use_training_medians(self):
+        X = self.numeric.transform(self.videos.iloc[:1].assign(duration=[None], title=[None]))
+        np.testing.assert_array_equal(X, [[4.5, 16.5, 9, -44]])
+
+
+class FeaturizerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.videos = make_videos()
+
+    def test_sparse_matches_dense(self):
+        X = Featurizer().fit(self.videos).transform(self.videos)
+        X_dense = Featurizer(dense=True).fit(self.videos).transform(self.videos)
+        self.assertTrue(sp.isspmatrix_csr(X))
+        self.assertIsInstance(X_dense, np.ndarray)
+        np.testing.assert_array_equal(X.toarray(), X_dense)
+
+    def test_hashing(self):
+        featurizer = Featurizer(hashing=True, n_features=16).fit(self.videos)
+        X = featurizer.transform(self.videos)
+        # two hashed text fields and four numeric features.
+        self.assertEqual(X.shape, (4, 2 * 16 + 4))
+        # title words are counted.
+        np.testing.assert_array_equal(X[:, :16].sum(axis=1).A1, [4, 2, 3, 2])
+        # hashing keeps no vocabulary, so fitting on other videos only changes
+        # the numeric features.
+        other = Featurizer(hashing=True, n_features=16).fit(self.videos.iloc[:2])
+        np.testing.assert_array_equal(other.transform(self.videos)[:, :32].toarray(), X[:, :32].toarray())
+
+    def test_hashing_rejects_vocabulary_kwargs(self):
+        with self.assertRaisesRegex(ValueError, 'max_features, min_df'):
+            Featurizer(hashing=True, max_features=1000, min_df=2)
+        Featurizer(max_features=1000, min_df=2)
+        Featurizer(hashing=True, binary=True)
+
+    def test_transform_chunks_matches_single_pass(self):
+        videos = self.videos.assign(title=['Raila rally in Kisumu', None, 'Jubilee campaign rally', 'NASA speech'])
+        for featurizer in [Featurizer().fit(self.videos), Featurizer(hashing=True, n_features=16).fit(self.videos)]:
+            chunks = list(transform_chunks(featurizer, [videos.iloc[:3], videos.iloc[3:]]))
+            self.assertEqual([video_ids.tolist() for video_ids, _ in chunks], [['v1', 'v2', 'v3'], ['v4']])
+            X = sp.vstack([X for _, X in chunks])
+            np.testing.assert_array_equal(X.toarray(), featurizer.transform(videos.fillna({'title': ''})).toarray())
+
+
+if __name__ == '__main__':
+    unittest.main()
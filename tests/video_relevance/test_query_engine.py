@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+
+from module.video_relevance.query_engine import QueryEngine, margin, entropy
+
+
+class QueryEngineTests(unittest.TestCase):
+
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.X = random_state.normal(size=(500, 2))
+        self.y = (self.X[:, 0] > 0).astype(int)
+        self.video_ids = ['v{0}'.format(i) for i in range(500)]
+
+    def test_strategies_rank_uncertain_first(self):
+        proba = np.array([[0.5, 0.5], [0.9, 0.1], [0.6, 0.4]])
+        self.assertEqual(np.argsort(-margin(proba)).tolist(), [0, 2, 1])
+        self.assertEqual(np.argsort(-entropy(proba)).tolist(), [0, 2, 1])
+
+    def test_queries_are_unlabeled_and_near_boundary(self):
+        engine = QueryEngine(self.X, self.video_ids, pool_size=500, seed=0)
+        labeled = set(self.video_ids[:20])
+        engine.teach_many(self.video_ids[:20], self.y[:20])
+        queries = []
+        for _ in range(10):
+            video_id = engine.next_query()
+            self.assertNotIn(video_id, labeled)
+            self.assertNotIn(video_id, queries)
+            queries.append(video_id)
+        # note: the most uncertain videos are those closest to the decision boundary.
+        distance = np.abs(self.X[[engine.rows[video_id] for video_id in queries], 0])
+        self.assertLess(distance.mean(), np.abs(self.X[:, 0]).mean())
+
+    def test_background_rescoring(self):
+        engine = QueryEngine(self.X, self.video_ids, seed=0)
+        engine.start()
+        try:
+            for _ in range(20):
+                video_id = engine.next_query()
+                engine.teach(video_id, self.y[engine.rows[video_id]])
+        finally:
+            engine.stop()
+        self.assertEqual(len(engine.labels), 20)
+        self.assertEqual(engine.predict().shape, (500,))
+
+
+if __name__ == '__main__':
+    unittest.main()
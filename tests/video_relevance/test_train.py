@@ -5,7 +5,7 @@ import traceback
 import unittest
 import subprocess
 
-from video_relevance import train
+from module.video_relevance import train
 from module import settings
 
 class MainTests(unittest.TestCase):
@@ -28,11 +28,34 @@ class MainTests(unittest.TestCase):
             'python', '-m', 'module.video_relevance.train',
             '--verbosity', '3', '--max_features', '1000', '--periodic_checkpoint_folder',
             self.outpath, '--warm_start', '--generations', '3', '--population_size', '2',
-            '--max_eval_time_mins', '1', '--config_dict', '"TPOT light"'
+            '--max_eval_time_mins', '1', '--n_jobs', '2', '--config_dict', '"TPOT light"'
         ])
         self.assertEqual(out, 0)
         self.assertTrue(os.path.isfile(os.path.join(self.outpath, 'best_pipeline.py')))
+        self.assertTrue(os.path.isfile(os.path.join(self.outpath, 'model.joblib')))
         # self.assertGreaterEqual(len(os.listdir(self.outpath)), 2)
 
+
+class BuildFeaturizerTests(unittest.TestCase):
+
+    def test_sparse_only_for_tpot_sparse(self):
+        self.assertFalse(train.build_featurizer('TPOT sparse').dense)
+        self.assertTrue(train.build_featurizer('TPOT light').dense)
+        self.assertTrue(train.build_featurizer(None).dense)
+        self.assertTrue(train.build_featurizer('TPOT sparse', binary=True).featurizer.transformer_list[0][1].steps[-1][1].binary)
+
+
+class MatrixDirTests(unittest.TestCase):
+
+    def test_temporary_without_checkpoint_folder(self):
+        with train.matrix_dir() as path:
+            self.assertTrue(os.path.isdir(path))
+        self.assertFalse(os.path.exists(path))
+
+    def test_in_checkpoint_folder(self):
+        with train.matrix_dir('checkpoints') as path:
+            self.assertEqual(path, os.path.join('checkpoints', train.MATRIX_DIRNAME))
+
+
 if __name__ == '__main__':
     unittest.main()